@@ -13,6 +13,51 @@ CALLBACK_URL = getattr(settings, 'CALLBACK_URL',
 
 LOAD_ACTIVE_RUNS = getattr(settings, 'LOAD_ACTIVE_RUNS', True)
 
+# Restore only runs, phases and roles, and load the scopes of a run the first
+# time a call, event or webhook needs them. Requires DISPATCH_BY_RESOURCE.
+# Snapshots aren't used.
+LAZY_RUNS = getattr(settings, 'LAZY_RUNS', False)
+
+# How many endpoints restores fetch from simpl-games-api at once
+RESTORE_CONCURRENCY = getattr(settings, 'RESTORE_CONCURRENCY', 4)
+
+# How many scopes restores start at once
+START_CONCURRENCY = getattr(settings, 'START_CONCURRENCY', 16)
+
+# Resources per page of the restores, and how many pages of an endpoint
+# are requested at once
+RESTORE_PAGE_SIZE = getattr(settings, 'RESTORE_PAGE_SIZE', 1000)
+RESTORE_PAGE_WINDOW = getattr(settings, 'RESTORE_PAGE_WINDOW', 8)
+
+# Storage lookups are evicted by webhooks, the timeout only bounds how stale
+# they may get if a webhook is missed
+STORAGE_CACHE_TIMEOUT = getattr(settings, 'STORAGE_CACHE_TIMEOUT', 1)
+
+# In-process tier of the storage cache, in front of the Django cache.
+# Timeouts default to the ones passed to the storage, eg: {'users': 30}
+STORAGE_CACHE_MAX_ENTRIES = getattr(settings, 'STORAGE_CACHE_MAX_ENTRIES', 1000)
+STORAGE_CACHE_TIMEOUTS = getattr(settings, 'STORAGE_CACHE_TIMEOUTS', {})
+
+# Route the calls and events of scopes with one wildcard registration per
+# resource and method, instead of one registration per scope
+DISPATCH_BY_RESOURCE = getattr(settings, 'DISPATCH_BY_RESOURCE', False)
+
+# Default `write_behind` of scope classes, and how long saves are queued
+WRITE_BEHIND = getattr(settings, 'WRITE_BEHIND', False)
+WRITE_BEHIND_WINDOW = getattr(settings, 'WRITE_BEHIND_WINDOW', 0.1)
+
+# Users resolved for callers, evicted by webhooks and sessions leaving
+IDENTITY_CACHE_MAX_ENTRIES = getattr(settings, 'IDENTITY_CACHE_MAX_ENTRIES', 1000)
+IDENTITY_CACHE_TIMEOUT = getattr(settings, 'IDENTITY_CACHE_TIMEOUT', 300)
+
+# Warm restarts: where snapshots of the scopes are written, eg:
+# '/var/lib/modelservice/{slug}.snapshot', and every how many seconds.
+# Snapshots are only restored if resources have an attribute holding when
+# they were last modified, to fetch the changes made since, eg: 'updated'
+SNAPSHOT_PATH = getattr(settings, 'SNAPSHOT_PATH', None)
+SNAPSHOT_INTERVAL = getattr(settings, 'SNAPSHOT_INTERVAL', 300)
+SNAPSHOT_MODIFIED_FIELD = getattr(settings, 'SNAPSHOT_MODIFIED_FIELD', None)
+
 def get_callback_url():
     return CALLBACK_URL.format(hostname=os.environ.get('HOSTNAME', ''),
                                port=os.environ.get('PORT', ''))
@@ -1,3 +1,4 @@
+import asyncio
 import traceback
 
 from autobahn.asyncio.wamp import ApplicationSession
@@ -9,6 +10,7 @@ from modelservice import conf
 from modelservice.games.scopes.exceptions import FormError
 from modelservice.callees import registry as callee_registry
 from modelservice.games import registry as game_registry
+from modelservice.games.caches import identity_cache
 from modelservice.pubsub import registry as subscriber_registry
 from modelservice.utils.instruments import Timer
 from modelservice.utils.strings import no_format
@@ -16,6 +18,7 @@ from modelservice.utils.strings import no_format
 
 class ModelComponent(ApplicationSession):
     games = []
+    snapshots = None
 
     def onUserError(self, fail, msg):
         # publish exceptions to the websocket, so they can be shown on the UI
@@ -37,6 +40,40 @@ class ModelComponent(ApplicationSession):
                          error=fail.value.__class__.__name__)
         super(ModelComponent, self).onUserError(fail, msg)
 
+    async def onLeave(self, details):
+        if self.snapshots is not None:
+            self.snapshots.cancel()
+        # send the saves still queued by write-behind scopes
+        for game in self.games:
+            try:
+                await game.save_queue.flush()
+            except Exception as e:
+                self.log.error("could not flush game `{game_slug}`: {error!r}",
+                               game_slug=game.slug, error=e)
+            else:
+                await self.write_snapshot(game)
+            self.log.info("game `{game_slug}` saves: {stats!r}",
+                          game_slug=game.slug, stats=game.save_queue.stats)
+        super(ModelComponent, self).onLeave(details)
+
+    async def write_snapshot(self, game):
+        try:
+            await game.write_snapshot()
+        except Exception as e:
+            self.log.error("could not write snapshot of game `{game_slug}`: {error!r}",
+                           game_slug=game.slug, error=e)
+
+    async def write_snapshots(self):
+        # restarts restore the games from their latest snapshot
+        while True:
+            await asyncio.sleep(conf.SNAPSHOT_INTERVAL)
+            for game in self.games:
+                await self.write_snapshot(game)
+
+    def onSessionLeave(self, session_id, *args, **kwargs):
+        # forget the users resolved for the session's calls
+        identity_cache.forget_session(session_id)
+
     async def onJoin(self, details):
         self.log.info("session joined")
         # can do subscribes, registers here e.g.:
@@ -45,6 +82,8 @@ class ModelComponent(ApplicationSession):
 
         self.define(FormError)
 
+        await self.subscribe(self.onSessionLeave, 'wamp.session.on_leave')
+
         for game_name, GameClass in game_registry._registry.items():
             try:
                 with Timer() as timer:
@@ -67,6 +106,9 @@ class ModelComponent(ApplicationSession):
                     game_name=game_name, error=e)
                 self.log.error(no_format(traceback.format_exc()))
 
+        if conf.SNAPSHOT_PATH is not None:
+            self.snapshots = asyncio.ensure_future(self.write_snapshots())
+
         for uri, registration in callee_registry._registry.items():
             try:
                 await self.register(registration['func'], uri,
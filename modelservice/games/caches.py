@@ -0,0 +1,305 @@
+import copy
+import time
+
+from collections import defaultdict, namedtuple
+
+from django.core.cache import cache
+
+from genericclient_aiohttp import Resource
+
+from .. import conf
+from ..simpl import games_client
+from ..utils.caches import LocalCache
+
+
+# What the cache knows about each key it stored, to invalidate it later
+Entry = namedtuple('Entry', ('endpoint_name', 'lookup', 'pks', 'expires'))
+
+
+def may_match(lookup, payload):
+    """
+    Returns False if `payload` can't be among the results of `lookup`.
+
+    Attributes missing from `payload` (eg: ``game_slug``) can't rule it out.
+    """
+    for attribute, value in lookup.items():
+        if attribute not in payload:
+            continue
+        actual = payload[attribute]
+        if actual != value and str(actual) != str(value):
+            return False
+    return True
+
+
+class StorageCache(object):
+    """
+    Caches storage reads in two tiers: a `LocalCache` in this process, in
+    front of the Django cache shared by all processes.
+
+    Every key of the local tier is indexed by the pks of the resources it
+    holds and by its lookup, so that a webhook about a resource evicts
+    exactly the lookups it may change, see `invalidate`. This makes long
+    timeouts safe.
+
+    Keys of the shared tier hold the generation of their endpoint, which is
+    kept in the shared tier too: invalidating an endpoint in any process
+    bumps it, so every process stops reading what was cached before.
+
+    Values are copied in and out of the local tier, so callers may mutate
+    what they get.
+    """
+
+    def __init__(self, local=None, shared=None, timeouts=None):
+        if local is None:
+            local = LocalCache(max_entries=conf.STORAGE_CACHE_MAX_ENTRIES)
+        if shared is None:
+            shared = cache
+        if timeouts is None:
+            timeouts = conf.STORAGE_CACHE_TIMEOUTS
+        self.local = local
+        self.shared = shared
+        self.timeouts = timeouts
+        self.entries = {}
+        # `(endpoint_name, pk)` -> keys holding the resource
+        self.keys_by_pk = defaultdict(set)
+        # endpoint_name -> keys of its lookups
+        self.keys_by_endpoint = defaultdict(set)
+        # endpoint_name -> how many times it was invalidated in this process
+        self.generations = defaultdict(int)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_local_timeout(self, endpoint_name, timeout):
+        return self.timeouts.get(endpoint_name, timeout)
+
+    @staticmethod
+    def get_generation_key(endpoint_name):
+        return 'storage-generation:{}'.format(endpoint_name)
+
+    @staticmethod
+    def get_shared_key(key, shared_generation):
+        return '{}@{}'.format(key, shared_generation)
+
+    def get_shared_generation(self, endpoint_name):
+        return self.shared.get(self.get_generation_key(endpoint_name)) or 0
+
+    def bump_shared_generation(self, endpoint_name):
+        key = self.get_generation_key(endpoint_name)
+        try:
+            self.shared.incr(key)
+        except ValueError:
+            # never bumped, or evicted: don't go back to older generations
+            if not self.shared.add(key, int(time.time()), None):
+                self.shared.incr(key)
+
+    def get(self, endpoint_name, key, timeout, lookup=None):
+        value = self.local.get(key)
+        if value is None:
+            value = self.shared.get(self.get_shared_key(
+                key, self.get_shared_generation(endpoint_name)))
+            if value is None:
+                return None
+            local_timeout = self.get_local_timeout(endpoint_name, timeout)
+            if local_timeout > 0:
+                self.local.set(key, copy.deepcopy(value), local_timeout)
+                self._track(endpoint_name, key, lookup, value, local_timeout)
+            return value
+        return copy.deepcopy(value)
+
+    def get_generation(self, endpoint_name):
+        return (self.generations[endpoint_name],
+                self.get_shared_generation(endpoint_name))
+
+    def set(self, endpoint_name, key, value, timeout, lookup=None,
+            generation=None):
+        """
+        Caches `value` under `key` in both tiers.
+
+        Pass the `get_generation` of the endpoint taken before fetching
+        `value`: if the endpoint was invalidated since, `value` may be stale
+        and is not cached. If another process invalidated it, `value` is
+        cached under the generation it was fetched in, which is not read
+        anymore.
+        """
+        if generation is None:
+            generation = self.get_generation(endpoint_name)
+        local_generation, shared_generation = generation
+        if local_generation != self.generations[endpoint_name]:
+            return
+        self.shared.set(self.get_shared_key(key, shared_generation), value,
+                        timeout)
+        local_timeout = self.get_local_timeout(endpoint_name, timeout)
+        if local_timeout > 0:
+            self.local.set(key, copy.deepcopy(value), local_timeout)
+            self._track(endpoint_name, key, lookup, value, local_timeout)
+
+    def _track(self, endpoint_name, key, lookup, value, timeout):
+        if isinstance(value, dict):
+            value = [value]
+        pks = frozenset(item['id'] for item in value if 'id' in item)
+
+        self._forget(key)
+        self.entries[key] = Entry(endpoint_name, lookup or {}, pks,
+                                  time.monotonic() + timeout)
+        for pk in pks:
+            self.keys_by_pk[(endpoint_name, pk)].add(key)
+        self.keys_by_endpoint[endpoint_name].add(key)
+
+        if len(self.entries) > 2 * max(self.local.max_entries, 100):
+            self.prune()
+
+    def _forget(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for pk in entry.pks:
+            keys = self.keys_by_pk[(entry.endpoint_name, pk)]
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_pk[(entry.endpoint_name, pk)]
+        keys = self.keys_by_endpoint[entry.endpoint_name]
+        keys.discard(key)
+        if not keys:
+            del self.keys_by_endpoint[entry.endpoint_name]
+
+    def prune(self):
+        """
+        Forgets the keys that expired from the local tier.
+        """
+        now = time.monotonic()
+        for key in [key for key, entry in self.entries.items() if entry.expires <= now]:
+            self._forget(key)
+
+    def get_affected_keys(self, endpoint_name, payload=None):
+        """
+        Returns the keys of `endpoint_name` that may change with `payload`:
+        those holding the resource, and those whose lookup may now include
+        it. Without a payload, returns every key of `endpoint_name`.
+        """
+        keys = self.keys_by_endpoint.get(endpoint_name, set())
+        if payload is None or 'id' not in payload:
+            return set(keys)
+
+        affected = set(self.keys_by_pk.get((endpoint_name, payload['id']), ()))
+        for key in keys:
+            if key not in affected and may_match(self.entries[key].lookup, payload):
+                affected.add(key)
+        return affected
+
+    def invalidate(self, endpoint_name, payload=None):
+        """
+        Evicts the lookups of `endpoint_name` affected by a change to the
+        resource in `payload` from the local tier, or all of them if
+        `payload` is None. In the shared tier, where other processes cache
+        lookups this one doesn't know of, all the lookups of `endpoint_name`
+        are evicted.
+
+        :return: int -- how many keys were evicted from the local tier
+        """
+        self.generations[endpoint_name] += 1
+        self.bump_shared_generation(endpoint_name)
+        keys = self.get_affected_keys(endpoint_name, payload)
+        for key in keys:
+            self._forget(key)
+        self.local.delete_many(keys)
+        return len(keys)
+
+    def clear(self):
+        self.generations.clear()
+        self.entries.clear()
+        self.keys_by_pk.clear()
+        self.keys_by_endpoint.clear()
+        self.local.clear()
+
+
+class IdentityCache(object):
+    """
+    Caches the users resolved for the callers and publishers of scopes, see
+    `decorators.get_caller`.
+
+    Users are keyed by user id and run pk, and forgotten when the user or
+    their runuser change, or when the WAMP session they were resolved for
+    leaves. Each `get` returns new `Resource` instances, so callers may
+    mutate them.
+    """
+
+    def __init__(self, max_entries=None, timeout=None):
+        if max_entries is None:
+            max_entries = conf.IDENTITY_CACHE_MAX_ENTRIES
+        if timeout is None:
+            timeout = conf.IDENTITY_CACHE_TIMEOUT
+        self.local = LocalCache(max_entries=max_entries)
+        self.timeout = timeout
+        self.keys_by_user = defaultdict(set)
+        self.keys_by_runuser = defaultdict(set)
+        self.keys_by_session = defaultdict(set)
+
+    def __len__(self):
+        return len(self.local)
+
+    def get(self, key):
+        entry = self.local.get(key)
+        if entry is None:
+            return None
+        user_payload, runuser_payload = entry
+        user = Resource(games_client.users, **user_payload)
+        if runuser_payload is not None:
+            user.payload['runuser'] = Resource(games_client.runusers,
+                                               **runuser_payload)
+        return user
+
+    def set(self, key, user, session=None):
+        user_payload = dict(user.payload)
+        runuser = user_payload.pop('runuser', None)
+        runuser_payload = None
+        if runuser is not None:
+            runuser_payload = dict(runuser.payload)
+            self.keys_by_runuser[runuser.pk].add(key)
+        self.local.set(key, (user_payload, runuser_payload), self.timeout)
+
+        self.keys_by_user[user.pk].add(key)
+        if session is not None:
+            self.keys_by_session[session].add(key)
+
+        if len(self.keys_by_user) > 2 * max(self.local.max_entries, 100):
+            self.prune()
+
+    def prune(self):
+        """
+        Forgets the keys that were evicted or expired.
+        """
+        for index in (self.keys_by_user, self.keys_by_runuser, self.keys_by_session):
+            for value in list(index):
+                keys = {key for key in index[value] if key in self.local}
+                if keys:
+                    index[value] = keys
+                else:
+                    del index[value]
+
+    def _forget(self, keys):
+        self.local.delete_many(keys)
+        return len(keys)
+
+    def forget_user(self, user_pk):
+        return self._forget(self.keys_by_user.pop(user_pk, ()))
+
+    def forget_runuser(self, payload):
+        keys = self.keys_by_runuser.pop(payload['id'], set())
+        user_keys = self.keys_by_user.get(payload.get('user'), ())
+        # the user may have just joined the run
+        keys.update(key for key in user_keys if key[1] == payload.get('run'))
+        return self._forget(keys)
+
+    def forget_session(self, session):
+        return self._forget(self.keys_by_session.pop(session, ()))
+
+    def clear(self):
+        self.local.clear()
+        self.keys_by_user.clear()
+        self.keys_by_runuser.clear()
+        self.keys_by_session.clear()
+
+
+storage_cache = StorageCache()
+identity_cache = IdentityCache()
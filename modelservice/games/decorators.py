@@ -1,6 +1,7 @@
 import inspect
 from functools import wraps
 
+from .caches import identity_cache
 from .registry import methods_registry
 
 default_registration_options = {
@@ -23,6 +24,33 @@ def get_user_details(details):
     return user_id, role
 
 
+def get_session_id(details):
+    try:
+        return details.caller
+    except AttributeError:
+        return getattr(details, 'publisher', None)
+
+
+async def get_caller(scope, user_id, session_id=None):
+    """
+    Returns the user with `user_id`, monkeypatched with their runuser for
+    `scope`, like `scope.game.storage.get_user` does.
+
+    Users are cached by user id and run, see `caches.IdentityCache`.
+    """
+    run = scope.my.run
+    key = (user_id, run.pk if run is not None else None)
+    if scope.resource_name == 'runuser':
+        # callers get the runuser of the scope, see `SIMPLStorage.get_user`
+        key += (scope.pk,)
+
+    user = identity_cache.get(key)
+    if user is None:
+        user = await scope.game.storage.get_user(scope, id=user_id)
+        identity_cache.set(key, user, session_id)
+    return user
+
+
 def mark(attr, *args, **kwargs):
     if callable(args[0]):
         function = args[0]
@@ -40,6 +68,12 @@ def mark(attr, *args, **kwargs):
     def decorator(func):
         @wraps(func)
         async def wrap(scope, *_args, **_kwargs):
+            # With `LAZY_RUNS`, the first call or event of a run loads the
+            # scopes of the run
+            run = scope.my.run
+            if run is not None:
+                await scope.game.hydrate_run(run.pk)
+
             details = _kwargs.get('details', None)
             user = None
 
@@ -50,9 +84,10 @@ def mark(attr, *args, **kwargs):
                 if role == 'profiler':
                     if 'user_email' in _kwargs:
                         email = _kwargs.pop('user_email')
-                        user = await scope.storage.get_user(email=email)
+                        user = await scope.game.storage.get_user(scope, email=email)
                 elif user_id is not None:
-                    user = await scope.storage.get_user(id=user_id)
+                    user = await get_caller(scope, user_id,
+                                            get_session_id(details))
 
             _kwargs['user'] = user
 
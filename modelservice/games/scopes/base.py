@@ -1,6 +1,8 @@
 import asyncio
 import warnings
 
+from collections import OrderedDict
+
 from django.conf import settings
 from django.utils.module_loading import import_string
 
@@ -17,7 +19,75 @@ from ..decorators import register, subscribe
 from ...simpl import games_client
 
 
+def fingerprint(value):
+    # Containers are mutated in place, so we can't keep them to compare
+    if isinstance(value, (dict, list)):
+        return hash(repr(value))
+    return value
+
+
+# Field names of the payloads fingerprinted so far, shared by the scopes of a
+# resource since its payloads have the same fields
+field_names = {}
+
+
+def get_fingerprints(json):
+    """
+    Returns the field names of `json` and a tuple of their fingerprints.
+    """
+    fields = tuple(json)
+    fields = field_names.setdefault(fields, fields)
+    return fields, tuple(fingerprint(value) for value in json.values())
+
+
+class ScopeStorage(object):
+    """
+    A game's storage bound to one of its scopes, see `WampScope.storage`.
+
+    The methods that act on the scope's resource take the arguments they took
+    when each scope had a storage, and warn that this is deprecated. Other
+    attributes are the storage's.
+    """
+    __slots__ = ('storage', 'scope')
+
+    def __init__(self, storage, scope):
+        self.storage = storage
+        self.scope = scope
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+    def warn(self, name):
+        warnings.warn(
+            '`scope.storage.{0}(...)` is deprecated, call '
+            '`scope.game.storage.{0}(scope, ...)` instead'.format(name),
+            DeprecationWarning, stacklevel=3)
+
+    def get_save_json(self, json=None):
+        self.warn('get_save_json')
+        return self.storage.get_save_json(self.scope, json)
+
+    def get_patch_json(self, save_json, json, fields):
+        self.warn('get_patch_json')
+        return self.storage.get_patch_json(self.scope, save_json, json, fields)
+
+    async def get_user(self, **lookup):
+        self.warn('get_user')
+        return await self.storage.get_user(self.scope, **lookup)
+
+    async def save(self, json=None, fields=None):
+        self.warn('save')
+        return await self.storage.save(self.scope, json, fields=fields)
+
+    async def load(self, **kwargs):
+        self.warn('load')
+        return await self.storage.load(self.scope, **kwargs)
+
+
 class ScopeMixin(object):
+    # Classes mixing this in provide the `_pk` and `_hash` slots
+    __slots__ = ()
+
     def __eq__(self, other):
         if hasattr(other, 'resource_name') and hasattr(other, 'pk'):
             return self.resource_name == other.resource_name and self.pk == other.pk
@@ -27,57 +97,123 @@ class ScopeMixin(object):
         return not self.__eq__(other)
 
     def __hash__(self):
-        key = "{}:{}".format(self.resource_name, self.pk)
-        return hash(key)
+        # scopes are hashed on every index and set operation
+        if self._hash is None:
+            self._hash = hash((self.resource_name, self._pk))
+        return self._hash
+
+    @property
+    def pk(self):
+        return self._pk
+
+    @pk.setter
+    def pk(self, value):
+        self._pk = value
+        self._hash = None
 
 
 class SessionScope(object):
+    __slots__ = ('session',)
+
     def __init__(self, session):
         self.session = session
-        self.log = self.session.log
         super(SessionScope, self).__init__()
 
+    @property
+    def log(self):
+        return self.session.log
+
 
 class WampScope(ScopeMixin, SessionScope):
+    # Scopes are loaded by the thousands, so they keep no `__dict__`.
+    # Subclasses that don't add instance attributes should declare
+    # `__slots__ = ()` too.
+    __slots__ = ('_json', '_saved', 'my', 'wamp', '_pk', '_hash')
+
     resource_classes = {}
     child_scopes_resources = tuple()
     default_child_resource = None
 
+    # Extra attributes of `json` by which the scope managers index scopes of
+    # this class, on top of `SCOPE_FILTER_ATTRIBUTES`. A tuple of attribute
+    # names declares a composite index, eg: ('role', ('period', 'role'))
+    indexes = tuple()
+
+    # Extra numeric attributes of `json` kept sorted by the scope managers,
+    # on top of `SCOPE_SORTED_ATTRIBUTES`, for range lookups and ordering
+    sorted_indexes = tuple()
+
+    # Queue `save`s, merging repeated ones, and send them in batches. Scopes
+    # are created right away regardless. See `SaveQueue`
+    write_behind = conf.WRITE_BEHIND
+
+    # Publish the children added together by `add_child_scopes` with a single
+    # `add_children` event of their `pubsub_export`s per audience, instead of
+    # an `add_child` event each. Frontends must subscribe to `add_children`
+    publish_add_children = False
+
     initial_json = {
         'data': {}  # ensure scopes always have non-null json data property
     }
     resource_name = 'undefined'
-    resource_name_plural = None
     online_runusers = set()
 
-    pk = None
     slug = None
 
+    games_client = games_client
+    storage_class = None
+
     registered = []
     subscribed = []
     hooked = []
 
     def __init__(self, session):
         super(WampScope, self).__init__(session)
-        self.games_client = games_client
-
-        self.child_scopes_classes = [
-            self.game.resource_classes[resource_name]
-            for resource_name in self.child_scopes_resources
-        ]
-
-        if self.resource_name_plural is None:
-            self.resource_name_plural = self.resource_name + 's'
-
-        Storage = import_string(conf.SCOPE_STORAGE)
+        self.pk = None
         self.json = self.initial_json
-        self.storage = Storage(self)
+        self._saved = None
         self.my = Traversing(self)
         self.wamp = ScopeWamp(self)
 
     def __repr__(self):
         return "<Scope {} pk: {}>".format(self.resource_name, self.pk)
 
+    @property
+    def json(self):
+        return self._json
+
+    @json.setter
+    def json(self, value):
+        self._json = value
+
+    def mark_saved(self):
+        """
+        Records `json` as the payload last loaded from, sent to or received
+        from the storage, for `changed_fields`.
+        """
+        self._saved = (self._json, get_fingerprints(self._json))
+
+    @property
+    def changed_fields(self):
+        """
+        Returns the fields of `json` modified since `mark_saved`, or None if
+        the whole json must be saved: the scope was never saved or loaded,
+        `json` was replaced since, or fields were deleted from it, which a
+        PATCH can't do.
+        """
+        if 'id' not in self._json or self._saved is None:
+            return None
+        json, (fields, fingerprints) = self._saved
+        if json is not self._json:
+            return None
+        saved = dict(zip(fields, fingerprints))
+        if any(field not in json for field in saved):
+            return None
+        return [
+            field for field, value in json.items()
+            if field not in saved or saved[field] != fingerprint(value)
+        ]
+
     def __del__(self):
         pass
 
@@ -137,6 +273,51 @@ class WampScope(ScopeMixin, SessionScope):
 
         return scope
 
+    async def add_child_scopes(self, *scopes):
+        """
+        Push scope instances into `child_scopes`, like `add_child_scope`.
+        Notifies the World and Runusers associated with each of them, see
+        `publish_add_children`.
+        """
+        self.log.debug(
+            'add_child_scopes: parent {name} pk: {pk}, {count} children',
+            name=self.resource_name,
+            pk=self.pk,
+            count=len(scopes),
+        )
+        if not scopes:
+            return []
+
+        await self.game.add_scopes(*scopes)
+
+        # children are published to their own world and runusers
+        audiences = OrderedDict()
+        for scope in scopes:
+            world = scope.my.world
+            runusers = scope.my.runusers
+            key = (world, tuple(runusers) if runusers is not None else ())
+            audiences.setdefault(key, []).append(scope)
+
+        for (world, runusers), children in audiences.items():
+            if world is not None:
+                self.publish_added(world, children)
+            for runuser in runusers:
+                self.publish_added(runuser, children)
+
+        return list(scopes)
+
+    def publish_added(self, target, scopes):
+        """
+        Publishes `scopes`, added to this scope's children, on `target`.
+        """
+        if self.publish_add_children:
+            target.publish('add_children',
+                           [scope.pubsub_export() for scope in scopes])
+        else:
+            for scope in scopes:
+                target.publish('add_child', scope.pk, scope.resource_name,
+                               scope.json)
+
     async def remove(self, payload=None):
         """
         Remove scope and notify any associated World and Runusers.
@@ -218,8 +399,30 @@ class WampScope(ScopeMixin, SessionScope):
 
     def update_webhook(self, resource_name, payload, **kwargs):
         self.json = payload
+        self.mark_saved()
+        self.reindex()
         self.update_pubsub()
 
+    def reindex(self):
+        """
+        Updates this scope's entries in the game's scope indexes.
+
+        `save` and `update_webhook` call it for you. Call it yourself after
+        mutating `json` in place without saving.
+        """
+        manager = self.game.scopes.get(self.resource_name)
+        if manager is not None:
+            previous = manager.indexed_values(self)
+            changed = set(manager.reindex(self))
+            if not changed.isdisjoint(self.parent_resource_names):
+                # the scope moved to another parent
+                self.my.detach(previous)
+                self.my.attach()
+                self.my.invalidate()
+            elif 'world' in changed:
+                # a runuser moved to another world
+                self.my.invalidate()
+
     async def add_new_child_scope(self, resource_name, json=None):
         """
         Adds a new instance of `self.ChildScope` to `child_scopes`.
@@ -243,6 +446,34 @@ class WampScope(ScopeMixin, SessionScope):
         await self.add_child_scope(scope)
         return scope
 
+    async def add_new_child_scopes(self, resource_name, json_list):
+        """
+        Creates children of this scope from `json_list` with a single bulk
+        request, then adds them with `add_child_scopes`.
+
+        Use it instead of `add_new_child_scope` to create many scopes at
+        once, eg: the results of a period.
+        """
+        self.log.debug(
+            'add_new_child_scopes: parent {parent} pk: {pk}, {count} {child}',
+            parent=self.resource_name,
+            pk=self.pk,
+            count=len(json_list),
+            child=resource_name
+        )
+
+        for json in json_list:
+            json[self.resource_name] = self.pk
+
+        ChildScope = self.game.resource_classes[resource_name]
+        payloads = await self.game.storage.bulk_create(
+            ChildScope.resource_name_plural, json_list)
+        scopes = []
+        for payload in payloads:
+            scopes.append(
+                ChildScope.from_json(self.session, self.my.game, payload))
+        return await self.add_child_scopes(*scopes)
+
     def get_routing(self, name):
         route = settings.ROOT_TOPIC + '.model.{}'.format(self.resource_name)
         if self.pk is not None:
@@ -258,6 +489,32 @@ class WampScope(ScopeMixin, SessionScope):
     def parent_resource_names(cls):
         return SCOPE_PARENT_GRAPH[cls.resource_name]
 
+    @property
+    def child_scopes_classes(self):
+        return [
+            self.game.resource_classes[resource_name]
+            for resource_name in self.child_scopes_resources
+        ]
+
+    @classmethod
+    def get_storage_class(cls):
+        Storage = WampScope.storage_class
+        if Storage is None:
+            Storage = WampScope.storage_class = import_string(conf.SCOPE_STORAGE)
+        return Storage
+
+    @property
+    def storage(self):
+        """
+        Returns the game's storage bound to this scope, for code that calls
+        ``scope.storage.get_user(id=1)`` like when each scope had a storage.
+
+        Deprecated: call the methods of ``scope.game.storage``, the
+        `conf.SCOPE_STORAGE` instance shared by the game's scopes, with the
+        scope instead, eg: ``scope.game.storage.get_user(scope, id=1)``.
+        """
+        return ScopeStorage(self.game.storage, self)
+
     @property
     def child_scopes(self):
         return self.my.child_scopes
@@ -338,10 +595,11 @@ class WampScope(ScopeMixin, SessionScope):
 
         scope_groups = self.child_scopes
         for resource_name, scope_group in scope_groups.items():
-            for scope in scope_group:
+            # unloading children removes them from `scope_group`
+            for scope in list(scope_group):
                 await scope._unload_scope_tree()
 
-        await self.my.game.remove_scopes(self)
+        await self.my.game.unload_scopes(self)
 
     def pubsub_export(self):
         """
@@ -408,9 +666,23 @@ class WampScope(ScopeMixin, SessionScope):
         pass
 
     async def save(self):
-        self.json = await self.storage.save(self.json)
+        if self.write_behind and 'id' in self.json:
+            # saved later, with any other change, see `SaveQueue`
+            self.reindex()
+            self.game.save_queue.add(self)
+            return self.json
+        self.json = await self.game.storage.save(self, self.json,
+                                                 fields=self.changed_fields)
+        self.mark_saved()
+        self.reindex()
         return self.json
 
+    async def flush(self):
+        """
+        Sends the pending write-behind save of this scope, if any.
+        """
+        await self.game.save_queue.flush(self)
+
     @register
     def get_active_runusers(self, excludePlayers=False, *args, **kwargs):
         runusers = []
@@ -450,6 +722,8 @@ class WampScope(ScopeMixin, SessionScope):
 
 
 class Scope(WampScope):
+    __slots__ = ('game',)
+
     def __init__(self, session, game, json=None):
         self.game = game
         super(Scope, self).__init__(session)
@@ -461,3 +735,14 @@ class Scope(WampScope):
         self = cls(session, game, json)
         self.pk = await self.get_pk()
         return self
+
+    @classmethod
+    def from_json(cls, session, game, json):
+        """
+        Returns a scope for the `json` of an existing resource, which already
+        has an id: unlike `create`, nothing is awaited. Used by restores.
+        """
+        self = cls(session, game, json)
+        self.pk = json['id']
+        self.mark_saved()
+        return self
@@ -3,13 +3,17 @@ from functools import reduce
 
 import asyncio
 import json
+import time
 
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
-import aiorwlock
 from genericclient_base import BaseResource as Resource
+from genericclient_base import exceptions as resource_exceptions
 
 from .base import WampScope, Scope
+from .constants import SCOPE_PARENT_GRAPH
+from .dispatch import Dispatcher
 from .exceptions import ChangePhaseException, ScopeNotFound, ScopesNotLoaded
 from .managers import ScopeManager
 from .webhooks import SubscriptionAlreadyExists
@@ -17,13 +21,24 @@ from .webhooks import subscribe as webhooks_subscribe
 
 from ..decorators import register, subscribe
 from ..registry import registry
+from ..snapshots import (SnapshotMismatch, check_snapshot,
+                         dump_snapshot_file, get_snapshot_path,
+                         read_snapshot_file, take_snapshot)
+from ..writebehind import SaveQueue
 
 from ...webhooks import dispatcher
 
-from ...conf import LOAD_ACTIVE_RUNS
+from ...conf import (DISPATCH_BY_RESOURCE, LAZY_RUNS, LOAD_ACTIVE_RUNS,
+                     RESTORE_CONCURRENCY,
+                     SNAPSHOT_MODIFIED_FIELD, START_CONCURRENCY,
+                     WRITE_BEHIND_WINDOW)
+from ...utils.asyncio import SingleFlight
+from ...utils.instruments import Timer
 
 
 class Result(Scope):
+    __slots__ = ()
+
     resource_name = 'result'
 
     @property
@@ -38,6 +53,8 @@ class Result(Scope):
 
 
 class Decision(Scope):
+    __slots__ = ()
+
     resource_name = 'decision'
 
     @property
@@ -52,6 +69,8 @@ class Decision(Scope):
 
 
 class Period(Scope):
+    __slots__ = ()
+
     resource_name = 'period'
     child_scopes_resources = ('decision', 'result',)
     default_child_scope = Decision
@@ -70,6 +89,8 @@ class Period(Scope):
 
 
 class Scenario(Scope):
+    __slots__ = ()
+
     resource_name = 'scenario'
     child_scopes_resources = ('period',)
 
@@ -91,6 +112,8 @@ class Scenario(Scope):
 
 
 class World(Scope):
+    __slots__ = ()
+
     resource_name = 'world'
     child_scopes_resources = ('scenario',)
 
@@ -112,8 +135,11 @@ class World(Scope):
 
 
 class RunUser(Scope):
+    __slots__ = ()
+
     resource_name = 'runuser'
     child_scopes_resources = ('scenario',)
+    indexes = ('user',)
 
     @property
     def run(self):
@@ -164,14 +190,9 @@ class RunUser(Scope):
     def update_webhook(self, resource_name, payload, **kwargs):
         self.log.debug('update_webhook: {name} pk: {pk}',
                        name=self.resource_name, pk=self.pk)
-        # updating a RunUser may require updating its manager's 'world' index
-        world_changed = payload['world'] != self.json['world']
-        if world_changed:
-            self.game.scopes['runuser'].remove(self)
-        self.json = payload
-        if world_changed:
-            self.game.scopes['runuser'].add(self)
-        self.update_pubsub()
+        # moving a RunUser to another world also moves it in the manager's
+        # 'world' index
+        super(RunUser, self).update_webhook(resource_name, payload, **kwargs)
 
     def update_pubsub(self):
         """
@@ -186,6 +207,8 @@ class RunUser(Scope):
 
 
 class Run(Scope):
+    __slots__ = ()
+
     resource_name = 'run'
     child_scopes_resources = ('runuser', 'world',)
     default_child_scope = World
@@ -219,9 +242,8 @@ class Run(Scope):
     @property
     def current_phase(self):
         try:
-            return [phase for phase in self.game.phases if
-                    phase.pk == self.json['phase']][0]
-        except IndexError:
+            return self.game.phases.get(id=self.json['phase'])
+        except ScopeNotFound:
             return None
 
     async def on_runuser_deleted(self, payload):
@@ -261,6 +283,29 @@ class Run(Scope):
                      scope.resource_name,
                      scope.json)
 
+    async def add_child_scopes(self, *scopes):
+        """
+        Push scope instances into `child_scopes`, like `add_child_scope`.
+        Also, publish them to Run topic subscribers, see
+        `publish_add_children`.
+        """
+        self.log.debug(
+            'add_child_scopes: parent {name} pk: {pk}, {count} children',
+            name=self.resource_name,
+            pk=self.pk,
+            count=len(scopes),
+        )
+        if not scopes:
+            return []
+
+        await self.game.add_scopes(*scopes)
+        for scope in scopes:
+            if scope.resource_name == 'runuser':
+                await self.on_runuser_created(scope.pk)
+
+        self.publish_added(self, scopes)
+        return list(scopes)
+
     @register
     async def get_run_data(self, includePlayerScenarios=False, *args, **kwargs):
         """
@@ -300,15 +345,13 @@ class Run(Scope):
         if phase is None:
             raise ValueError("Run {} doesn't have any phase.".format(self.pk))
 
-        return [phase for phase in self.game.phases if
-                phase.json['order'] == order][0]
+        return self.game.phases.filter(order=order)[0]
 
     def get_next_phase(self):
         phase = self.current_phase
-        order = phase.json['order'] + 1
         try:
-            return self.get_phase(order)
-        except IndexError:
+            return self.game.phases.next_after('order', phase.json['order'])
+        except ScopeNotFound:
             raise ValueError(
                 "Run {}: There isn't any phase available after '{}'".format(
                     self.pk, phase.json['name'],
@@ -316,10 +359,10 @@ class Run(Scope):
 
     async def get_previous_phase(self):
         phase = self.current_phase
-        order = phase.json['order'] - 1
         try:
-            return self.get_phase(order)
-        except IndexError:
+            return self.game.phases.previous_before('order',
+                                                    phase.json['order'])
+        except ScopeNotFound:
             raise ValueError(
                 "Run {}: There isn't any phase available before '{}'".format(
                     self.pk, phase.json['name'],
@@ -348,18 +391,22 @@ class Run(Scope):
 
     @register
     async def rollback_phase(self, *args, **kwargs):
-        previous_phase = self.get_previous_phase()
+        previous_phase = await self.get_previous_phase()
         self.json['phase'] = previous_phase.pk
         await self.save()
         await self.on_rollback_phase(previous_phase)
 
 
 class Phase(Scope):
+    __slots__ = ()
+
     resource_name = 'phase'
     resource_name_plural = 'phases'
 
 
 class Role(Scope):
+    __slots__ = ()
+
     resource_name = 'role'
     resource_name_plural = 'roles'
 
@@ -378,10 +425,24 @@ class Game(WampScope):
     game_subscription = None
     users_subscription = None
 
-    locks = defaultdict(aiorwlock.RWLock)
+    # Requests to simpl-games-api in flight, see `SIMPLStorage.get`
+    flights = SingleFlight()
+
+    # The `conf.SCOPE_STORAGE` instance shared by the game's scopes
+    storage = None
 
     def __init__(self, session, slug):
         self.slug = slug
+        self.storage = self.get_storage_class()(self)
+        self.save_queue = SaveQueue(window=WRITE_BEHIND_WINDOW)
+        self.dispatcher = Dispatcher(self)
+        # endpoint_name -> count, fetch and build times of the last restore
+        self.restore_stats = OrderedDict()
+        self.start_stats = {}
+        # pks of the runs whose scopes are loaded, and loads in progress,
+        # with `LAZY_RUNS`
+        self.hydrated_runs = set()
+        self.hydrations = {}
         super(Game, self).__init__(session)
 
     @classmethod
@@ -427,7 +488,7 @@ class Game(WampScope):
         return self.scopes['run']
 
     async def load(self):
-        self.json = await self.storage.load(slug=self.slug)
+        self.json = await self.storage.load(self, slug=self.slug)
         return self.json
 
     async def start(self):
@@ -435,133 +496,506 @@ class Game(WampScope):
         self.pk = await self.get_pk()
         await super(Game, self).start()
 
-    async def _filter(self, endpoint, params):
-        # return consolidated query results
-        results = []
-        while True:
-            resources = await endpoint.filter(**params)
-            results += resources
-            link = resources.response.links.get('next')
-            if link is not None:
-                params = {}
-                endpoint.url = link['url']
-                # self.log.info('next url: {url}', url=endpoint.url)
-            else:
-                break
-        return results
+    async def stop(self):
+        await self.dispatcher.leave()
+        await super(Game, self).stop()
 
-    async def restore_endpoint(self, endpoint, scope_class, params={},
+    async def restore_endpoint(self, endpoint_name, scope_class, params=None,
                                parent_name=None, parent_ids=[]):
         # return a manager for endpoint's scopes
-        params['game_slug'] = self.slug
+        params = dict(params or {}, game_slug=self.slug)
         self.log.debug("params: {params!s}", params=params)
-        results = await self._filter(endpoint, params)
+        pages = self.storage.iter_pages(endpoint_name, **params)
+        return await self.build_manager(scope_class, pages)
+
+    async def build_manager(self, scope_class, pages, stats=None):
+        """
+        Returns a manager for the scopes of `pages`, an async iterable of
+        lists of payloads. The scopes of each page are built as soon as it
+        arrives, and the page is released before the next one is awaited.
 
+        :param stats: optional dict, filled with the `count` of scopes and
+                      the seconds spent waiting for pages (`fetch`) and
+                      building scopes (`build`)
+        """
         scopes = []
-        for result in results:
-            scope = await scope_class.create(self.session,
-                                             game=self,
-                                             json=result.payload)
-            scopes.append(scope)
+        result_count = 0
+        build = 0.0
+        try:
+            with Timer() as total:
+                async for page in pages:
+                    with Timer() as timer:
+                        result_count += len(page)
+                        for payload in page:
+                            if 'id' in payload:
+                                scope = scope_class.from_json(
+                                    self.session, self, payload)
+                            else:
+                                scope = await scope_class.create(
+                                    self.session, game=self, json=payload)
+                            scopes.append(scope)
+                        del page
+                    build += timer.elapsed
+        finally:
+            # cancel the requests of the pages ahead, see `iter_pages`
+            if hasattr(pages, 'aclose'):
+                await pages.aclose()
 
         manager = ScopeManager(*scopes)
         self.log.debug(
             'restore_endpoint: loaded {result_count} results managed as {mgr_count} {scope_class} scopes',
-            result_count=len(results),
+            result_count=result_count,
             mgr_count=manager.count(),
             scope_class=scope_class)
 
-        if len(results) != manager.count():
+        if result_count != manager.count():
             raise ScopesNotLoaded(
                 'Restored only {mgr_count} of {result_count} {scope_class}.',
                 mgr_count=manager.count(),
-                result_count=len(results),
+                result_count=result_count,
                 scope_class=scope_class)
+
+        if stats is not None:
+            stats.update(count=result_count, fetch=total.elapsed - build,
+                         build=build)
         return manager
 
+    async def restore_endpoints(self, params_by_endpoint, stats=None):
+        """
+        Restores the scopes of the endpoints of `params_by_endpoint`
+        concurrently, at most ``RESTORE_CONCURRENCY`` endpoints at a time.
+        See `build_manager`.
+
+        :param stats: optional dict, filled with the stats of each endpoint
+        :return: OrderedDict -- the managers by endpoint name, in the order
+                 of `params_by_endpoint`
+        """
+        semaphore = asyncio.Semaphore(RESTORE_CONCURRENCY)
+
+        async def restore(endpoint_name, params):
+            endpoint_stats = {}
+            async with semaphore:
+                pages = self.storage.iter_pages(endpoint_name,
+                                                game_slug=self.slug, **params)
+                manager = await self.build_manager(
+                    self.endpoint_to_classes[endpoint_name], pages,
+                    endpoint_stats)
+            if stats is not None:
+                stats[endpoint_name] = endpoint_stats
+            return manager
+
+        managers = await asyncio.gather(*[
+            restore(endpoint_name, params)
+            for endpoint_name, params in params_by_endpoint.items()
+        ])
+        return OrderedDict(zip(params_by_endpoint, managers))
+
     async def restore_run(self, run_pk):
-        # load newly activated run and all its child scopes
-        run_scopes = []
-        for endpoint_name, scope_class in self.endpoint_to_classes.items():
-            endpoint = getattr(self.games_client, endpoint_name)
+        # load newly activated run and, unless LAZY_RUNS, all its child scopes
+        run_class = self.endpoint_to_classes['runs']
+        result = await self.storage.get('runs', id=run_pk)
+        scope = run_class.from_json(self.session, self, result)
+        self.scopes[run_class.resource_name].append(scope)
+        self.log.debug('loaded activated run {pk}', pk=run_pk)
 
-            if endpoint_name == 'phases' or endpoint_name == 'roles':
-                continue
-            elif endpoint_name == 'runs':
-                result = await endpoint.get(id=run_pk)
-                scope = await scope_class.create(self.session,
-                                                 game=self,
-                                                 json=result.payload)
-                self.scopes[scope_class.resource_name].append(scope)
-                run_scopes.append(scope)
-                self.log.debug('loaded activated run {pk}', pk=run_pk)
-            else:
-                manager = \
-                    await self.restore_endpoint(endpoint,
-                                                scope_class,
-                                                params={'run': run_pk})
-                scope_class_manager = self.scopes[scope_class.resource_name]
-                for scope in manager:
-                    scope_class_manager.append(scope)
-                    run_scopes.append(scope)
-                self.log.debug('loaded all {len} {children} of activated run',
-                               len=len(manager), children=endpoint_name)
-
-        for scope in run_scopes:
-            await scope.start()
+        if LAZY_RUNS:
+            # its child scopes are loaded by `hydrate_run` when needed
+            await self.start_scopes([scope])
+            return
+
+        run_scopes = [scope] + await self.restore_run_children(run_pk)
+        await self.start_scopes(run_scopes)
 
         self.log.info('Started {total} scopes of activated run',
                       total=len(run_scopes))
 
+    async def restore_run_children(self, run_pk):
+        """
+        Loads the child scopes of run `run_pk` into the game's scopes,
+        without starting them. Scopes that are already loaded are kept.
+
+        :return: list -- the loaded scopes
+        """
+        run_scopes = []
+        managers = await self.restore_endpoints(OrderedDict(
+            (endpoint_name, {'run': run_pk})
+            for endpoint_name in self.endpoint_to_classes
+            if endpoint_name not in ('phases', 'roles', 'runs')
+        ))
+        for endpoint_name, manager in managers.items():
+            scope_class = self.endpoint_to_classes[endpoint_name]
+            scope_class_manager = self.scopes[scope_class.resource_name]
+            for scope in manager:
+                if scope in scope_class_manager:
+                    continue
+                await self.load_scope(scope)
+                run_scopes.append(scope)
+            self.log.debug('loaded all {len} {children} of run {pk}',
+                           len=len(manager), children=endpoint_name,
+                           pk=run_pk)
+        return run_scopes
+
+    async def hydrate_run(self, run_pk):
+        """
+        With ``LAZY_RUNS``, loads and starts the child scopes of run `run_pk`
+        the first time they are needed. Concurrent callers wait for the same
+        load, and the next caller tries again if it fails.
+        """
+        if not LAZY_RUNS or run_pk in self.hydrated_runs:
+            return
+        # raises ScopeNotFound for runs that aren't loaded, eg: inactive ones
+        self.get_scope('run', run_pk)
+        hydration = self.hydrations.get(run_pk)
+        if hydration is None:
+            hydration = self.hydrations[run_pk] = asyncio.ensure_future(
+                self._hydrate_run(run_pk))
+            hydration.add_done_callback(
+                lambda future: self.hydrations.pop(run_pk, None))
+        await asyncio.shield(hydration)
+
+    async def _hydrate_run(self, run_pk):
+        with Timer() as timer:
+            run_scopes = await self.restore_run_children(run_pk)
+            await self.start_scopes(run_scopes)
+            self.hydrated_runs.add(run_pk)
+        self.log.info('hydrated run {pk} with {total} scopes in {time:.03f}s',
+                      pk=run_pk, total=len(run_scopes), time=timer.elapsed)
+
+    async def hydrate_scope(self, resource_name, pk):
+        """
+        Returns scope `resource_name` `pk`, hydrating its run first if it
+        isn't loaded yet. See `hydrate_run`.
+
+        :raises ScopeNotFound: if there is no such scope
+        """
+        try:
+            return self.get_scope(resource_name, pk)
+        except ScopeNotFound:
+            if not LAZY_RUNS:
+                raise
+        endpoint_name = self.resource_classes[resource_name].resource_name_plural
+        try:
+            payload = await self.storage.get(endpoint_name, id=pk)
+        except resource_exceptions.ResourceNotFound:
+            raise ScopeNotFound(
+                "Scope {} {} not found".format(resource_name, pk))
+        run_pk = await self.get_run_pk(resource_name, payload)
+        if run_pk is not None:
+            await self.hydrate_run(run_pk)
+        return self.get_scope(resource_name, pk)
+
+    async def get_run_pk(self, resource_name, payload):
+        """
+        Returns the pk of the run of the resource of `payload`, fetching its
+        ancestors from simpl-games-api until one is loaded.
+
+        :return: int -- None for resources outside of runs, or whose
+                 ancestors don't exist anymore
+        """
+        while resource_name != 'run':
+            if payload.get('run') is not None:
+                return payload['run']
+            for parent_resource in SCOPE_PARENT_GRAPH[resource_name]:
+                if payload.get(parent_resource) is not None:
+                    break
+            else:
+                return None
+            if parent_resource == 'game':
+                return None
+
+            parent_pk = payload[parent_resource]
+            try:
+                parent = self.get_scope(parent_resource, parent_pk)
+            except ScopeNotFound:
+                endpoint_name = \
+                    self.resource_classes[parent_resource].resource_name_plural
+                try:
+                    payload = await self.storage.get(endpoint_name,
+                                                     id=parent_pk)
+                except resource_exceptions.ResourceNotFound:
+                    return None
+            else:
+                run = parent.my.run
+                return run.pk if run is not None else None
+            resource_name = parent_resource
+        return payload['id']
+
     async def restore(self):
-        # load all child scopes
-        if LOAD_ACTIVE_RUNS:
-            for endpoint_name, scope_class in self.endpoint_to_classes.items():
-                endpoint = getattr(self.games_client, endpoint_name)
-
-                if endpoint_name == 'phases' or endpoint_name == 'roles':
-                    manager = await self.restore_endpoint(endpoint,
-                                                          scope_class)
-                    self.scopes[scope_class.resource_name] = manager
-                elif endpoint_name == 'runs':
-                    manager = \
-                        await self.restore_endpoint(endpoint,
-                                                    scope_class,
-                                                    params={'active': True})
-                    self.scopes[scope_class.resource_name] = manager
-                    self.log.debug('loaded all active runs')
-                else:
-                    manager = \
-                        await self.restore_endpoint(endpoint,
-                                                    scope_class,
-                                                    params={
-                                                        'run_active': True})
-                    self.scopes[scope_class.resource_name] = manager
-                    self.log.debug('loaded all {children} of active runs',
-                                   children=endpoint_name)
-        else:
-            for endpoint_name, scope_class in self.endpoint_to_classes.items():
-                endpoint = getattr(self.games_client, endpoint_name)
-                manager = await self.restore_endpoint(endpoint, scope_class)
-                self.scopes[scope_class.resource_name] = manager
+        if LAZY_RUNS:
+            await self.route_run_scopes()
+
+        # load all child scopes, from the last snapshot if possible
+        if not await self.restore_snapshot():
+            await self.restore_scopes()
 
         # start scopes
         scopes = []
         for manager in self.scopes.values():
             scopes += [scope for scope in manager]
+        await self.start_scopes(scopes)
 
+    async def route_run_scopes(self):
+        """
+        With ``LAZY_RUNS``, routes the calls and events of the scopes of runs
+        through the dispatcher before they are loaded: scopes that aren't
+        loaded can't register them, and the dispatcher hydrates their run.
+
+        :raises ImproperlyConfigured: without ``DISPATCH_BY_RESOURCE``, or if
+                                      some routes can't be dispatched
+        """
+        if not DISPATCH_BY_RESOURCE:
+            raise ImproperlyConfigured(
+                'LAZY_RUNS requires DISPATCH_BY_RESOURCE')
+        unrouted = await self.dispatcher.join_classes([
+            scope_class
+            for endpoint_name, scope_class in self.endpoint_to_classes.items()
+            if endpoint_name not in ('phases', 'roles', 'runs')
+        ])
+        if unrouted:
+            raise ImproperlyConfigured(
+                'LAZY_RUNS requires the routes of {} to include their '
+                'pk'.format(', '.join(cls.__name__ for cls in unrouted)))
+
+    async def start_scopes(self, scopes):
+        """
+        Starts `scopes`, at most ``START_CONCURRENCY`` at a time, so that
+        their registrations share the round trips to the router.
+
+        A scope that fails to start is logged and skipped, without stopping
+        the others. Progress and rate are logged every 5%, and the stats of
+        the last call are kept in `start_stats`.
+
+        :return: list -- the scopes that failed to start
+        """
         total = len(scopes)
-        int_progress = 0
-        self.log.info('Starting scopes {progress!r}%...',
-                      progress=int_progress)
-        for i, scope in enumerate(scopes):
-            progress = (i / total) * 100
-            if int(progress) != int_progress:
-                int_progress = int(progress)
-                if int_progress % 5 == 0:
-                    self.log.info('Starting scopes {progress!r}%...',
-                                  progress=int_progress)
-            await scope.start()
+        pending = iter(scopes)
+        failed = []
+        stats = self.start_stats = {
+            'total': total,
+            'started': 0,
+            'failed': 0,
+            'elapsed': 0.0,
+            'rate': 0.0,
+        }
+        started_at = time.monotonic()
+
+        def log_progress():
+            done = stats['started'] + stats['failed']
+            stats['elapsed'] = time.monotonic() - started_at
+            if stats['elapsed'] > 0:
+                stats['rate'] = done / stats['elapsed']
+            self.log.info('Starting scopes {progress!r}% ({rate:.0f}/s)...',
+                          progress=int(done / total * 100) if total else 100,
+                          rate=stats['rate'])
+
+        async def starter():
+            # the starters share `pending`, each scope is started once
+            for scope in pending:
+                try:
+                    await scope.start()
+                except Exception as e:
+                    stats['failed'] += 1
+                    failed.append(scope)
+                    self.log.error('could not start {scope!r}: {e!r}',
+                                   scope=scope, e=e)
+                else:
+                    stats['started'] += 1
+                done = stats['started'] + stats['failed']
+                if done * 20 // total != (done - 1) * 20 // total:
+                    log_progress()
+
+        self.log.info('Starting scopes {progress!r}%...', progress=0)
+        await asyncio.gather(*[
+            starter() for _ in range(min(START_CONCURRENCY, total))
+        ])
+        log_progress()
+        if failed:
+            self.log.error('{count} of {total} scopes failed to start',
+                           count=len(failed), total=total)
+        return failed
+
+    def get_restore_endpoints(self):
+        # endpoints restored on start, the others are run scopes loaded on
+        # demand with LAZY_RUNS
+        if not LAZY_RUNS:
+            return list(self.endpoint_to_classes)
+        return [endpoint_name for endpoint_name in self.endpoint_to_classes
+                if endpoint_name in ('phases', 'roles', 'runs')]
+
+    def get_restore_params(self, endpoint_name):
+        if not LOAD_ACTIVE_RUNS or endpoint_name in ('phases', 'roles'):
+            return {}
+        elif endpoint_name == 'runs':
+            return {'active': True}
+        # children of active runs
+        return {'run_active': True}
+
+    async def restore_scopes(self):
+        """
+        Loads all child scopes from simpl-games-api.
+
+        Endpoints are restored concurrently, then their managers are
+        installed parents first, in the order of `endpoint_to_classes`. How
+        long each endpoint took is kept in `restore_stats`.
+        """
+        params_by_endpoint = OrderedDict(
+            (endpoint_name, self.get_restore_params(endpoint_name))
+            for endpoint_name in self.get_restore_endpoints()
+        )
+        stats = {}
+        with Timer() as timer:
+            managers = await self.restore_endpoints(params_by_endpoint, stats)
+        self.log.info('restored {count} endpoints in {time:.03f}s',
+                      count=len(managers), time=timer.elapsed)
+
+        self.restore_stats.clear()
+        self.hydrated_runs.clear()
+        for endpoint_name, scope_class in self.endpoint_to_classes.items():
+            if endpoint_name not in managers:
+                self.scopes[scope_class.resource_name] = ScopeManager()
+                continue
+            self.scopes[scope_class.resource_name] = managers[endpoint_name]
+            self.restore_stats[endpoint_name] = stats[endpoint_name]
+            self.log.info('restored {count} {endpoint} (fetch: {fetch:.03f}s, build: {build:.03f}s)',
+                          endpoint=endpoint_name,
+                          **self.restore_stats[endpoint_name])
+
+    async def restore_snapshot(self):
+        """
+        Loads the scopes from the snapshot written by `write_snapshot`,
+        updated with the resources modified since, according to
+        ``SNAPSHOT_MODIFIED_FIELD``.
+
+        Resources deleted while the modelservice was stopped aren't fetched,
+        so the number of scopes of each endpoint is then compared with the
+        simpl-games-api's, and the snapshot is discarded if one differs.
+
+        :return: bool -- False if there is no snapshot to restore, and the
+                 scopes must be loaded from simpl-games-api instead
+        """
+        path = get_snapshot_path(self)
+        if path is None or SNAPSHOT_MODIFIED_FIELD is None:
+            return False
+
+        loop = asyncio.get_event_loop()
+        try:
+            with Timer() as timer:
+                snapshot = await loop.run_in_executor(None, read_snapshot_file, path)
+                if snapshot is None:
+                    return False
+                check_snapshot(snapshot, self)
+                inactive_runs = await self._restore_snapshot(snapshot)
+                for run in inactive_runs:
+                    await self.unload_inactive_run_scope_tree(run)
+                await self.check_counts()
+        except Exception as e:
+            self.log.warn('could not restore snapshot {path}: {e!r}',
+                          path=path, e=e)
+            for scope_class in self.endpoint_to_classes.values():
+                self.scopes[scope_class.resource_name] = ScopeManager()
+            return False
+
+        self.log.info('restored {count} scopes from snapshot {path} in {time:.03f}s',
+                      count=sum(len(manager) for manager in self.scopes.values()),
+                      path=path, time=timer.elapsed)
+        return True
+
+    async def _restore_snapshot(self, snapshot):
+        payloads = OrderedDict(
+            (endpoint_name, OrderedDict((payload['id'], payload)
+                                        for payload in snapshot['resources'][endpoint_name]))
+            for endpoint_name in self.endpoint_to_classes
+        )
+        lookup = {
+            '{}__gte'.format(SNAPSHOT_MODIFIED_FIELD): snapshot['high_water_mark'],
+        }
+        run_endpoints = [
+            endpoint_name for endpoint_name in self.endpoint_to_classes
+            if endpoint_name not in ('phases', 'roles', 'runs')
+        ]
+
+        activated = []
+        inactive = set()
+        for endpoint_name in self.endpoint_to_classes:
+            changes = await self.storage.filter_all(endpoint_name,
+                                                    game_slug=self.slug,
+                                                    **lookup)
+            self.log.debug('{count} {endpoint} changed since the snapshot',
+                           count=len(changes), endpoint=endpoint_name)
+            for payload in changes:
+                pk = payload['id']
+                if LOAD_ACTIVE_RUNS and endpoint_name == 'runs':
+                    if not payload['active']:
+                        if pk in payloads['runs']:
+                            # unloaded with its subtree once built
+                            inactive.add(pk)
+                        else:
+                            continue
+                    elif pk not in payloads['runs']:
+                        activated.append(pk)
+                elif LOAD_ACTIVE_RUNS and endpoint_name in run_endpoints \
+                        and payload.get('run_active') is False:
+                    payloads[endpoint_name].pop(pk, None)
+                    continue
+                payloads[endpoint_name][pk] = payload
+
+        # runs activated since the snapshot bring their whole subtree
+        for run_pk in activated:
+            for endpoint_name in run_endpoints:
+                for payload in await self.storage.filter_all(
+                        endpoint_name, game_slug=self.slug, run=run_pk):
+                    payloads[endpoint_name][payload['id']] = payload
+
+        for endpoint_name, scope_class in self.endpoint_to_classes.items():
+            self.scopes[scope_class.resource_name] = ScopeManager(*[
+                scope_class.from_json(self.session, self, payload)
+                for payload in payloads.pop(endpoint_name).values()
+            ])
+
+        return [self.scopes['run'].get(id=pk) for pk in inactive]
+
+    async def check_counts(self):
+        """
+        Raises `SnapshotMismatch` if the number of scopes of an endpoint
+        differs from the number of resources simpl-games-api has, eg:
+        because some were deleted while the modelservice was stopped.
+        """
+        endpoint_names = list(self.endpoint_to_classes)
+        counts = await asyncio.gather(*[
+            self.storage.count(endpoint_name, game_slug=self.slug,
+                               **self.get_restore_params(endpoint_name))
+            for endpoint_name in endpoint_names
+        ])
+        for endpoint_name, count in zip(endpoint_names, counts):
+            scope_class = self.endpoint_to_classes[endpoint_name]
+            restored = len(self.scopes[scope_class.resource_name])
+            if count is not None and restored != count:
+                raise SnapshotMismatch(
+                    '{} {} restored instead of {}'.format(
+                        restored, endpoint_name, count))
+
+    async def write_snapshot(self):
+        """
+        Writes a snapshot of the scopes to ``SNAPSHOT_PATH``, to restore them
+        faster when the modelservice restarts. See `restore_snapshot`.
+        """
+        path = get_snapshot_path(self)
+        if path is None:
+            return
+        # snapshots must not hold changes simpl-games-api doesn't have
+        await self.save_queue.flush()
+
+        with Timer() as timer:
+            snapshot = take_snapshot(self)
+            # pickled off the event loop. If a scope changes meanwhile, the
+            # snapshot fails and the next one is written as planned
+            loop = asyncio.get_event_loop()
+            size = await loop.run_in_executor(None, dump_snapshot_file, path,
+                                              snapshot)
+        self.log.info('wrote snapshot {path} of {count} scopes ({size} bytes) in {time:.03f}s',
+                      path=path,
+                      count=sum(len(payloads) for payloads in snapshot['resources'].values()),
+                      size=size, time=timer.elapsed)
 
     async def unload_inactive_run_scope_tree(self, run):
         """
@@ -569,9 +1003,10 @@ class Game(WampScope):
         """
         self.log.info('unload_inactive_run_scope_tree: pk: {pk}', pk=run.pk)
         await run._unload_scope_tree()
+        self.hydrated_runs.discard(run.pk)
 
     async def get_pk(self):
-        json = await self.storage.load(slug=self.slug)
+        json = await self.storage.load(self, slug=self.slug)
         return json.get('id')
 
     def get_routing(self, name):
@@ -579,6 +1014,26 @@ class Game(WampScope):
                                                             name)
         return route
 
+    def get_access_keys(self, user):
+        """
+        Returns the access keys of ``user``, to be matched against the
+        `audience` of scopes. See `Traversing.audience`.
+
+        Like `Traversing.get_user_ids`, ``user`` leads the runs where their
+        own runuser is a leader.
+        """
+        keys = set()
+        for runuser in self.scopes['runuser'].filter(user=user.pk):
+            run_pk = runuser.json['run']
+            keys.add(('game',))
+            keys.add(('run', run_pk))
+            keys.add(('runuser', runuser.pk))
+            if runuser.json['world'] is not None:
+                keys.add(('world', runuser.json['world']))
+            if runuser.leader:
+                keys.add(('leader', run_pk))
+        return keys
+
     def get_scope(self, resource_name, pk):
         try:
             return self.scopes[resource_name].get(id=pk)
@@ -588,16 +1043,59 @@ class Game(WampScope):
 
     async def add_scopes(self, *scopes):
         for scope in scopes:
-            self.scopes[scope.resource_name].add(scope)
+            await self.load_scope(scope)
             await scope.start()
 
+    async def load_scope(self, scope):
+        """
+        Puts `scope` in the game's scopes and its parents' children, without
+        starting it. A loaded scope with the same pk is stopped and replaced.
+        """
+        manager = self.scopes[scope.resource_name]
+        try:
+            replaced = manager.get(id=scope.pk)
+        except ScopeNotFound:
+            pass
+        else:
+            if replaced is not scope:
+                await replaced.stop()
+                replaced.my.detach(manager.indexed_values(replaced))
+        manager.add(scope)
+        scope.my.attach()
+
     async def remove_scopes(self, *scopes):
+        """
+        Removes deleted `scopes` from the game's scopes, dropping their
+        pending write-behind saves.
+        """
+        for scope in scopes:
+            self.save_queue.discard(scope)
+            await self._remove_scope(scope)
+
+    async def unload_scopes(self, *scopes):
+        """
+        Removes `scopes` from the game's scopes, eg: because their run isn't
+        active anymore, once their pending write-behind saves are sent.
+        """
+        try:
+            await self.save_queue.flush(*scopes)
+        except Exception:
+            # already logged, the failed saves are retried
+            pass
         for scope in scopes:
-            await scope.stop()
-            self.scopes[scope.resource_name].remove(scope)
+            await self._remove_scope(scope)
+
+    async def _remove_scope(self, scope):
+        await scope.stop()
+        manager = self.scopes[scope.resource_name]
+        previous = manager.indexed_values(scope)
+        manager.remove(scope)
+        scope.my.detach(previous)
 
     async def subscribe_webhook(self):
         # Subscribe to game-specific webhooks from `Simpl-Games-API`
+        if not self.storage.webhooks:
+            return
         async with self.games_client as api_session:
             if self.game_subscription is None:
                 try:
@@ -661,16 +1159,27 @@ class Game(WampScope):
     @classmethod
     def register(cls, slug, resource_classes):
         """
-        from modelservice.games import Run, Game
+        from modelservice.games import Decision, Run, Game
 
         class CalcRun(Run):
             pass
 
 
+        class CalcDecision(Decision):
+            # filter(role=...) and filter(period=..., role=...) use an index
+            indexes = ('role', ('period', 'role'))
+
+
         Game.register('simpl-calc', [
             CalcRun,
+            CalcDecision,
         ])
+
+        Raises ``ValueError`` if a class declares invalid ``indexes``.
         """
+        for scope_class in resource_classes:
+            ScopeManager.check_indexes(scope_class)
+
         resource_classes_map = {c.resource_name: c for c in
                                 default_resource_classes}
         for scope_class in resource_classes:
@@ -26,3 +26,10 @@ SCOPE_FILTER_ATTRIBUTES = {
     'phase': ('game',),
     'role': ('game',),
 }
+
+# Specify attributes of scopes kept sorted, for range lookups
+# (eg: `filter(order__gte=2)`) and ordered traversals
+SCOPE_SORTED_ATTRIBUTES = {
+    'period': ('order',),
+    'phase': ('order',),
+}
@@ -0,0 +1,166 @@
+import asyncio
+import traceback
+
+from autobahn.wamp import types
+from autobahn.wamp.exception import ApplicationError
+
+from .exceptions import ScopeNotFound
+from ..inspector import ScopeInspector
+from ...utils.strings import no_format
+
+# pk of the stand-in scopes routed by `Dispatcher.join_classes`
+STAND_IN_PK = '__pk__'
+
+
+class Dispatcher(object):
+    """
+    Routes the calls and events of a game's scopes from a single wildcard
+    registration or subscription per resource name and method, instead of
+    one per scope, see ``DISPATCH_BY_RESOURCE``.
+
+    A scope's route, eg: ``com.example.model.decision.12.get_scope``, becomes
+    the pattern ``com.example.model.decision..get_scope``. The dispatcher
+    reads the pk back from the URI in the call's or event's details and
+    forwards to that scope, if it is started. URIs used by clients don't
+    change. With ``LAZY_RUNS``, the run of a scope that isn't loaded yet is
+    hydrated first.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        # (kind, resource_name, name) -> future of the pk's position in URIs
+        self.routes = {}
+        self.registrations = []
+
+    def __len__(self):
+        return len(self.registrations)
+
+    @property
+    def session(self):
+        return self.game.session
+
+    @property
+    def log(self):
+        return self.game.log
+
+    async def join(self, scope):
+        """
+        Makes sure `scope`'s callees and subscribers are routed to it.
+
+        :return: bool -- False if `scope`'s routes can't be matched with a
+                 pattern, and `scope` must register them itself
+        :raises: the error of a route that fails, which the next scope of the
+                 resource tries again
+        """
+        methods = [
+            ('registered', name, method, options)
+            for name, method, options in ScopeInspector.callees(scope)
+        ] + [
+            ('subscribed', name, method, options)
+            for name, method, options in ScopeInspector.subscribers(scope)
+        ]
+        for kind, name, method, options in methods:
+            key = (kind, scope.resource_name, name)
+            route = self.routes.get(key)
+            if route is None:
+                # the first scope of a resource registers it for all
+                route = self.routes[key] = asyncio.ensure_future(
+                    self.route(kind, scope, name, method, options))
+            try:
+                if await asyncio.shield(route) is None:
+                    return False
+            except Exception:
+                if self.routes.get(key) is route:
+                    # the next scope will try again
+                    del self.routes[key]
+                raise
+        return True
+
+    async def join_classes(self, scope_classes):
+        """
+        Routes the calls and events of the scopes of `scope_classes` before
+        any of them is loaded, from a stand-in scope of each class. Eg: with
+        ``LAZY_RUNS``, so that the first call to a scope of a run that isn't
+        loaded yet reaches the dispatcher, which hydrates the run.
+
+        :return: list -- the classes whose routes can't be matched with a
+                 pattern
+        """
+        unrouted = []
+        for scope_class in scope_classes:
+            scope = scope_class(self.session, self.game)
+            scope.pk = STAND_IN_PK
+            if not await self.join(scope):
+                unrouted.append(scope_class)
+        return unrouted
+
+    async def route(self, kind, scope, name, method, options):
+        uri = scope.get_routing(getattr(method, kind)).format(scope)
+        parts = uri.split('.')
+        positions = [i for i, part in enumerate(parts[:-1])
+                     if part == str(scope.pk)]
+        if not positions:
+            return None
+        position = positions[-1]
+        parts[position] = ''
+        pattern = '.'.join(parts)
+
+        options = dict(options, match='wildcard', details_arg='details')
+        try:
+            if kind == 'registered':
+                registration = await self.session.register(
+                    self.make_callee(scope.resource_name, name, position),
+                    pattern, options=types.RegisterOptions(**options))
+            else:
+                registration = await self.session.subscribe(
+                    self.make_subscriber(scope.resource_name, name, position),
+                    pattern, options=types.SubscribeOptions(**options))
+        except Exception as e:
+            self.log.error("could not route `{pattern}`: {e!r}",
+                           pattern=pattern, e=e)
+            self.log.error(no_format(traceback.format_exc()))
+            raise
+        self.registrations.append((kind, registration))
+        self.log.debug("`{pattern}` routed", pattern=pattern)
+        return position
+
+    async def get_scope(self, resource_name, uri, position):
+        pk = uri.split('.')[position]
+        scope = await self.game.hydrate_scope(
+            resource_name, int(pk) if pk.isdigit() else pk)
+        if not scope.wamp.started:
+            raise ScopeNotFound(
+                "Scope {} {} not started".format(resource_name, pk))
+        return scope
+
+    def make_callee(self, resource_name, name, position):
+        async def callee(*args, **kwargs):
+            uri = kwargs['details'].procedure
+            try:
+                scope = await self.get_scope(resource_name, uri, position)
+            except ScopeNotFound:
+                raise ApplicationError(ApplicationError.NO_SUCH_PROCEDURE,
+                                       'no callee registered for procedure '
+                                       '<{}>'.format(uri))
+            return await getattr(scope, name)(*args, **kwargs)
+        return callee
+
+    def make_subscriber(self, resource_name, name, position):
+        async def subscriber(*args, **kwargs):
+            topic = kwargs['details'].topic
+            try:
+                scope = await self.get_scope(resource_name, topic, position)
+            except ScopeNotFound:
+                self.log.debug("no scope for event `{topic}`", topic=topic)
+                return
+            return await getattr(scope, name)(*args, **kwargs)
+        return subscriber
+
+    async def leave(self):
+        for kind, registration in self.registrations:
+            if kind == 'registered':
+                await registration.unregister()
+            else:
+                await registration.unsubscribe()
+        self.registrations = []
+        self.routes.clear()
@@ -1,11 +1,54 @@
-from collections import defaultdict, OrderedDict
+import operator
+from bisect import bisect_left, insort
+from collections import defaultdict
 
-from .constants import SCOPE_FILTER_ATTRIBUTES
+from .constants import SCOPE_FILTER_ATTRIBUTES, SCOPE_SORTED_ATTRIBUTES
 from .exceptions import ScopeNotFound, MultipleScopesFound
 
+# Operators supported in lookups, eg: `filter(order__gte=2)`
+LOOKUP_OPERATORS = {
+    'exact': operator.eq,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+}
+
+
+class Top(object):
+    # Compares greater than anything. Bisecting a sorted index for
+    # `(value, TOP)` finds the position right after all the pks of `value`.
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return True
+
+
+TOP = Top()
+
+
+def split_lookup(key):
+    """
+    Splits a lookup key into its attribute and operator, eg::
+
+        split_lookup('order__gte')  # ('order', 'gte')
+        split_lookup('order')  # ('order', None)
+    """
+    attribute, separator, operator_name = key.rpartition('__')
+    if separator and operator_name in LOOKUP_OPERATORS:
+        return attribute, operator_name
+    return key, None
+
 
 class ScopeManager(object):
-    # Stores scopes indexed by pk for quick retrieval
+    # Stores scopes indexed by pk for quick retrieval.
+    # Scopes are kept in insertion order in `slots`, and `positions` maps
+    # their pk to their slot. Removing a scope leaves a tombstone (`None`) in
+    # its slot, so that other slots don't move. Tombstones are compacted away
+    # once they make up more than `max_tombstones` of the slots. Until then,
+    # positional access goes through `live`, the list of the live scopes,
+    # built on the first access after a change.
 
     ScopeNotFound = ScopeNotFound
     MultipleScopesFound = MultipleScopesFound
@@ -13,82 +56,438 @@ class ScopeManager(object):
     payload_attr = 'json'
     pk_attr = 'id'
 
+    max_tombstones = 0.5
+
     def __init__(self, *args):
-        self.scopes = OrderedDict()
+        self.slots = []
+        self.positions = {}
+        self.tombstones = 0
+        self.live = None
         self.indexes = defaultdict(lambda: defaultdict(set))
+        # Values each scope is indexed by, keyed by pk
+        self.index_values = {}
+        # Lists of `(value, pk)` tuples kept sorted, keyed by attribute
+        self.sorted_indexes = {}
+        self.sorted_values = {}
         self.extends(*args)
         super(ScopeManager, self).__init__()
 
+    # Caches the merged indexes of each scope class
+    _class_indexes = {}
+    _class_sorted_indexes = {}
+
+    @classmethod
+    def check_indexes(cls, scope_class):
+        """
+        Validates the ``indexes`` declared on a scope class.
+
+        Each index must either be an attribute name, or a tuple of at least
+        two attribute names for a composite index. Sorted indexes must be
+        attribute names.
+        """
+        sorted_indexes = getattr(scope_class, 'sorted_indexes', ())
+        if not isinstance(sorted_indexes, (tuple, list)) or not all(
+                isinstance(attribute, str) and attribute
+                for attribute in sorted_indexes):
+            raise ValueError(
+                "`{}.sorted_indexes` must be a tuple of attribute names, "
+                "not {!r}.".format(scope_class.__name__, sorted_indexes))
+
+        indexes = getattr(scope_class, 'indexes', ())
+        if not isinstance(indexes, (tuple, list)):
+            raise ValueError(
+                "`{}.indexes` must be a tuple, not {!r}.".format(
+                    scope_class.__name__, indexes))
+
+        seen = set()
+        for index in indexes:
+            attributes = index if isinstance(index, tuple) else (index,)
+            if isinstance(index, tuple) and len(index) < 2:
+                raise ValueError(
+                    "Composite index {!r} of `{}` must have at least two "
+                    "attributes.".format(index, scope_class.__name__))
+            for attribute in attributes:
+                if not isinstance(attribute, str) or not attribute:
+                    raise ValueError(
+                        "Index {!r} of `{}` is not a valid attribute "
+                        "name.".format(attribute, scope_class.__name__))
+            if index in seen:
+                raise ValueError(
+                    "Index {!r} is declared twice on `{}`.".format(
+                        index, scope_class.__name__))
+            seen.add(index)
+
     def get_indexes(self, scope):
-        # Returns attributes by which scope can be filtered
-        return SCOPE_FILTER_ATTRIBUTES[scope.resource_name]
+        # Returns attributes by which scope can be filtered: the default ones
+        # for its resource, plus the ones declared on its class
+        scope_class = type(scope)
+        try:
+            return self._class_indexes[scope_class]
+        except KeyError:
+            pass
+        indexes = tuple(SCOPE_FILTER_ATTRIBUTES[scope.resource_name])
+        for index in getattr(scope_class, 'indexes', ()):
+            if index not in indexes:
+                indexes += (index,)
+        self._class_indexes[scope_class] = indexes
+        return indexes
+
+    def get_sorted_indexes(self, scope):
+        # Returns attributes by which scope is kept sorted
+        scope_class = type(scope)
+        try:
+            return self._class_sorted_indexes[scope_class]
+        except KeyError:
+            pass
+        attributes = tuple(SCOPE_SORTED_ATTRIBUTES.get(scope.resource_name, ()))
+        for attribute in getattr(scope_class, 'sorted_indexes', ()):
+            if attribute not in attributes:
+                attributes += (attribute,)
+        self._class_sorted_indexes[scope_class] = attributes
+        return attributes
+
+    def get_sorted_value(self, attribute, scope):
+        # Scopes without a value are left out of sorted indexes
+        return getattr(scope, self.payload_attr).get(attribute)
+
+    def add_to_sorted_index(self, attribute, value, pk):
+        if value is not None:
+            insort(self.sorted_indexes.setdefault(attribute, []), (value, pk))
+
+    def remove_from_sorted_index(self, attribute, value, pk):
+        if value is None:
+            return
+        entries = self.sorted_indexes[attribute]
+        position = bisect_left(entries, (value, pk))
+        if position < len(entries) and entries[position] == (value, pk):
+            del entries[position]
 
     def get_pk(self, scope):
         return getattr(scope, self.payload_attr)[self.pk_attr]
 
     def get_index_value(self, index, scope):
-        return getattr(scope, self.payload_attr)[index]
+        payload = getattr(scope, self.payload_attr)
+        if isinstance(index, tuple):
+            # Composite index
+            return tuple(payload[attribute] for attribute in index)
+        return payload[index]
 
     def add_to_index(self, index, scope):
         index_value = self.get_index_value(index, scope)
         self.indexes[index][index_value].add(scope)
+        return index_value
 
     def remove_from_index(self, index, scope):
         index_value = self.get_index_value(index, scope)
-        self.indexes[index][index_value].remove(scope)
+        self._discard(index, index_value, scope)
+
+    def _discard(self, index, index_value, scope):
+        entries = self.indexes[index]
+        scopes = entries.get(index_value)
+        if scopes is not None:
+            scopes.discard(scope)
+            if not scopes:
+                # Don't keep empty entries around for values no longer used
+                del entries[index_value]
 
     def reset(self):
-        self.scopes = OrderedDict()
+        self.slots = []
+        self.positions = {}
+        self.tombstones = 0
+        self.live = None
         self.indexes = defaultdict(lambda: defaultdict(set))
+        self.index_values = {}
+        self.sorted_indexes = {}
+        self.sorted_values = {}
+
+    def _index(self, scope):
+        # Adds scope to its indexes, and remembers the values it was indexed
+        # by, so that it can be moved or removed even after its json changed
+        pk = self.get_pk(scope)
+        if pk in self.index_values:
+            self._unindex(self._get(pk))
+        self.index_values[pk] = tuple(
+            self.add_to_index(index, scope)
+            for index in self.get_indexes(scope)
+        )
+
+        sorted_attributes = self.get_sorted_indexes(scope)
+        if sorted_attributes:
+            values = tuple(
+                self.get_sorted_value(attribute, scope)
+                for attribute in sorted_attributes
+            )
+            for attribute, value in zip(sorted_attributes, values):
+                self.add_to_sorted_index(attribute, value, pk)
+            self.sorted_values[pk] = values
+
+    def _unindex(self, scope):
+        pk = self.get_pk(scope)
+        index_values = self.index_values.pop(pk, None)
+        indexes = self.get_indexes(scope)
+        if index_values is None:
+            index_values = [self.get_index_value(index, scope) for index in indexes]
+        for index, index_value in zip(indexes, index_values):
+            self._discard(index, index_value, scope)
+
+        sorted_values = self.sorted_values.pop(pk, None)
+        if sorted_values is not None:
+            sorted_attributes = self.get_sorted_indexes(scope)
+            for attribute, value in zip(sorted_attributes, sorted_values):
+                self.remove_from_sorted_index(attribute, value, pk)
+
+    def indexed_values(self, scope):
+        """
+        Returns the values ``scope`` was last indexed by, keyed by index.
+        """
+        values = self.index_values.get(self.get_pk(scope), ())
+        return dict(zip(self.get_indexes(scope), values))
+
+    def reindex(self, scope):
+        """
+        Moves ``scope`` to the index entries matching its current json.
+
+        Only the entries whose values changed since the scope was last indexed
+        are touched. Call it after reassigning or mutating the scope's json.
+
+        :return: tuple -- the indexes whose values changed
+        """
+        pk = self.get_pk(scope)
+        if self._get(pk) is not scope:
+            return ()
+
+        changed = []
+
+        indexes = self.get_indexes(scope)
+        old_values = self.index_values[pk]
+        new_values = tuple(
+            self.get_index_value(index, scope) for index in indexes
+        )
+        if old_values != new_values:
+            for index, old_value, new_value in zip(indexes, old_values, new_values):
+                if old_value != new_value:
+                    self._discard(index, old_value, scope)
+                    self.indexes[index][new_value].add(scope)
+                    changed.append(index)
+            self.index_values[pk] = new_values
+
+        sorted_attributes = self.get_sorted_indexes(scope)
+        if sorted_attributes:
+            old_values = self.sorted_values[pk]
+            new_values = tuple(
+                self.get_sorted_value(attribute, scope)
+                for attribute in sorted_attributes
+            )
+            for attribute, old_value, new_value in zip(sorted_attributes, old_values, new_values):
+                if old_value != new_value:
+                    self.remove_from_sorted_index(attribute, old_value, pk)
+                    self.add_to_sorted_index(attribute, new_value, pk)
+                    changed.append(attribute)
+            self.sorted_values[pk] = new_values
+
+        return tuple(changed)
+
+    def _get(self, pk):
+        slot = self.positions.get(pk)
+        if slot is None:
+            return None
+        return self.slots[slot]
+
+    def _position(self, scope):
+        return self.positions[self.get_pk(scope)]
+
+    def compact(self):
+        """
+        Drops the tombstones left by removed scopes, preserving order.
+        """
+        slots = [scope for scope in self.slots if scope is not None]
+        self.positions = {
+            self.get_pk(scope): slot for slot, scope in enumerate(slots)
+        }
+        # Replace rather than mutate, so that running iterations are not
+        # affected
+        self.slots = slots
+        self.tombstones = 0
+        self.live = None
 
     def extends(self, *args):
+        self.live = None
         for arg in args:
-            self.scopes[self.get_pk(arg)] = arg
-            for index in self.get_indexes(arg):
-                self.add_to_index(index, arg)
+            self._index(arg)
+            pk = self.get_pk(arg)
+            slot = self.positions.get(pk)
+            if slot is None:
+                self.positions[pk] = len(self.slots)
+                self.slots.append(arg)
+            else:
+                self.slots[slot] = arg
 
     def _lookup(self, scope, **kwargs):
         payload = getattr(scope, self.payload_attr)
         for key, value in kwargs.items():
+            attribute, operator_name = split_lookup(key)
             try:
-                if payload[key] != value:
-                    return False
+                actual = payload[attribute]
             except KeyError:
                 raise ValueError(
                     "Scope `{}` does not have attribute `{}`. Available attributes are: {!r}".format(
-                        scope.resource_name, key, list(payload.keys())
+                        scope.resource_name, attribute, list(payload.keys())
                     )
                 )
+            if operator_name is None or operator_name == 'exact':
+                if actual != value:
+                    return False
+            elif actual is None or \
+                    not LOOKUP_OPERATORS[operator_name](actual, value):
+                return False
         return True
 
-    def filter(self, **kwargs):
-        if len(kwargs) == 1:
-            k, v = list(kwargs.items())[0]
-        else:
-            k = None
+    def _range(self, attribute, bounds):
+        # Returns the scopes whose `attribute` satisfies all the
+        # `(operator_name, value)` bounds, by bisecting its sorted index
+        entries = self.sorted_indexes[attribute]
+        start, end = 0, len(entries)
+        for operator_name, value in bounds:
+            if operator_name in ('exact', 'gte'):
+                start = max(start, bisect_left(entries, (value,)))
+            elif operator_name == 'gt':
+                start = max(start, bisect_left(entries, (value, TOP)))
+            if operator_name in ('exact', 'lte'):
+                end = min(end, bisect_left(entries, (value, TOP)))
+            elif operator_name == 'lt':
+                end = min(end, bisect_left(entries, (value,)))
+        return {self._get(pk) for _, pk in entries[start:end]}
+
+    def _plan(self, **kwargs):
+        """
+        Splits lookups into index candidate sets and residual lookups.
 
-        if k is not None and k in self.indexes:
-            scopes = self.indexes[k][v]
-            results = ScopeManager(*[
-                scope for scope in scopes
-            ])
-        else:
-            results = ScopeManager(*[
-                scope for scope in self.scopes.values() if
+        Returns a tuple ``(candidates, residual)``, where ``candidates`` is a
+        list of scope sets taken from the indexes, sorted smallest first, and
+        ``residual`` holds the lookups that have no index and must be matched
+        with ``_lookup``. Composite indexes are used for the lookups they
+        fully cover, and sorted indexes for range lookups.
+        """
+        candidates = []
+        covered = set()
+        for index in self.indexes:
+            if isinstance(index, tuple) and covered.isdisjoint(index) and \
+                    all(attribute in kwargs for attribute in index):
+                value = tuple(kwargs[attribute] for attribute in index)
+                candidates.append(self.indexes[index].get(value, set()))
+                covered.update(index)
+
+        residual = {}
+        bounds = defaultdict(list)
+        for key, value in kwargs.items():
+            if key in covered:
+                continue
+            attribute, operator_name = split_lookup(key)
+            if operator_name is None and key in self.indexes:
+                candidates.append(self.indexes[key].get(value, set()))
+            elif attribute in self.sorted_indexes and value is not None:
+                bounds[attribute].append((operator_name or 'exact', value))
+            else:
+                residual[key] = value
+
+        for attribute, attribute_bounds in bounds.items():
+            candidates.append(self._range(attribute, attribute_bounds))
+        candidates.sort(key=len)
+        return candidates, residual
+
+    def _intersect(self, candidates):
+        # Intersect index sets, smallest first, bailing out as soon as
+        # the intersection is empty
+        scopes = candidates[0]
+        for candidate in candidates[1:]:
+            if not scopes:
+                break
+            scopes = scopes.intersection(candidate)
+        return scopes
+
+    def select(self, **kwargs):
+        """
+        Returns a list of the scopes matching the lookups, in insertion order,
+        using the indexes whenever possible.
+        """
+        candidates, residual = self._plan(**kwargs)
+
+        if not candidates:
+            return [
+                scope for scope in self if
                 self._lookup(scope, **kwargs)
-            ])
-        return results
+            ]
+
+        scopes = self._intersect(candidates)
+        if residual:
+            scopes = [
+                scope for scope in scopes
+                if self._lookup(scope, **residual)
+            ]
+        return sorted(scopes, key=self._position)
+
+    def count_matching(self, **kwargs):
+        """
+        Returns how many scopes match the lookups. When all the lookups are
+        covered by a single index, the matching scopes are not visited at all.
+        """
+        candidates, residual = self._plan(**kwargs)
+        if len(candidates) == 1 and not residual:
+            return len(candidates[0])
+        return len(self.select(**kwargs))
+
+    def matches(self, scope, **kwargs):
+        # Tells whether a scope belongs to this manager and matches lookups
+        stored = self._get(self.get_pk(scope))
+        return stored is scope and self._lookup(scope, **kwargs)
+
+    def filter(self, **kwargs):
+        """
+        Returns a lazy view of the scopes matching the lookups
+        :return: ScopeView -- may be empty
+        """
+        return ScopeView(self, kwargs)
 
     def for_user(self, user):
         """
-        Returns manager for this manager's scopes the user may access
+        Returns a lazy view of this manager's scopes the user may access
         :param user: SimplUser
-        :return: ScopeManager -- may be empty
+        :return: ScopeView -- may be empty
+        """
+        return ScopeView(self).for_user(user)
+
+    def order_by(self, *attributes):
+        """
+        Returns a lazy view of this manager's scopes sorted by ``attributes``.
+        Prefix an attribute with ``-`` to sort in descending order.
+        :return: ScopeView
+        """
+        return ScopeView(self).order_by(*attributes)
+
+    def next_after(self, attribute, value):
+        """
+        Returns the scope with the smallest ``attribute`` greater than
+        ``value``, eg: ``game.phases.next_after('order', phase.json['order'])``
         """
-        return ScopeManager(*[
-            scope for scope in self.scopes.values()
-            if user.pk in scope.my.get_user_ids(leader=user.runuser.leader)
-        ])
+        entries = self.sorted_indexes.get(attribute)
+        if entries is None:
+            return ScopeView(self).next_after(attribute, value)
+        position = bisect_left(entries, (value, TOP))
+        if position == len(entries):
+            raise ScopeNotFound({attribute + '__gt': value})
+        return self._get(entries[position][1])
+
+    def previous_before(self, attribute, value):
+        """
+        Returns the scope with the greatest ``attribute`` lower than ``value``
+        """
+        entries = self.sorted_indexes.get(attribute)
+        if entries is None:
+            return ScopeView(self).previous_before(attribute, value)
+        position = bisect_left(entries, (value,))
+        if position == 0:
+            raise ScopeNotFound({attribute + '__lt': value})
+        return self._get(entries[position - 1][1])
 
     def all(self):
         return self
@@ -97,45 +496,51 @@ class ScopeManager(object):
         if len(kwargs) == 1:
             k, v = list(kwargs.items())[0]
             if k == self.pk_attr:
-                try:
-                    return self.scopes[v]
-                except KeyError:
+                scope = self._get(v)
+                if scope is None:
                     raise self.ScopeNotFound(kwargs)
+                return scope
 
-        found = self.filter(**kwargs)
-        if len(found) == 0:
-            raise self.ScopeNotFound(kwargs)
-        if len(found) > 1:
-            raise self.MultipleScopesFound(kwargs)
-        return found[0]
+        return self.filter(**kwargs).get()
 
     def append(self, *scopes):
-        for scope in scopes:
-            self.scopes[self.get_pk(scope)] = scope
-            for index in self.get_indexes(scope):
-                self.add_to_index(index, scope)
+        self.extends(*scopes)
 
     def add(self, scope):
         self.append(scope)
 
     def remove(self, scope):
-        for index in self.get_indexes(scope):
-            self.remove_from_index(index, scope)
-        self.scopes.pop(self.get_pk(scope))
+        self._unindex(scope)
+        slot = self.positions.pop(self.get_pk(scope))
+        self.slots[slot] = None
+        self.tombstones += 1
+        self.live = None
+
+        # Keep a live scope in the last slot, so that `last()` stays cheap
+        while self.slots and self.slots[-1] is None:
+            self.slots.pop()
+            self.tombstones -= 1
+
+        if self.tombstones > len(self.slots) * self.max_tombstones:
+            self.compact()
 
     def exists(self):
-        if len(self.scopes) > 1:
+        if len(self.positions) > 1:
             raise MultipleScopesFound
-        return len(self.scopes) == 1
+        return len(self.positions) == 1
+
+    def first(self):
+        for scope in self:
+            return scope
+        raise ScopeNotFound(self)
 
     def last(self):
-        try:
-            return list(self.scopes.values())[-1]
-        except IndexError:
-            raise ScopeNotFound(self.scopes)
+        if not self.slots:
+            raise ScopeNotFound(self)
+        return self.slots[-1]
 
     def count(self):
-        return len(self.scopes)
+        return len(self.positions)
 
     def __repr__(self):
         return "<ScopeManager object containing {} scopes>".format(
@@ -154,22 +559,198 @@ class ScopeManager(object):
         return other + scopes
 
     def __len__(self):
-        return len(self.scopes)
+        return len(self.positions)
 
     def __getitem__(self, key):
-        return list(self.scopes.values())[key]
+        if not self.tombstones:
+            return self.slots[key]
+        if self.live is None:
+            self.live = list(self)
+        return self.live[key]
 
     def __iter__(self):
-        return self.scopes.values().__iter__()
-
-    def __next__(self):
-        return self.scopes.values().__next__()
+        return (scope for scope in self.slots if scope is not None)
 
     def __contains__(self, item):
-        return self.get_pk(item) in self.scopes
+        return self.get_pk(item) in self.positions
 
     def __eq__(self, other):
         return [scope for scope in self] == other
 
     def __ne__(self, other):
         return [scope for scope in self] != other
+
+
+def user_can_access(user):
+    """
+    Returns a predicate telling whether ``user`` may access a scope, by
+    intersecting the user's access keys with the scope's audience.
+    """
+    access_keys = []
+
+    def predicate(scope):
+        if not access_keys:
+            # The keys only depend on the user, compute them once per view
+            access_keys.append(scope.game.get_access_keys(user))
+        return not access_keys[0].isdisjoint(scope.my.audience)
+
+    return predicate
+
+
+class ScopeView(object):
+    """
+    A lazy, read-only selection of a ``ScopeManager``'s scopes.
+
+    A view only keeps a reference to its manager and the pending lookups and
+    predicates. They are evaluated against the manager's indexes the first
+    time the view is iterated, counted or indexed, and the result is cached
+    on the view. Filtering a view returns a new view on the same manager, so
+    chained filters never copy scopes or build indexes.
+    """
+
+    ScopeNotFound = ScopeNotFound
+    MultipleScopesFound = MultipleScopesFound
+
+    def __init__(self, manager, lookups=None, predicates=(), empty=False,
+                 ordering=()):
+        self.manager = manager
+        self.lookups = lookups or {}
+        self.predicates = tuple(predicates)
+        self.empty = empty
+        self.ordering = tuple(ordering)
+        self._result_cache = None
+        super(ScopeView, self).__init__()
+
+    def _clone(self, lookups=None, predicates=(), empty=False, ordering=None):
+        return self.__class__(
+            self.manager,
+            lookups=lookups if lookups is not None else self.lookups,
+            predicates=self.predicates + tuple(predicates),
+            empty=self.empty or empty,
+            ordering=ordering if ordering is not None else self.ordering,
+        )
+
+    def _sort(self, scopes):
+        payload_attr = self.manager.payload_attr
+        # Sort by the least significant attribute first, relying on the sort
+        # being stable. Scopes without a value go last.
+        for attribute in reversed(self.ordering):
+            descending = attribute.startswith('-')
+            attribute = attribute.lstrip('-')
+
+            def key(scope):
+                value = getattr(scope, payload_attr)[attribute]
+                return (value is None) != descending, value
+
+            scopes.sort(key=key, reverse=descending)
+        return scopes
+
+    def _fetch(self):
+        if self._result_cache is None:
+            if self.empty:
+                scopes = []
+            else:
+                scopes = self.manager.select(**self.lookups)
+                for predicate in self.predicates:
+                    scopes = [scope for scope in scopes if predicate(scope)]
+            scopes = list(scopes)
+            if self.ordering:
+                scopes = self._sort(scopes)
+            self._result_cache = scopes
+        return self._result_cache
+
+    def filter(self, **kwargs):
+        lookups = dict(self.lookups)
+        empty = False
+        for key, value in kwargs.items():
+            if key in lookups and lookups[key] != value:
+                # Conflicting lookups on the same attribute never match
+                empty = True
+            lookups[key] = value
+        return self._clone(lookups=lookups, empty=empty)
+
+    def for_user(self, user):
+        return self._clone(predicates=(user_can_access(user),))
+
+    def order_by(self, *attributes):
+        return self._clone(ordering=attributes)
+
+    def next_after(self, attribute, value):
+        return self.filter(**{attribute + '__gt': value}) \
+            .order_by(attribute).first()
+
+    def previous_before(self, attribute, value):
+        return self.filter(**{attribute + '__lt': value}) \
+            .order_by('-' + attribute).first()
+
+    def all(self):
+        return self
+
+    def get(self, **kwargs):
+        found = self.filter(**kwargs) if kwargs else self
+        scopes = found._fetch()
+        if len(scopes) == 0:
+            raise self.ScopeNotFound(kwargs or self.lookups)
+        if len(scopes) > 1:
+            raise self.MultipleScopesFound(kwargs or self.lookups)
+        return scopes[0]
+
+    def exists(self):
+        count = self.count()
+        if count > 1:
+            raise MultipleScopesFound
+        return count == 1
+
+    def first(self):
+        try:
+            return self._fetch()[0]
+        except IndexError:
+            raise ScopeNotFound(self.lookups)
+
+    def last(self):
+        try:
+            return self._fetch()[-1]
+        except IndexError:
+            raise ScopeNotFound(self.lookups)
+
+    def count(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        if self.empty:
+            return 0
+        if not self.predicates:
+            return self.manager.count_matching(**self.lookups)
+        return len(self._fetch())
+
+    def __repr__(self):
+        return "<ScopeView object containing {} scopes>".format(
+            self.count(),
+        )
+
+    def __add__(self, other):
+        return ScopeManager(*self._fetch()) + other
+
+    def __radd__(self, other):
+        return other + list(self._fetch())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        return self._fetch()[key]
+
+    def __iter__(self):
+        return iter(self._fetch())
+
+    def __contains__(self, item):
+        if self._result_cache is not None:
+            return item in self._result_cache
+        if self.empty or not self.manager.matches(item, **self.lookups):
+            return False
+        return all(predicate(item) for predicate in self.predicates)
+
+    def __eq__(self, other):
+        return self._fetch() == other
+
+    def __ne__(self, other):
+        return self._fetch() != other
@@ -1,21 +1,66 @@
-from typing import Dict
-
-from django.utils.functional import cached_property
+from collections import OrderedDict
+from collections.abc import Mapping
 
 from .exceptions import ScopeNotFound, ParentScopeNotFound
 from .managers import ScopeManager
 
 
+MISSING = object()
+
+
+class ChildScopes(Mapping):
+    """
+    The children of a scope by resource name, see `Traversing.child_scopes`.
+
+    Children are kept in plain ordered dicts by pk, and a `ScopeManager` of
+    a resource's children is only built when it is looked up.
+    """
+    __slots__ = ('children',)
+
+    def __init__(self, children):
+        self.children = children
+
+    def __getitem__(self, resource_name):
+        return ScopeManager(*self.children[resource_name].values())
+
+    def __iter__(self):
+        return iter(self.children)
+
+    def __len__(self):
+        return len(self.children)
+
+
 class Traversing(object):
+    __slots__ = ('scope', '_parent', '_run', '_world', '_audience', '_children')
+
     def __init__(self, scope):
         self.scope = scope
-        self.game = self.scope.game
-        self.resource_name = scope.resource_name
-        self.log = scope.log  # Not used in this file, but useful for debugging in the future
+        self._parent = MISSING
+        self._run = MISSING
+        self._world = MISSING
+        self._audience = MISSING
+        self._children = MISSING
         super(Traversing, self).__init__()
 
-    @cached_property
+    @property
+    def game(self):
+        return self.scope.game
+
+    @property
+    def resource_name(self):
+        return self.scope.resource_name
+
+    @property
+    def log(self):
+        return self.scope.log
+
+    @property
     def parent(self):
+        if self._parent is MISSING:
+            self._parent = self._get_parent()
+        return self._parent
+
+    def _get_parent(self):
         if self.resource_name == 'game':
             return None
 
@@ -38,29 +83,134 @@ class Traversing(object):
             ))
 
     @property
-    def child_scopes(self) -> Dict[str, ScopeManager]:
-        child_resources = self.scope.child_scopes_resources  # names of child scopes
-        children = {}
-        for child_resource in child_resources:
-            children[child_resource] = self.game.scopes[child_resource].filter(
-                **{self.resource_name: self.scope.pk}
-            )
-        return children
+    def audience(self):
+        """
+        Returns the access keys of this scope. A user may access the scope if
+        their own access keys (see `Game.get_access_keys`) include any of
+        them. This mirrors `get_user_ids`, without listing runusers.
+        """
+        if self._audience is MISSING:
+            self._audience = self._get_audience()
+        return self._audience
+
+    def _get_audience(self):
+        if self.resource_name == 'game':
+            return (('game',),)
+        if self.resource_name == 'run':
+            return (('run', self.scope.pk),)
+        if self.resource_name == 'runuser':
+            return (('runuser', self.scope.pk),)
+        if self.resource_name == 'world':
+            # leaders may access every world of their run
+            return (('world', self.scope.pk), ('leader', self.scope.json['run']))
+
+        world = self.world
+        if world is not None:
+            return world.my.audience
+        run = self.run
+        if run is not None:
+            return (('run', run.pk),)
+        return ()  # scope is a Phase or Role
+
+    def invalidate(self):
+        """
+        Forgets the cached ancestors of this scope and its descendants.
+        `WampScope.reindex` calls it after the scope has been moved to another
+        parent or world.
+        """
+        self._parent = MISSING
+        self._run = MISSING
+        self._world = MISSING
+        self._audience = MISSING
+        for children in self._get_children().values():
+            for child in list(children.values()):
+                child.my.invalidate()
+
+    @property
+    def child_scopes(self) -> ChildScopes:
+        """
+        Returns the children of this scope, keyed by resource name.
+
+        Children are collected on first access, then kept up to date by
+        `Game.add_scopes`, `Game.remove_scopes` and `WampScope.reindex`.
+        Each lookup returns a new `ScopeManager` of the resource's children.
+        """
+        return ChildScopes(self._get_children())
+
+    def _get_children(self):
+        if self._children is MISSING:
+            self._children = {
+                child_resource: OrderedDict(
+                    (child.pk, child)
+                    for child in self.game.scopes[child_resource].filter(
+                        **{self.resource_name: self.scope.pk})
+                )
+                for child_resource in self.scope.child_scopes_resources
+            }
+        return self._children
+
+    def loaded_parents(self, json=None):
+        """
+        Yields the loaded scopes this scope is a child of, according to
+        `json`, which defaults to the scope's json.
+        """
+        if json is None:
+            json = self.scope.json
+        for parent_resource in self.scope.parent_resource_names:
+            parent_pk = json.get(parent_resource)
+            if parent_pk is None:
+                continue
+            if parent_resource == 'game':
+                if parent_pk == self.game.pk:
+                    yield self.game
+                continue
+            try:
+                yield self.game.get_scope(parent_resource, parent_pk)
+            except ScopeNotFound:
+                pass
+
+    def attach(self, json=None):
+        """
+        Adds this scope to the cached children of its loaded parents.
+        """
+        for parent in self.loaded_parents(json):
+            parent.my._add_child(self.scope)
+
+    def detach(self, json=None):
+        """
+        Removes this scope from the cached children of its loaded parents.
+        Pass the json the scope was attached with if it changed since.
+        """
+        for parent in self.loaded_parents(json):
+            parent.my._remove_child(self.scope)
+
+    def _add_child(self, scope):
+        if self._children is not MISSING:
+            children = self._children.get(scope.resource_name)
+            if children is not None:
+                children[scope.pk] = scope
+
+    def _remove_child(self, scope):
+        if self._children is not MISSING:
+            children = self._children.get(scope.resource_name)
+            if children is not None:
+                children.pop(scope.pk, None)
 
     @property
     def run(self):
+        if self._run is MISSING:
+            self._run = self._get_run()
+        return self._run
+
+    def _get_run(self):
         if self.resource_name in ('game', 'phase', 'role'):
             return None
 
-        scope = self.scope
-
-        if scope.resource_name == 'scenario' and scope.world is None:
-            return scope.runuser.run
-
-        while scope.my.parent is not None and scope.resource_name != 'run':
-            scope = scope.my.parent
+        if self.resource_name == 'run':
+            return self.scope
 
-        return scope
+        # Scenarios unassociated with a world have their runuser as parent
+        return self.parent.my.run
 
     @property
     def runusers(self):
@@ -76,52 +226,35 @@ class Traversing(object):
         # Scenarios and deeper into the tree of relationships may not be
         # associated to a World.  In that case, only send them to the
         # corresponding runuser on the Scenario
-        if self.resource_name == 'scenario':
-            if self.scope.world is None:
+        if self.resource_name in ('scenario', 'period', 'decision', 'result'):
+            world = self.world
+            if world is not None:
+                return world.runusers
+            if self.resource_name == 'scenario':
                 return [self.scope.runuser]
-            else:
-                return self.scope.world.runusers
-
-        if self.resource_name == 'period':
-            if self.scope.my.parent.world is None:
-                return [self.scope.my.parent.runuser]
-            else:
-                return self.scope.my.parent.world.runusers
-
-        if self.resource_name == 'decision':
-            if self.scope.my.parent.scenario.world is None:
-                return [self.scope.my.parent.scenario.runuser]
-            else:
-                return self.scope.my.parent.scenario.world.runusers
-
-        if self.resource_name == 'result':
-            if self.scope.my.parent.scenario.world is None:
-                return [self.scope.my.parent.scenario.runuser]
-            else:
-                return self.scope.my.parent.scenario.world.runusers
+            return self.parent.my.runusers
 
         return None  # scope is a Phase or Role
 
     @property
     def world(self):
+        if self._world is MISSING:
+            self._world = self._get_world()
+        return self._world
+
+    def _get_world(self):
         if self.resource_name in ('game', 'run', 'phase', 'role'):
             return None
 
-        if self.resource_name == 'runuser':
-            return self.scope.world
+        if self.resource_name == 'world':
+            return self.scope
 
-        if self.resource_name == 'scenario':
+        if self.resource_name in ('runuser', 'scenario'):
             return self.scope.world
 
-        scope = self.scope  # scope is a World, Period, Decision, or Result
-
-        while scope.my.parent is not None and scope.resource_name != 'world':
-            scope = scope.my.parent
-
-        if scope.resource_name != 'world':
-            return None  # Period, Decision, or Result unassociated with a world
-        else:
-            return scope
+        # scope is a Period, Decision, or Result, which may be unassociated
+        # with a world
+        return self.parent.my.world
 
     def get_runusers(self, leader=False):
         """
@@ -0,0 +1,124 @@
+import os
+import pickle
+import time
+
+from collections import OrderedDict
+
+from .. import conf
+
+# Bump when the format of snapshots changes, older ones are then ignored
+SNAPSHOT_VERSION = 1
+
+
+class SnapshotMismatch(Exception):
+    """
+    The snapshot can't be restored in this game, which is restored from the
+    simpl-games-api instead.
+    """
+    pass
+
+
+def get_snapshot_path(game):
+    # scopes loaded on demand can't be snapshot consistently, see `LAZY_RUNS`
+    if conf.SNAPSHOT_PATH is None or conf.LAZY_RUNS:
+        return None
+    return conf.SNAPSHOT_PATH.format(slug=game.slug)
+
+
+def get_high_water_mark(resources, field):
+    """
+    Returns the latest value of `field`, eg: when a resource was last
+    modified, among the payloads of `resources`.
+    """
+    values = [
+        payload[field]
+        for payloads in resources.values()
+        for payload in payloads
+        if payload.get(field) is not None
+    ]
+    return max(values) if values else None
+
+
+def take_snapshot(game):
+    """
+    Returns the payloads of `game`'s scopes by endpoint name, with what is
+    needed to check they can be restored later.
+    """
+    resources = OrderedDict(
+        (endpoint_name, [scope.json for scope in game.scopes[scope_class.resource_name]])
+        for endpoint_name, scope_class in game.endpoint_to_classes.items()
+    )
+    return {
+        'version': SNAPSHOT_VERSION,
+        'slug': game.slug,
+        'game': game.pk,
+        'load_active_runs': conf.LOAD_ACTIVE_RUNS,
+        'modified_field': conf.SNAPSHOT_MODIFIED_FIELD,
+        'taken': time.time(),
+        'high_water_mark': get_high_water_mark(resources,
+                                               conf.SNAPSHOT_MODIFIED_FIELD),
+        'resources': resources,
+    }
+
+
+def check_snapshot(snapshot, game):
+    """
+    Raises `SnapshotMismatch` if `snapshot` wasn't taken of `game` with the
+    current settings.
+    """
+    expected = {
+        'version': SNAPSHOT_VERSION,
+        'slug': game.slug,
+        'game': game.pk,
+        'load_active_runs': conf.LOAD_ACTIVE_RUNS,
+        'modified_field': conf.SNAPSHOT_MODIFIED_FIELD,
+    }
+    for key, value in expected.items():
+        if snapshot.get(key) != value:
+            raise SnapshotMismatch('snapshot {} is {!r} instead of {!r}'.format(
+                key, snapshot.get(key), value))
+    if snapshot['high_water_mark'] is None:
+        raise SnapshotMismatch('snapshot has no high-water mark')
+    if list(snapshot['resources']) != list(game.endpoint_to_classes):
+        raise SnapshotMismatch('snapshot endpoints are {!r}'.format(
+            list(snapshot['resources'])))
+
+
+def dump_snapshot(snapshot):
+    return pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def dump_snapshot_file(path, snapshot):
+    """
+    Dumps `snapshot` to `path`, see `write_snapshot_file`. Meant to run in
+    an executor, off the event loop.
+
+    :return: int -- the size of the snapshot, in bytes
+    """
+    data = dump_snapshot(snapshot)
+    write_snapshot_file(path, data)
+    return len(data)
+
+
+def write_snapshot_file(path, data):
+    """
+    Replaces the snapshot at `path` with `data` atomically, so that a crash
+    while writing leaves the previous snapshot.
+    """
+    tmp_path = '{}.tmp'.format(path)
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot_file(path):
+    """
+    :return: the snapshot at `path`, or None if there is none
+    """
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
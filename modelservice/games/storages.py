@@ -1,11 +1,20 @@
+import asyncio
+import math
+
+from collections import deque
 from typing import List, Union
 
 from django.core.cache import cache, caches, InvalidCacheBackendError
 
 from genericclient_aiohttp import Resource
+from genericclient_base import exceptions
+from yarl import URL
 
+from .caches import storage_cache
+from .. import conf
 from .scopes.managers import ScopeManager
 from ..simpl import games_client
+from ..simpl.memory import MemoryStore
 from ..utils.strings import encode_dict
 
 try:
@@ -14,29 +23,127 @@ except InvalidCacheBackendError:
     user_cache = cache
 
 
+def get_page_count(response):
+    """
+    Returns how many pages of results there are, from the ``last`` link or
+    the ``X-Total-Count`` header of the first page, or None if neither is
+    there.
+    """
+    last = response.links.get('last')
+    if last is not None:
+        page = URL(last['url']).query.get('page')
+        if page is not None and page.isdigit():
+            return int(page)
+    total = response.headers.get('X-Total-Count')
+    if total is not None and response.data:
+        return math.ceil(int(total) / len(response.data))
+    return None
+
+
 class BaseStorage(object):
-    def __init__(self, scope):
-        self.scope = scope
+    """
+    Loads and saves the resources of a game's scopes. Each game has a single
+    storage, shared by its scopes: methods that act on a scope's resource
+    take the scope.
+    """
+    __slots__ = ('game',)
+
+    games_client = games_client
+
+    # Whether `Game.subscribe_webhook` should subscribe to the webhooks of
+    # the simpl-games-api
+    webhooks = False
+
+    def __init__(self, game):
+        self.game = game
         super(BaseStorage, self).__init__()
 
-    @property
-    def resource_name(self):
-        return self.scope.resource_name
+    def invalidate(self, endpoint_name, payload):
+        """
+        Called with webhooks' payloads, before they are forwarded to the
+        scopes. Storages that cache resources should forget `payload` here.
+        """
+        pass
+
+    def get_save_json(self, scope, json=None):
+        """
+        Returns the scope's json, with its parent's pk and updated with
+        `json`.
+        """
+        save_json = {
+            scope.my.parent.resource_name: scope.my.parent.pk,
+        }
+        save_json.update(scope.json)
+        if json is not None:
+            save_json.update(json)
+        return save_json
+
+    def get_patch_json(self, scope, save_json, json, fields):
+        """
+        Returns the attributes of `save_json` to send with a PATCH: `fields`
+        and the ones `json` changes. Returns None if the whole `save_json`
+        must be saved, because `fields` is None or the resource is new.
+        """
+        if fields is None or 'id' not in save_json:
+            return None
+        fields = set(fields)
+        fields.update(field for field in json
+                      if json[field] != scope.json.get(field))
+        fields.discard('id')
+        return {field: save_json[field] for field in fields}
+
+    async def get_user(self, scope, **lookup) -> Resource:
+        """
+        Fetches a user on simpl-games-api according to the passed keyword arguments,
+        and monkeypatches it with the appropriate runuser::
+
+            user = await self.get_user(scope, id=123)
+            # or
+            user = await self.get_user(scope, email='s1@mysim.edu')
+
+        :param scope: The scope the user is fetched for
+        :param lookup: Keyword arguments for the lookup on simpl-games-api
+        :return: The user monkeypatched with the appropriate runuser for `scope`.
+        """
+        scope.log.debug('get_user: {name} pk: {pk} lookup: {lookup}',
+                        name=scope.resource_name, pk=scope.pk, lookup=lookup)
+
+        user_json = await self.get('users', **lookup)
+        user = Resource(self.games_client.users, **user_json)
+
+        if scope.my.run is not None:
+            if scope.resource_name == 'runuser':
+                runuser = Resource(self.games_client.runusers, **scope.json)
+            else:
+                try:
+                    runuser_json = self.game.scopes['runuser'].get(
+                        user=user.pk,
+                        run=scope.my.run.pk
+                    ).json
+                except ScopeManager.ScopeNotFound:
+                    scope.log.info(
+                        'get_user: get missing runuser scope user: {user} run: {run}',
+                        user=user.pk,
+                        run=scope.my.run.pk)
+                    runuser_json = await self.get('runusers', user=user.pk,
+                                                  run=scope.my.run.pk)
+                runuser = Resource(self.games_client.runusers, **runuser_json)
+
+            user.payload.update({'runuser': runuser})
 
-    @property
-    def resource_name_plural(self):
-        return self.scope.resource_name_plural
+        return user
 
 
 class SIMPLStorage(BaseStorage):
-    def __init__(self, scope):
-        self.games_client = games_client
-        super(SIMPLStorage, self).__init__(scope)
+    __slots__ = ()
+
+    webhooks = True
+    cache = storage_cache
 
     def json_to_scope(self, resource_name_plural, json_list):
-        scope_class = self.scope.game.endpoint_to_classes[resource_name_plural]
+        scope_class = self.game.endpoint_to_classes[resource_name_plural]
         return ScopeManager(*[
-            scope_class(session=self.scope.game.session, game=self.scope.game,
+            scope_class(session=self.game.session, game=self.game,
                         json=item)
             for item in json_list
         ])
@@ -46,117 +153,260 @@ class SIMPLStorage(BaseStorage):
             endpoint, method, encode_dict(lookup)
         )
 
-    async def get(self, endpoint_name: str, timeout=1, **lookup) -> dict:
+    async def get(self, endpoint_name: str, timeout=None, **lookup) -> dict:
+        if timeout is None:
+            timeout = conf.STORAGE_CACHE_TIMEOUT
         cache_key = self._get_cache_key('get', endpoint_name, lookup)
-        # To avoid cache misses, we want to lock while the value is fetched and written to cache.
-        # To achieve this, we use a RWLock.
-
-        # A RWLock maintains a pair of associated locks, one for read-only operations and one for
-        # writing. The read lock may be held simultaneously by multiple reader tasks, so long as
-        # there are no writers. The write lock is exclusive.
-
-        # TODO: [Profile] Is it better to lock and have fewer HTTP requests, or
-        # to 'eventually cache' and have a few more HTTP reqs but not lock at
-        # all?
-        async with self.scope.game.locks[cache_key].reader:
-            payload = cache.get(cache_key)
+        payload = self.cache.get(endpoint_name, cache_key, timeout, lookup)
 
         if payload is None:
-            self.scope.log.debug('cache miss `{key}`', key=cache_key)
+            self.game.log.debug('cache miss `{key}`', key=cache_key)
+            # Concurrent misses share a single request to simpl-games-api
+            payload = await self.game.flights.run(
+                cache_key, self._fetch, endpoint_name, cache_key, timeout,
+                lookup,
+            )
+        else:
+            self.game.log.debug('cache hit `{key}`', key=cache_key)
 
-            async with self.scope.game.locks[cache_key].writer:
-                endpoint = getattr(self.games_client, endpoint_name)
-                resource = await endpoint.get(**lookup)
-                payload = resource.payload
-                cache.set(cache_key, payload, timeout)
+        return payload
 
-                self.scope.log.debug('cache set `{key}`', key=cache_key)
-        else:
-            self.scope.log.debug('cache hit `{key}`', key=cache_key)
+    async def _fetch(self, endpoint_name, cache_key, timeout, lookup):
+        generation = self.cache.get_generation(endpoint_name)
+        endpoint = getattr(self.games_client, endpoint_name)
+        resource = await endpoint.get(**lookup)
+        payload = resource.payload
+        self.cache.set(endpoint_name, cache_key, payload, timeout, lookup,
+                       generation)
 
+        self.game.log.debug('cache set `{key}`', key=cache_key)
         return payload
 
-    async def filter(self, endpoint_name: str, timeout=1, **lookup) -> List[
+    async def filter(self, endpoint_name: str, timeout=None, **lookup) -> List[
         dict]:
+        if timeout is None:
+            timeout = conf.STORAGE_CACHE_TIMEOUT
         cache_key = self._get_cache_key('filter', endpoint_name, lookup)
-        # To avoid cache misses, we want to lock while the value is fetched and written to cache.
-        # To achieve this, we use a RWLock.
-
-        # A RWLock maintains a pair of associated locks, one for read-only operations and one for
-        # writing. The read lock may be held simultaneously by multiple reader tasks, so long as
-        # there are no writers. The write lock is exclusive.
-
-        # TODO: [Profile] Is it better to lock and have fewer HTTP requests, or
-        # to 'eventually cache' and have a few more HTTP reqs but not lock at
-        # all?
-        async with self.scope.game.locks[cache_key].reader:
-            payloads = cache.get(cache_key)
+        payloads = self.cache.get(endpoint_name, cache_key, timeout, lookup)
         if payloads is None:
-            async with self.scope.game.locks[cache_key].writer:
-                endpoint = getattr(self.games_client, endpoint_name)
-                resources = await endpoint.filter(**lookup)
-                payloads = [resource.payload for resource in resources]
-                cache.set(cache_key, payloads, timeout)
+            # Concurrent misses share a single request to simpl-games-api
+            payloads = await self.game.flights.run(
+                cache_key, self._fetch_many, endpoint_name, cache_key, timeout,
+                lookup,
+            )
         return payloads
 
-    async def save(self, json=None):
+    async def _fetch_many(self, endpoint_name, cache_key, timeout, lookup):
+        generation = self.cache.get_generation(endpoint_name)
+        endpoint = getattr(self.games_client, endpoint_name)
+        resources = await endpoint.filter(**lookup)
+        payloads = [resource.payload for resource in resources]
+        self.cache.set(endpoint_name, cache_key, payloads, timeout, lookup,
+                       generation)
+        return payloads
+
+    async def filter_all(self, endpoint_name: str, **lookup) -> List[dict]:
+        """
+        Returns every resource matching `lookup`, bypassing the cache.
+        """
+        return [
+            payload
+            async for page in self.iter_pages(endpoint_name, **lookup)
+            for payload in page
+        ]
+
+    async def count(self, endpoint_name: str, **lookup) -> Union[int, None]:
+        """
+        Returns how many resources match `lookup`, bypassing the cache, from
+        a page of a single resource. Returns None if the response doesn't
+        tell.
+        """
+        endpoint = getattr(self.games_client, endpoint_name)
+        lookup['page_size'] = 1
+        response = await self._get_page(endpoint, endpoint.url,
+                                        endpoint.convert_lookup(lookup))
+        if not response.data:
+            return 0
+        count = get_page_count(response)
+        if count is None and response.links.get('next') is None:
+            # all the results are there
+            return len(response.data)
+        return count
+
+    async def iter_pages(self, endpoint_name: str, **lookup):
+        """
+        Yields the pages of resources matching `lookup` in order, bypassing
+        the cache, to restore scopes.
+
+        Pages hold ``RESTORE_PAGE_SIZE`` resources. Once the first page tells
+        how many there are, up to ``RESTORE_PAGE_WINDOW`` of the next pages
+        are requested ahead of the one being consumed. Otherwise the ``next``
+        links are followed one page at a time.
+
+        Consumers that stop early should ``await pages.aclose()``, to cancel
+        the requests ahead right away.
+        """
+        endpoint = getattr(self.games_client, endpoint_name)
+        if conf.RESTORE_PAGE_SIZE:
+            lookup['page_size'] = conf.RESTORE_PAGE_SIZE
+        response = await self._get_page(endpoint, endpoint.url,
+                                        endpoint.convert_lookup(lookup))
+        link = response.links.get('next')
+        page_count = get_page_count(response)
+        page, response = response.data, None
+        yield page
+        del page
+
+        if link is not None and page_count is not None \
+                and 'page' in URL(link['url']).query:
+            # the other pages only differ from the `next` one by their number
+            url = URL(link['url'])
+
+            async def get_page(page):
+                response = await self._get_page(
+                    endpoint, str(url.update_query(page=page)))
+                return response.data
+
+            pages = iter(range(2, page_count + 1))
+            tasks = deque()
+            try:
+                while True:
+                    # keep the window of pages ahead of the consumer full
+                    for page in pages:
+                        tasks.append(asyncio.ensure_future(get_page(page)))
+                        if len(tasks) >= conf.RESTORE_PAGE_WINDOW:
+                            break
+                    if not tasks:
+                        break
+                    yield await tasks.popleft()
+            finally:
+                for task in tasks:
+                    task.cancel()
+                # retrieve their outcome, so that it isn't reported as lost
+                await asyncio.gather(*tasks, return_exceptions=True)
+        else:
+            while link is not None:
+                response = await self._get_page(endpoint, link['url'])
+                link = response.links.get('next')
+                yield response.data
+
+    async def _get_page(self, endpoint, url, params=None):
+        response = await endpoint.request('get', url, params=params)
+        if response.status_code != 200:
+            raise exceptions.HTTPError(response)
+        return response
+
+    def invalidate(self, endpoint_name, payload):
+        evicted = self.cache.invalidate(endpoint_name, payload)
+        if evicted:
+            self.game.log.debug('cache evicted {count} `{endpoint}` lookups',
+                                count=evicted, endpoint=endpoint_name)
+
+    async def save(self, scope, json=None, fields=None):
+        """
+        Creates or updates the scope's resource with the scope's json,
+        updated with `json`.
+
+        If `fields` is passed and the resource exists, only those fields and
+        the ones in `json` are sent, with a PATCH.
+
+        :return: the saved resource's payload
+        """
         if json is None:
             json = {}
-        update_json = {
-            self.scope.my.parent.resource_name: self.scope.my.parent.pk,
-        }
-        update_json.update(self.scope.json)
-        update_json.update(json)
-        endpoint = getattr(self.games_client, self.resource_name_plural)
-        resource = (await endpoint.create_or_update(update_json)).payload
+        update_json = self.get_save_json(scope, json)
+        endpoint = getattr(self.games_client, scope.resource_name_plural)
+
+        patch_json = self.get_patch_json(scope, update_json, json, fields)
+        if patch_json is not None:
+            if not patch_json:
+                return scope.json
+            resource = await self.patch(endpoint, update_json['id'],
+                                        patch_json)
+        else:
+            resource = (await endpoint.create_or_update(update_json)).payload
+        # don't wait for the webhook to forget stale lookups
+        self.invalidate(scope.resource_name_plural, resource)
         return resource
 
-    async def load(self, **kwargs):
+    async def bulk_create(self, endpoint_name: str, json_list: List[dict]) -> List[dict]:
+        """
+        Creates resources from `json_list` with a single request to the bulk
+        endpoint.
+
+        :return: the payloads of the created resources
+        """
+        endpoint = getattr(self.games_client.bulk, endpoint_name)
+        # the client only returns ids, the response has the whole payloads
+        response = await endpoint.request('post', endpoint.url, json=json_list)
+        if response.status_code != 201:
+            raise exceptions.HTTPError(response)
+        self.invalidate(endpoint_name, None)
+        return response.data
+
+    async def patch(self, endpoint, pk, payload):
+        response = await endpoint.request('patch', endpoint._urljoin(pk), json=payload)
+        if response.status_code == 404:
+            raise exceptions.ResourceNotFound(
+                "No `{}` found for pk {}".format(endpoint.name, pk))
+        return response.data
+
+    async def load(self, scope, **kwargs):
         """
         Get scope resource from database
+        :param scope:
         :param kwargs:
         :return: retrieved resource
         """
-        return await self.get(self.resource_name_plural, **kwargs)
+        return await self.get(scope.resource_name_plural, **kwargs)
 
-    async def get_user(self, **lookup) -> Resource:
-        """
-        Fetches a user on simpl-games-api according to the passed keyword arguments,
-        and monkeypatches it with the appropriate runuser::
 
-            user = await self.get_user(id=123)
-            # or
-            user = await self.get_user(email='s1@mysim.edu')
+class InMemoryStorage(BaseStorage):
+    """
+    Keeps resources in a `MemoryStore` in this process instead of the
+    simpl-games-api, for simulations that don't need persistence and for
+    benchmarks without a backend::
 
-        :param lookup: Keyword arguments for the lookup on simpl-games-api
-        :return: The user monkeypatched with the appropriate runuser for this storage's scope.
-        """
-        self.scope.log.debug('get_user: {name} pk: {pk} lookup: {lookup}',
-                             name=self.resource_name, pk=self.scope.pk,
-                             lookup=lookup)
+        SCOPE_STORAGE = 'modelservice.games.storages.InMemoryStorage'
 
-        user_json = await self.get('users', **lookup)
-        user = Resource(self.games_client.users, **user_json)
+    The store is shared by all scopes and starts empty: seed it with at least
+    the game before the modelservice starts, eg::
 
-        if self.scope.my.run is not None:
-            if self.resource_name == 'runuser':
-                runuser = Resource(self.games_client.runusers,
-                                   **self.scope.json)
-            else:
-                try:
-                    runuser_json = self.scope.game.scopes['runuser'].get(
-                        user=user.pk,
-                        run=self.scope.my.run.pk
-                    ).json
-                except ScopeManager.ScopeNotFound:
-                    self.scope.log.info(
-                        'get_user: get missing runuser scope user: {user} run: {run}',
-                        user=user.pk,
-                        run=self.scope.my.run.pk)
-                    runuser_json = await self.get('runusers', user=user.pk,
-                                                  run=self.scope.my.run.pk)
-                runuser = Resource(self.games_client.runusers, **runuser_json)
+        InMemoryStorage.store.load({'games': [{'id': 1, 'slug': 'simpl-calc'}]})
+    """
+    __slots__ = ()
 
-            user.payload.update({'runuser': runuser})
+    store = MemoryStore()
 
-        return user
+    async def get(self, endpoint_name: str, timeout=None, **lookup) -> dict:
+        return self.store.get(endpoint_name, **lookup)
+
+    async def filter(self, endpoint_name: str, timeout=None, **lookup) -> List[
+        dict]:
+        return self.store.filter(endpoint_name, **lookup)
+
+    async def filter_all(self, endpoint_name: str, **lookup) -> List[dict]:
+        return self.store.filter(endpoint_name, **lookup)
+
+    async def count(self, endpoint_name: str, **lookup) -> int:
+        return len(self.store.filter(endpoint_name, **lookup))
+
+    async def iter_pages(self, endpoint_name: str, **lookup):
+        yield self.store.filter(endpoint_name, **lookup)
+
+    async def save(self, scope, json=None, fields=None):
+        update_json = self.get_save_json(scope, json)
+        patch_json = self.get_patch_json(scope, update_json, json or {}, fields)
+        if patch_json is None:
+            return self.store.create_or_update(scope.resource_name_plural,
+                                               update_json)
+        if not patch_json:
+            return scope.json
+        return self.store.update(scope.resource_name_plural, update_json['id'],
+                                 patch_json, partial=True)
+
+    async def bulk_create(self, endpoint_name: str, json_list: List[dict]) -> List[dict]:
+        return self.store.bulk_create(endpoint_name, json_list)
+
+    async def load(self, scope, **kwargs):
+        return await self.get(scope.resource_name_plural, **kwargs)
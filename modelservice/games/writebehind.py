@@ -0,0 +1,219 @@
+import asyncio
+
+from collections import OrderedDict
+
+from genericclient_base import exceptions
+from twisted.logger import Logger
+
+from ..utils.instruments import Timer
+
+log = Logger()
+
+# Errors that saving again won't fix
+PERMANENT_ERRORS = (
+    exceptions.BadRequestError,
+    exceptions.NotAuthenticatedError,
+    exceptions.ResourceNotFound,
+)
+
+
+def is_permanent(error):
+    """
+    Returns True if `error` is a client error, eg: a 400 or a 404 because
+    the resource was deleted remotely, rather than a transient failure.
+    """
+    if isinstance(error, PERMANENT_ERRORS):
+        return True
+    status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status_code is not None and 400 <= status_code < 500 \
+        and status_code not in (408, 429)
+
+
+class SaveQueue(object):
+    """
+    Write-behind queue for the saves of scopes whose class sets
+    ``write_behind = True``.
+
+    `WampScope.save` adds the scope to the queue and returns right away. The
+    pending scopes are saved together `window` seconds after the first one
+    was added, and saving a scope again before that sends a single request
+    with its latest json.
+
+    Call ``await scope.flush()`` to save a scope now, or `flush` to drain the
+    whole queue. ``ModelComponent`` drains it when it leaves the router.
+
+    Scopes whose save fails are queued again, unless they were changed since,
+    and retried after a delay that doubles with each failure in a row, up to
+    `max_backoff` seconds. Saves that fail with a client error (see
+    `is_permanent`), or `max_retries` times in a row, are logged and dropped.
+
+    ``requested``, ``sent``, ``merged`` and ``failed`` count saves, and
+    ``rate`` is how many requests per second flushes sent. Retries count as
+    new requests.
+    """
+
+    def __init__(self, window=0.1, max_backoff=60, max_retries=5):
+        self.window = window
+        self.max_backoff = max_backoff
+        self.max_retries = max_retries
+        self.backoff = 0
+        self.pending = OrderedDict()
+        # key -> failures in a row of the scope's saves
+        self.retries = {}
+        # batches being saved -> keys of their scopes, see `flush`
+        self.in_flight = {}
+        self.task = None
+        self.requested = 0
+        self.sent = 0
+        self.failed = 0
+        self.flushes = 0
+        self.elapsed = 0.0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def __contains__(self, scope):
+        return self.get_key(scope) in self.pending
+
+    @staticmethod
+    def get_key(scope):
+        return scope.resource_name, scope.pk
+
+    @property
+    def merged(self):
+        return self.requested - self.sent - self.failed - len(self.pending)
+
+    @property
+    def rate(self):
+        if self.elapsed == 0:
+            return 0.0
+        return self.sent / self.elapsed
+
+    @property
+    def stats(self):
+        return {
+            'pending': len(self.pending),
+            'requested': self.requested,
+            'sent': self.sent,
+            'merged': self.merged,
+            'failed': self.failed,
+            'flushes': self.flushes,
+            'rate': self.rate,
+        }
+
+    def add(self, scope):
+        self.requested += 1
+        self.pending[self.get_key(scope)] = scope
+        self.schedule(self.window)
+
+    def schedule(self, delay):
+        if self.task is None:
+            self.task = asyncio.ensure_future(self._flush_later(delay))
+
+    def discard(self, scope):
+        """
+        Drops the pending save of `scope`, eg: because it was deleted.
+        """
+        key = self.get_key(scope)
+        self.retries.pop(key, None)
+        if self.pending.pop(key, None) is not None:
+            self.requested -= 1
+
+    async def _flush_later(self, delay):
+        await asyncio.sleep(delay)
+        self.task = None
+        try:
+            await self.flush()
+        except Exception:
+            # already logged, the failed scopes are queued again
+            pass
+
+    async def flush(self, *scopes):
+        """
+        Saves `scopes` now if they are pending, or every pending scope, and
+        waits for the batches already being saved, so that every save
+        requested so far has reached the storage when it returns.
+
+        Raises the first error, once every save has completed. The scopes
+        that failed are still queued, unless their save was dropped.
+        """
+        if scopes:
+            keys = [self.get_key(scope) for scope in scopes]
+            batch = [self.pending.pop(key) for key in keys if key in self.pending]
+            batches = [future for future, batch_keys in self.in_flight.items()
+                       if not batch_keys.isdisjoint(keys)]
+        else:
+            batch = list(self.pending.values())
+            self.pending.clear()
+            batches = list(self.in_flight)
+
+        if batch:
+            future = asyncio.ensure_future(self._save_batch(batch))
+            self.in_flight[future] = {self.get_key(scope) for scope in batch}
+            future.add_done_callback(
+                lambda future: self.in_flight.pop(future, None))
+            batches.append(future)
+        if not batches:
+            return
+
+        results = await asyncio.gather(*[asyncio.shield(future)
+                                         for future in batches],
+                                       return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise errors[0]
+
+    async def _save_batch(self, batch):
+        self.flushes += 1
+        with Timer() as timer:
+            results = await asyncio.gather(
+                *[self._save(scope) for scope in batch],
+                return_exceptions=True
+            )
+        self.elapsed += timer.elapsed
+
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise errors[0]
+
+    def retry(self, scope, error):
+        """
+        Queues `scope` again after its save failed with `error`, unless it is
+        already queued with newer changes.
+
+        :return: bool -- False if the save is dropped instead, because
+                 `error` is permanent or it failed `max_retries` times
+        """
+        key = self.get_key(scope)
+        retries = self.retries[key] = self.retries.get(key, 0) + 1
+        if is_permanent(error) or retries > self.max_retries:
+            del self.retries[key]
+            return False
+        if key not in self.pending:
+            self.requested += 1
+            self.pending[key] = scope
+        self.backoff = min(self.backoff * 2 or self.window, self.max_backoff)
+        self.schedule(self.backoff)
+        return True
+
+    async def _save(self, scope):
+        try:
+            json = await scope.game.storage.save(scope, scope.json,
+                                                 fields=scope.changed_fields)
+        except Exception as e:
+            self.failed += 1
+            if self.retry(scope, e):
+                log.error('write-behind save of {name} pk: {pk} failed: {e!r}',
+                          name=scope.resource_name, pk=scope.pk, e=e)
+            else:
+                log.error('write-behind save of {name} pk: {pk} failed, dropped: {e!r}',
+                          name=scope.resource_name, pk=scope.pk, e=e)
+            raise
+        self.sent += 1
+        self.backoff = 0
+        self.retries.pop(self.get_key(scope), None)
+        if scope not in self:
+            # don't overwrite changes made while the request was in flight
+            scope.json = json
+            scope.mark_saved()
+            scope.reindex()
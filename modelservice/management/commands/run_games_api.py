@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+import djclick as click
+
+from modelservice.simpl.standin import GamesAPIStandIn, start_standin
+
+
+HELPS = {
+    'host': "The host to serve the stand-in on. Defaults to 'localhost'",
+    'port': "The port to serve the stand-in on. Defaults to 8100",
+    'fixtures': "Optional JSON file of resources by endpoint name, eg: {\"games\": [{\"id\": 1, \"slug\": \"simpl-calc\"}]}",
+    'latency': "Seconds every request waits. Defaults to 0",
+    'jitter': "Up to how many seconds the latency varies. Defaults to 0",
+    'page_size': "How many resources each page of results holds. Defaults to 100",
+    'game_slug': "Prefix of the webhooks sent about game resources. Defaults to the slug of the first game",
+}
+
+
+@click.command()
+@click.option('--host', default='localhost', help=HELPS['host'])
+@click.option('--port', '-p', type=int, default=8100, help=HELPS['port'])
+@click.option('--fixtures', '-f', type=click.File(), default=None, help=HELPS['fixtures'])
+@click.option('--latency', '-l', type=float, default=0.0, help=HELPS['latency'])
+@click.option('--jitter', '-j', type=float, default=0.0, help=HELPS['jitter'])
+@click.option('--page-size', 'page_size', type=int, default=100, help=HELPS['page_size'])
+@click.option('--game-slug', 'game_slug', default=None, help=HELPS['game_slug'])
+def command(host, port, fixtures, latency, jitter, page_size, game_slug):
+    """
+    Serves an in-memory stand-in of the simpl-games-api, for benchmarks and
+    load tests without a real backend.
+    """
+    standin = GamesAPIStandIn(latency=latency, jitter=jitter,
+                              page_size=page_size, game_slug=game_slug)
+    if fixtures is not None:
+        standin.store.load(json.load(fixtures))
+
+    loop = asyncio.get_event_loop()
+    runner = loop.run_until_complete(start_standin(standin, host, port))
+    click.echo('Serving simpl-games-api stand-in on http://{}:{}/apis'.format(
+        host, port))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(runner.cleanup())
@@ -0,0 +1,34 @@
+from modelservice.games.scopes import concrete
+from modelservice.profiler import ProfileCase
+from modelservice.utils.instruments import Memory
+
+
+class ProfileMemoryTestCase(ProfileCase):
+    """
+    Profile the memory footprint of loaded scopes.
+    """
+
+    scopes_count = 10000
+
+    def profile_scope_memory(self):
+        game = concrete.Game(self.wamp, 'profile-memory')
+        game.pk = 1
+
+        with Memory() as memory:
+            scopes = [
+                concrete.Decision(self.wamp, game, {
+                    'id': pk,
+                    'period': 1,
+                    'role': None,
+                    'name': 'decision',
+                    'data': {},
+                })
+                for pk in range(self.scopes_count)
+            ]
+            manager = concrete.ScopeManager(*scopes)
+
+        self.publish_stat(
+            'profile_scope_memory_bytes_per_scope',
+            memory.allocated / len(manager),
+            fmt='Task \'profile_scope_memory\' averaged {stats.mean:.0f} bytes per loaded scope.'
+        )
@@ -0,0 +1,233 @@
+import copy
+
+from collections import OrderedDict, defaultdict
+
+from genericclient_base import exceptions
+
+
+COMPARISONS = {
+    'gt': lambda actual, value: actual > value,
+    'gte': lambda actual, value: actual >= value,
+    'lt': lambda actual, value: actual < value,
+    'lte': lambda actual, value: actual <= value,
+}
+
+
+def compare(comparison, actual, value):
+    if isinstance(actual, (int, float)) and not isinstance(value, (int, float)):
+        value = float(value)
+    elif isinstance(actual, str):
+        value = str(value)
+    return COMPARISONS[comparison](actual, value)
+
+
+# Lookup attributes the simpl-games-api filters on without them being in the
+# payloads, that the store doesn't filter on
+IGNORED_LOOKUPS = ('game_slug',)
+
+# The attributes pointing to the parent of each endpoint's resources, and
+# their endpoint, to resolve lookups on ancestors like the simpl-games-api
+# does, eg: ``scenarios?run=1``
+PARENTS = {
+    'runs': (('game', 'games'),),
+    'phases': (('game', 'games'),),
+    'roles': (('game', 'games'),),
+    'worlds': (('run', 'runs'),),
+    'runusers': (('world', 'worlds'), ('run', 'runs')),
+    'scenarios': (('world', 'worlds'), ('runuser', 'runusers')),
+    'periods': (('scenario', 'scenarios'),),
+    'decisions': (('period', 'periods'),),
+    'results': (('period', 'periods'),),
+}
+
+MISSING = object()
+
+
+def matches(lookup, payload, resolve=None):
+    """
+    Returns True if `payload` matches every attribute of `lookup`.
+
+    Values are compared as strings, the way they arrive in querystrings, and
+    attributes may end with ``__gt``, ``__gte``, ``__lt`` or ``__lte``.
+    Attributes missing from `payload` are looked up with
+    ``resolve(payload, attribute)``, which returns `MISSING` if there's no
+    such attribute: the payload doesn't match then. ``IGNORED_LOOKUPS``
+    aren't filtered on.
+    """
+    for attribute, value in lookup.items():
+        comparison = None
+        name, _, suffix = attribute.rpartition('__')
+        if suffix in COMPARISONS:
+            attribute, comparison = name, suffix
+        if attribute in IGNORED_LOOKUPS:
+            continue
+        if attribute in payload:
+            actual = payload[attribute]
+        elif resolve is not None:
+            actual = resolve(payload, attribute)
+        else:
+            actual = MISSING
+        if actual is MISSING:
+            return False
+        if comparison is not None:
+            if actual is None or not compare(comparison, actual, value):
+                return False
+        elif actual != value and str(actual).lower() != str(value).lower():
+            return False
+    return True
+
+
+class MemoryStore(object):
+    """
+    simpl-games-api resources kept in this process, by endpoint name and pk.
+
+    Backs `InMemoryStorage` and the stand-in of the simpl-games-api in
+    `modelservice.simpl.standin`. Payloads are copied in and out, so callers
+    may mutate what they get.
+
+    Seed it with `load`, eg::
+
+        store.load({
+            'games': [{'id': 1, 'slug': 'simpl-calc'}],
+            'runs': [{'id': 1, 'game': 1, 'active': True}],
+        })
+
+    `listeners` are called with ``(endpoint_name, action, payload)`` when a
+    resource is created, changed or deleted one at a time. Like in the
+    simpl-games-api, bulk requests don't notify them.
+    """
+
+    def __init__(self):
+        # endpoint_name -> pk -> payload
+        self.resources = defaultdict(OrderedDict)
+        self.last_pks = defaultdict(int)
+        self.listeners = []
+
+    def __len__(self):
+        return sum(len(resources) for resources in self.resources.values())
+
+    def load(self, fixtures):
+        """
+        Adds the payloads of `fixtures`, a dict of lists by endpoint name.
+        """
+        for endpoint_name, payloads in fixtures.items():
+            for payload in payloads:
+                self._add(endpoint_name, payload)
+
+    def clear(self):
+        self.resources.clear()
+        self.last_pks.clear()
+
+    def _notify(self, endpoint_name, action, payload):
+        for listener in self.listeners:
+            listener(endpoint_name, action, copy.deepcopy(payload))
+
+    def _add(self, endpoint_name, payload):
+        payload = copy.deepcopy(payload)
+        pk = payload.get('id')
+        if pk is None:
+            pk = payload['id'] = self.last_pks[endpoint_name] + 1
+        self.last_pks[endpoint_name] = max(self.last_pks[endpoint_name], pk)
+        self.resources[endpoint_name][pk] = payload
+        return payload
+
+    def _get(self, endpoint_name, pk):
+        resources = self.resources[endpoint_name]
+        try:
+            return resources[int(pk)]
+        except (KeyError, ValueError):
+            raise exceptions.ResourceNotFound(
+                "No `{}` found for pk {}".format(endpoint_name, pk))
+
+    def filter(self, endpoint_name, **lookup):
+        resources = self.resources[endpoint_name]
+        if 'id' in lookup:
+            try:
+                payloads = [self._get(endpoint_name, lookup.pop('id'))]
+            except exceptions.ResourceNotFound:
+                return []
+        else:
+            payloads = resources.values()
+
+        def resolve(payload, attribute):
+            return self.resolve(endpoint_name, payload, attribute)
+
+        return [copy.deepcopy(payload) for payload in payloads
+                if matches(lookup, payload, resolve)]
+
+    def resolve(self, endpoint_name, payload, attribute):
+        """
+        Returns the value of `attribute` for a resource of `endpoint_name`,
+        from its ancestors if `payload` doesn't have it, eg: the ``run`` of
+        a decision. ``run_active`` is the ``active`` attribute of the run.
+
+        Returns `MISSING` if neither the resource nor its ancestors have
+        `attribute`.
+        """
+        if attribute in payload:
+            return payload[attribute]
+        if endpoint_name == 'runs' and attribute == 'run_active':
+            return payload.get('active', MISSING)
+        for field, parent_endpoint in PARENTS.get(endpoint_name, ()):
+            parent_pk = payload.get(field)
+            if parent_pk is None:
+                continue
+            parent = self.resources[parent_endpoint].get(int(parent_pk))
+            if parent is not None:
+                return self.resolve(parent_endpoint, parent, attribute)
+        return MISSING
+
+    def get(self, endpoint_name, **lookup):
+        payloads = self.filter(endpoint_name, **lookup)
+        if not payloads:
+            raise exceptions.ResourceNotFound(
+                "No `{}` found for {}".format(endpoint_name, lookup))
+        if len(payloads) > 1:
+            raise exceptions.MultipleResourcesFound(
+                "Found {} `{}` for {}".format(len(payloads), endpoint_name,
+                                              lookup))
+        return payloads[0]
+
+    def create(self, endpoint_name, payload):
+        payload = dict(payload)
+        payload.pop('id', None)
+        payload = self._add(endpoint_name, payload)
+        self._notify(endpoint_name, 'created', payload)
+        return copy.deepcopy(payload)
+
+    def update(self, endpoint_name, pk, payload, partial=False):
+        """
+        Replaces the resource with `payload`, or only its attributes in
+        `payload` if `partial`.
+        """
+        current = self._get(endpoint_name, pk)
+        if not partial:
+            current.clear()
+        current.update(copy.deepcopy(payload))
+        current['id'] = int(pk)
+        self._notify(endpoint_name, 'changed', current)
+        return copy.deepcopy(current)
+
+    def create_or_update(self, endpoint_name, payload):
+        if payload.get('id') is not None:
+            return self.update(endpoint_name, payload['id'], payload)
+        return self.create(endpoint_name, payload)
+
+    def delete(self, endpoint_name, pk):
+        payload = self._get(endpoint_name, pk)
+        del self.resources[endpoint_name][payload['id']]
+        self._notify(endpoint_name, 'deleted', payload)
+
+    def bulk_create(self, endpoint_name, payloads):
+        created = []
+        for payload in payloads:
+            payload = dict(payload)
+            payload.pop('id', None)
+            created.append(copy.deepcopy(self._add(endpoint_name, payload)))
+        return created
+
+    def bulk_delete(self, endpoint_name, **lookup):
+        payloads = self.filter(endpoint_name, **lookup)
+        for payload in payloads:
+            del self.resources[endpoint_name][payload['id']]
+        return len(payloads)
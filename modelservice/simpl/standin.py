@@ -0,0 +1,242 @@
+import asyncio
+import fnmatch
+import json
+import math
+import random
+
+import aiohttp
+
+from aiohttp import web
+from genericclient_base import exceptions
+from twisted.logger import Logger
+
+from .memory import MemoryStore
+
+log = Logger()
+
+
+class GamesAPIStandIn(object):
+    """
+    A local stand-in of the simpl-games-api endpoints the modelservice uses,
+    serving the resources of a `MemoryStore`:
+
+    * ``GET /apis/<endpoint>/`` filters on its querystring, paginated with
+      ``Link`` headers like the simpl-games-api,
+    * ``GET``, ``PUT``, ``PATCH`` and ``DELETE`` on ``/apis/<endpoint>/<pk>/``,
+      and ``POST`` on ``/apis/<endpoint>/``,
+    * ``POST`` and ``DELETE`` on ``/apis/bulk/<endpoint>/``,
+    * ``/apis/hooks/``, which delivers webhooks when resources change.
+
+    Every request waits `latency` seconds, give or take up to `jitter`
+    seconds, to benchmark the modelservice against a slow backend. Both can
+    be changed while the stand-in runs.
+
+    Point ``SIMPL_GAMES_URL`` at it, eg: ``http://localhost:8100/apis``. See
+    the ``run_games_api`` management command.
+    """
+
+    def __init__(self, store=None, latency=0.0, jitter=0.0, page_size=100,
+                 game_slug=None):
+        if store is None:
+            store = MemoryStore()
+        self.store = store
+        self.latency = latency
+        self.jitter = jitter
+        self.page_size = page_size
+        self.game_slug = game_slug
+        self.hooks = {}
+        self.last_hook_pk = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.deliveries = set()
+        self.store.listeners.append(self.on_change)
+
+    def make_app(self):
+        app = web.Application(middlewares=[self.delay])
+        app.router.add_route('*', '/apis/hooks/', self.hooks_view)
+        app.router.add_route('DELETE', '/apis/hooks/{pk}/', self.hook_view)
+        app.router.add_route('*', '/apis/bulk/{endpoint}/', self.bulk_view)
+        app.router.add_route('*', '/apis/{endpoint}/', self.list_view)
+        app.router.add_route('*', '/apis/{endpoint}/{pk}/', self.detail_view)
+        return app
+
+    @web.middleware
+    async def delay(self, request, handler):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            latency = self.latency
+            if self.jitter:
+                latency += random.uniform(-self.jitter, self.jitter)
+            if latency > 0:
+                await asyncio.sleep(latency)
+            return await handler(request)
+        finally:
+            self.in_flight -= 1
+
+    async def list_view(self, request):
+        endpoint_name = request.match_info['endpoint']
+        if request.method == 'GET':
+            return self.paginate(request, self.store.filter(
+                endpoint_name, **self.get_lookup(request)))
+        if request.method == 'POST':
+            payload = await request.json()
+            return web.json_response(self.store.create(endpoint_name, payload),
+                                     status=201)
+        raise web.HTTPMethodNotAllowed(request.method, ['GET', 'POST'])
+
+    async def detail_view(self, request):
+        endpoint_name = request.match_info['endpoint']
+        try:
+            pk = self.get_pk(endpoint_name, request.match_info['pk'])
+            if request.method == 'GET':
+                payload = self.store.get(endpoint_name, id=pk)
+            elif request.method in ('PUT', 'PATCH'):
+                payload = self.store.update(endpoint_name, pk,
+                                            await request.json(),
+                                            partial=request.method == 'PATCH')
+            elif request.method == 'DELETE':
+                self.store.delete(endpoint_name, pk)
+                return web.Response(status=204)
+            else:
+                raise web.HTTPMethodNotAllowed(
+                    request.method, ['GET', 'PUT', 'PATCH', 'DELETE'])
+        except exceptions.ResourceNotFound:
+            return web.json_response({'detail': 'Not found.'}, status=404)
+        return web.json_response(payload)
+
+    async def bulk_view(self, request):
+        endpoint_name = request.match_info['endpoint']
+        if request.method == 'POST':
+            payloads = await request.json()
+            return web.json_response(
+                self.store.bulk_create(endpoint_name, payloads), status=201)
+        if request.method == 'DELETE':
+            self.store.bulk_delete(endpoint_name, **self.get_lookup(request))
+            return web.Response(status=204)
+        raise web.HTTPMethodNotAllowed(request.method, ['POST', 'DELETE'])
+
+    async def hooks_view(self, request):
+        if request.method == 'GET':
+            return web.json_response(list(self.hooks.values()))
+        if request.method != 'POST':
+            raise web.HTTPMethodNotAllowed(request.method, ['GET', 'POST'])
+
+        payload = await request.json()
+        if not payload.get('url'):
+            return web.json_response({'url': ['This field is required.']},
+                                     status=400)
+        for hook in self.hooks.values():
+            if hook['event'] == payload['event'] and hook['url'] == payload['url']:
+                return web.json_response({'non_field_errors': [
+                    'The fields event, url must make a unique set.'
+                ]}, status=400)
+        self.last_hook_pk += 1
+        hook = {
+            'id': self.last_hook_pk,
+            'event': payload['event'],
+            'url': payload['url'],
+        }
+        self.hooks[hook['id']] = hook
+        return web.json_response(hook, status=201)
+
+    async def hook_view(self, request):
+        try:
+            del self.hooks[int(request.match_info['pk'])]
+        except (KeyError, ValueError):
+            return web.json_response({'detail': 'Not found.'}, status=404)
+        return web.Response(status=204)
+
+    def get_pk(self, endpoint_name, pk):
+        if endpoint_name == 'games' and not pk.isdigit():
+            return self.store.get(endpoint_name, slug=pk)['id']
+        return pk
+
+    def get_lookup(self, request):
+        return {
+            key: value for key, value in request.query.items()
+            if key not in ('page', 'page_size')
+        }
+
+    def paginate(self, request, payloads):
+        try:
+            page = max(int(request.query.get('page', 1)), 1)
+            page_size = int(request.query.get('page_size', self.page_size))
+        except ValueError:
+            return web.json_response({'detail': 'Invalid page.'}, status=404)
+
+        start = (page - 1) * page_size
+        last = max(math.ceil(len(payloads) / page_size), 1)
+        headers = {'X-Total-Count': str(len(payloads))}
+        links = [
+            '<{}>; rel="first"'.format(request.url.update_query(page=1)),
+            '<{}>; rel="last"'.format(request.url.update_query(page=last)),
+        ]
+        if start + page_size < len(payloads):
+            links.append('<{}>; rel="next"'.format(
+                request.url.update_query(page=page + 1)))
+        if page > 1:
+            links.append('<{}>; rel="prev"'.format(
+                request.url.update_query(page=page - 1)))
+        headers['Link'] = ', '.join(links)
+        return web.json_response(payloads[start:start + page_size],
+                                 headers=headers)
+
+    def get_event(self, endpoint_name, action):
+        resource_name = endpoint_name[:-1]
+        if resource_name == 'user':
+            return 'user.{}'.format(action)
+
+        game_slug = self.game_slug
+        if game_slug is None:
+            games = self.store.filter('games')
+            game_slug = games[0]['slug'] if games else 'game'
+        return '{}.{}.{}'.format(game_slug, resource_name, action)
+
+    def on_change(self, endpoint_name, action, payload):
+        event = self.get_event(endpoint_name, action)
+        for hook in self.hooks.values():
+            if fnmatch.fnmatchcase(event, hook['event']):
+                delivery = asyncio.ensure_future(self.deliver(hook, event, payload))
+                self.deliveries.add(delivery)
+                delivery.add_done_callback(self.deliveries.discard)
+
+    async def deliver(self, hook, event, payload):
+        body = {
+            'event': event,
+            'data': payload,
+            'ref': None,
+        }
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(hook['url'], data=json.dumps(body),
+                                        headers={'Content-Type': 'application/json'}):
+                    pass
+        except aiohttp.ClientError as e:
+            log.warn('webhook `{event}` to {url} failed: {e!r}',
+                     event=event, url=hook['url'], e=e)
+
+    async def flush(self):
+        """
+        Waits for the webhooks being delivered.
+        """
+        if self.deliveries:
+            await asyncio.wait(list(self.deliveries))
+
+
+async def start_standin(standin, host='localhost', port=8100):
+    """
+    Serves `standin` on `host` and `port` until the loop stops.
+
+    :return: the aiohttp ``AppRunner``, to ``await runner.cleanup()``
+    """
+    runner = web.AppRunner(standin.make_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    log.info('simpl-games-api stand-in serving {count} resources on '
+             'http://{host}:{port}/apis', count=len(standin.store),
+             host=host, port=port)
+    return runner
@@ -1,4 +1,5 @@
 import asyncio
+import copy
 import inspect
 
 from functools import update_wrapper
@@ -67,3 +68,52 @@ async def spawn(func, *iterables, **kwargs):
     results = [await job.wait() for job in jobs]
     await scheduler.close()
     return results
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls sharing a key into a single call::
+
+        flights = SingleFlight()
+
+        async def get_user(pk):
+            return await flights.run(('user', pk), fetch_user, pk)
+
+    The first caller for a key starts the call, and callers arriving while it
+    is in flight await the same result, or exception. The key is forgotten as
+    soon as the call completes, so nothing is kept between calls.
+
+    Coalesced callers receive a deep copy of the result, so that they can
+    mutate it safely.
+
+    ``issued`` and ``coalesced`` count the calls that were started and the
+    calls that awaited another one, respectively.
+    """
+
+    def __init__(self):
+        self.flights = {}
+        self.issued = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self.flights)
+
+    async def run(self, key, func, *args, **kwargs):
+        future = self.flights.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield the call from the cancellation of any single caller
+            return copy.deepcopy(await asyncio.shield(future))
+
+        self.issued += 1
+        future = asyncio.ensure_future(func(*args, **kwargs))
+        self.flights[key] = future
+        future.add_done_callback(lambda done: self._land(key, done))
+        return await asyncio.shield(future)
+
+    def _land(self, key, future):
+        if self.flights.get(key) is future:
+            del self.flights[key]
+        if not future.cancelled():
+            # every caller may have been cancelled: don't warn about it
+            future.exception()
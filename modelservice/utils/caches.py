@@ -0,0 +1,80 @@
+"""
+In-process caches.
+"""
+import time
+
+from collections import OrderedDict
+
+
+class LocalCache:
+    """
+    A size-bounded, in-process LRU cache with per-entry timeouts::
+
+        cache = LocalCache(max_entries=1000)
+        cache.set('key', value, timeout=5)
+        cache.get('key')  # `value` for the next 5 seconds, or `None`
+
+    Values are stored as they are, so callers should not mutate them.
+
+    ``hits``, ``misses``, ``evictions`` (entries dropped to make room) and
+    ``expirations`` (entries dropped because they timed out) are counted.
+    A ``max_entries`` of ``0`` disables the cache.
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return self.get(key, count=False) is not None
+
+    def get(self, key, default=None, count=True):
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > time.monotonic():
+                self.entries.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return value
+            del self.entries[key]
+            self.expirations += 1
+        if count:
+            self.misses += 1
+        return default
+
+    def set(self, key, value, timeout):
+        if self.max_entries <= 0 or timeout <= 0:
+            return
+        self.entries[key] = (time.monotonic() + timeout, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key):
+        self.entries.pop(key, None)
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    @property
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
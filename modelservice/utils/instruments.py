@@ -4,6 +4,7 @@ number of times some code has been executed, etc.
 """
 import statistics
 import time
+import tracemalloc
 
 
 class Timer:
@@ -79,6 +80,54 @@ class Timer:
         return self.elapsed
 
 
+class Memory:
+    """
+    Tracks how many bytes were allocated, and are still alive, during an
+    operation::
+
+        with Memory() as memory:
+            scopes = load_scopes()
+        how_much = memory.allocated
+        print(memory)  # Prints "Memory allocated X bytes"
+
+    Objects freed before the block exits are not counted.
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self.allocated = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __str__(self):
+        return "{} allocated {} bytes".format(
+            self.get_name(), self.allocated,
+        )
+
+    def get_name(self):
+        return "Memory `{}`".format(self.name) if self.name else 'Memory'
+
+    def start(self):
+        self.was_tracing = tracemalloc.is_tracing()
+        if not self.was_tracing:
+            tracemalloc.start()
+        self.start_size = tracemalloc.get_traced_memory()[0]
+
+    def stop(self):
+        self.allocated = tracemalloc.get_traced_memory()[0] - self.start_size
+        if not self.was_tracing:
+            tracemalloc.stop()
+
+    @property
+    def __value__(self):
+        return self.allocated
+
+
 class Counter:
     """
     Counts how many times a block of code is executed in the given amount of
@@ -3,14 +3,13 @@ from collections import defaultdict
 from autobahn.wamp import types
 from twisted.logger import Logger
 
-from .simpl import games_client
-
 from .base import Registry, RegisterDecorator
 
+from .games.caches import identity_cache
 from .games.scopes.constants import SCOPE_PARENT_GRAPH
 from .games.scopes.exceptions import ScopeNotFound
 
-from .conf import LOAD_ACTIVE_RUNS
+from .conf import LAZY_RUNS, LOAD_ACTIVE_RUNS
 
 log = Logger()
 
@@ -66,22 +65,41 @@ class CallbackDispatcher(object):
         else:
             _, resource_name, action = event.rsplit('.', 2)
 
+        # Forget cached lookups of the resource before anything reloads it
+        storage = game.storage
+        scope_class = game.resource_classes.get(resource_name)
+        if scope_class is not None:
+            storage.invalidate(scope_class.resource_name_plural, payload)
+        else:
+            storage.invalidate(resource_name + 's', payload)
+        if resource_name == 'user':
+            # runusers embed their user's email and name
+            storage.invalidate('runusers', None)
+            if action == 'changed':
+                identity_cache.forget_user(payload['id'])
+        elif resource_name == 'runuser':
+            identity_cache.forget_runuser(payload)
+
         if resource_name == 'user':
             if action == 'changed':
                 id = payload['id']
-                runusers = \
-                    await games_client.runusers.filter(user=id,
-                                                       game_slug=game.slug)
+                runusers = await storage.filter('runusers', user=id,
+                                                game_slug=game.slug)
                 for runuser in runusers:
-                    # await self.forward_runuser(game, event, runuser.payload)
+                    # await self.forward_runuser(game, event, runuser)
                     # update runuser scope user info: email, first_name, last_name
                     game.log.debug('publish update runuser scope with pk: {pk}',
-                                   pk=runuser.pk)
-                    scope = game.get_scope('runuser', runuser.pk)
+                                   pk=runuser['id'])
+                    try:
+                        scope = game.get_scope('runuser', runuser['id'])
+                    except ScopeNotFound:
+                        # eg: its run isn't loaded, or hydrated yet with
+                        # LAZY_RUNS, and will load the changes
+                        continue
                     # update monkey patched user properties
-                    scope.json['email'] = runuser.email
-                    scope.json['first_name'] = runuser.first_name
-                    scope.json['last_name'] = runuser.last_name
+                    scope.json['email'] = runuser['email']
+                    scope.json['first_name'] = runuser['first_name']
+                    scope.json['last_name'] = runuser['last_name']
                     scope.update_pubsub()
             return
         elif resource_name == 'game':
@@ -95,6 +113,19 @@ class CallbackDispatcher(object):
                 game.json = payload
                 return
 
+        # With LAZY_RUNS, changes to the scopes of a run load them first
+        if LAZY_RUNS and resource_name not in ('game', 'run', 'phase', 'role') \
+                and not (LOAD_ACTIVE_RUNS and payload.get('run_active') is False):
+            run_pk = await game.get_run_pk(resource_name, payload)
+            if run_pk is not None:
+                try:
+                    await game.hydrate_run(run_pk)
+                except ScopeNotFound:
+                    game.log.debug("run {pk} of {resource} {child} not loaded",
+                                   pk=run_pk, resource=resource_name,
+                                   child=payload['id'])
+                    return
+
         # Scopes -- each scope instance has a single designated parent
         parent_resources = SCOPE_PARENT_GRAPH[resource_name]
         for parent_resource in parent_resources:
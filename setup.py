@@ -33,7 +33,6 @@ setup(
         "simpl_client~=0.8.0",
         "django~=2.2.0",
         "djangorestframework~=3.9.0",
-        "aiorwlock",
         "aiojobs==0.2.1",
         "attrs>=17.4.0",
         "autobahn==17.10.1",
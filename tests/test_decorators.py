@@ -0,0 +1,54 @@
+from asynctest import CoroutineMock, TestCase, patch
+from genericclient_aiohttp import Resource
+
+from modelservice.games.caches import identity_cache
+from modelservice.games.decorators import get_caller
+from modelservice.games.scopes import concrete
+from modelservice.games.storages import SIMPLStorage
+from modelservice.simpl import games_client
+
+from .test_utils import make_game
+
+
+def make_user(pk, runuser_pk, run_pk):
+    user = Resource(games_client.users, id=pk, email='user@simpl.world')
+    user.payload['runuser'] = Resource(games_client.runusers, id=runuser_pk,
+                                       user=pk, run=run_pk, leader=False)
+    return user
+
+
+class TestGetCaller(TestCase):
+    use_default_loop = True
+
+    def setUp(self):
+        identity_cache.clear()
+
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_callers_are_cached(self, load):
+        game, session = await make_game()
+        run = await concrete.Run.create(session, game, {'id': 400, 'game': game.pk})
+        await game.add_scopes(run)
+
+        get_user = CoroutineMock(side_effect=lambda scope, id: make_user(id, 400, 400))
+        with patch.object(SIMPLStorage, 'get_user', get_user):
+            user = await get_caller(run, 1, session_id=10)
+            user.runuser.payload['online'] = True  # callers may mutate it
+            cached = await get_caller(run, 1, session_id=10)
+            self.assertEqual(get_user.call_count, 1)
+            self.assertEqual(cached.email, 'user@simpl.world')
+            self.assertEqual(cached.runuser.payload, {
+                'id': 400, 'user': 1, 'run': 400, 'leader': False,
+            })
+
+            # runuser changes are picked up
+            identity_cache.forget_runuser({'id': 400, 'user': 1, 'run': 400})
+            await get_caller(run, 1, session_id=10)
+            self.assertEqual(get_user.call_count, 2)
+
+            # and so are sessions leaving
+            identity_cache.forget_session(10)
+            await get_caller(run, 1, session_id=11)
+            self.assertEqual(get_user.call_count, 3)
+
+            identity_cache.forget_user(1)
+            self.assertEqual(len(identity_cache), 0)
@@ -0,0 +1,179 @@
+import asyncio
+
+from asynctest import CoroutineMock, Mock, TestCase, patch
+from django.core.exceptions import ImproperlyConfigured
+
+from modelservice.games.scopes import concrete
+from modelservice.games.scopes.exceptions import ScopeNotFound
+from modelservice.simpl.memory import MemoryStore
+from modelservice.webhooks import dispatcher
+
+from .test_utils import make_game, use_memory_storage
+
+
+class TestLazyRuns(TestCase):
+    use_default_loop = True
+
+    def setUp(self):
+        self.store = MemoryStore()
+        self.store.load({
+            'games': [{'id': 1, 'slug': 'game'}],
+            'phases': [{'id': 1, 'game': 1}],
+            'runs': [
+                {'id': 1, 'game': 1, 'phase': 1, 'active': True},
+                {'id': 2, 'game': 1, 'phase': 1, 'active': False},
+                {'id': 3, 'game': 1, 'phase': 1, 'active': True},
+            ],
+            'worlds': [
+                {'id': pk, 'run': pk, 'run_active': pk != 2}
+                for pk in (1, 2, 3)
+            ],
+            'runusers': [
+                {'id': 1, 'run': 1, 'world': 1, 'user': 1, 'run_active': True,
+                 'email': 'player@example.com', 'first_name': '',
+                 'last_name': ''},
+            ],
+        })
+        use_memory_storage(self, self.store)
+        resource_classes = {
+            scope_class.resource_name: scope_class
+            for scope_class in concrete.default_resource_classes
+        }
+
+        self.patches = [
+            patch.object(concrete.Game, 'resource_classes', resource_classes),
+            patch('modelservice.games.scopes.concrete.LAZY_RUNS', True),
+            patch('modelservice.webhooks.LAZY_RUNS', True),
+            patch('modelservice.games.scopes.concrete.DISPATCH_BY_RESOURCE', True),
+            patch('modelservice.conf.DISPATCH_BY_RESOURCE', True),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    async def make_game(self):
+        game, session = await make_game()
+        session.register = CoroutineMock()
+        session.subscribe = CoroutineMock()
+        return game, session
+
+    async def test_hydrate_run(self):
+        game, session = await self.make_game()
+        await game.restore()
+
+        self.assertEqual(sorted(run.pk for run in game.runs), [1, 3])
+        self.assertEqual(game.scopes['world'].count(), 0)
+
+        with patch.object(game, 'restore_run_children',
+                          wraps=game.restore_run_children) as children:
+            await asyncio.gather(game.hydrate_run(1), game.hydrate_run(1))
+            await game.hydrate_run(1)
+
+        # concurrent first accesses share a single load
+        children.assert_called_once_with(1)
+        self.assertEqual(game.hydrated_runs, {1})
+        world = game.scopes['world'].get(id=1)
+        self.assertTrue(world.wamp.started)
+        self.assertIs(world.my.run, game.runs.get(id=1))
+
+        # inactive runs aren't loaded
+        with self.assertRaises(ScopeNotFound):
+            await game.hydrate_run(2)
+
+    async def test_hydrate_run_children(self):
+        self.store.load({
+            'scenarios': [{'id': pk, 'world': pk, 'runuser': None}
+                          for pk in (1, 3)],
+            'periods': [{'id': pk, 'scenario': pk} for pk in (1, 3)],
+            'decisions': [{'id': pk, 'period': pk, 'role': None}
+                          for pk in (1, 3)],
+        })
+        game, session = await self.make_game()
+        await game.restore()
+
+        await game.hydrate_run(1)
+
+        # children of other runs are left out, whatever their depth
+        for resource_name in ('world', 'scenario', 'period', 'decision'):
+            self.assertEqual([scope.pk for scope in game.scopes[resource_name]],
+                             [1], resource_name)
+        self.assertEqual(self.store.filter('decisions', run=3),
+                         [{'id': 3, 'period': 3, 'role': None}])
+        self.assertEqual(self.store.filter('decisions', run_active=False), [])
+        self.assertEqual(self.store.filter('decisions', unknown=1), [])
+
+    async def test_hydrate_run_keeps_loaded_scopes(self):
+        self.store.load({
+            'scenarios': [{'id': 1, 'world': 1, 'runuser': None}],
+        })
+        game, session = await self.make_game()
+        await game.restore()
+        run = game.runs.get(id=1)
+        self.assertEqual(list(run.child_scopes['world']), [])
+
+        world = concrete.World.from_json(session, game,
+                                         self.store.get('worlds', id=1))
+        await game.add_scopes(world)
+        await game.hydrate_run(1)
+
+        # the loaded world is neither replaced nor started again
+        self.assertIs(game.scopes['world'].get(id=1), world)
+        self.assertEqual(list(run.child_scopes['world']), [world])
+        scenario = game.scopes['scenario'].get(id=1)
+        self.assertEqual(list(world.child_scopes['scenario']), [scenario])
+        self.assertTrue(scenario.wamp.started)
+
+        # replaced scopes are stopped
+        replacement = concrete.World.from_json(session, game,
+                                               self.store.get('worlds', id=1))
+        await game.add_scopes(replacement)
+        self.assertFalse(world.wamp.started)
+        self.assertEqual(list(run.child_scopes['world']), [replacement])
+
+    async def test_hydrate_scope(self):
+        game, session = await self.make_game()
+        await game.restore()
+
+        world = await game.hydrate_scope('world', 3)
+
+        self.assertEqual(world.pk, 3)
+        self.assertEqual(game.hydrated_runs, {3})
+        with self.assertRaises(ScopeNotFound):
+            await game.hydrate_scope('world', 4)
+
+    async def test_dispatcher_hydrates_run(self):
+        game, session = await self.make_game()
+        await game.restore()
+
+        # the scopes of runs are routed before any of them is loaded
+        callee = [args[0] for args, kwargs in session.register.call_args_list
+                  if args[1] == 'com.example.model.world..get_scope'][0]
+        details = Mock(procedure='com.example.model.world.3.get_scope',
+                       caller_authid=None, caller_authrole=None)
+        world_scope = await callee(details=details)
+
+        self.assertEqual(game.hydrated_runs, {3})
+        self.assertEqual(world_scope,
+                         await game.scopes['world'].get(id=3).get_scope())
+
+    async def test_requires_dispatcher(self):
+        game, session = await self.make_game()
+
+        with patch('modelservice.games.scopes.concrete.DISPATCH_BY_RESOURCE', False):
+            with self.assertRaises(ImproperlyConfigured):
+                await game.restore()
+
+    async def test_user_changed(self):
+        game, session = await self.make_game()
+        await game.restore()
+
+        # runusers of runs that aren't hydrated are skipped
+        await dispatcher.forward(game, {
+            'event': 'user.changed',
+            'ref': None,
+            'data': {'id': 1, 'email': 'player@example.com'},
+        })
+        self.assertEqual(game.hydrated_runs, set())
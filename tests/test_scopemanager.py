@@ -1,7 +1,15 @@
 import unittest
 from unittest import mock
 
-from modelservice.games.scopes.managers import ScopeManager
+from modelservice.games.scopes.managers import ScopeManager, ScopeView
+
+
+class IndexedDecision(object):
+    resource_name = 'decision'
+    indexes = ('role', ('period', 'role'))
+
+    def __init__(self, json):
+        self.json = json
 
 
 class TestScopeManager(unittest.TestCase):
@@ -84,6 +92,63 @@ class TestScopeManager(unittest.TestCase):
         self.assertEqual(manager.count(), 4)
         self.assertFalse(scope in manager)
 
+    def test_remove_keeps_order(self):
+        scopes = [
+            mock.Mock(
+                idx=i,
+                resource_name='period',
+                json={'id': i, 'scenario': 1}
+            ) for i in range(8)
+        ]
+        manager = ScopeManager(*scopes)
+
+        manager.remove(scopes[1])
+        self.assertEqual(manager.tombstones, 1)
+        self.assertEqual(manager[1], scopes[2])
+        self.assertEqual(manager[-7], scopes[0])
+        self.assertEqual(manager[1:3], [scopes[2], scopes[3]])
+        self.assertRaises(IndexError, lambda: manager[7])
+        self.assertRaises(IndexError, lambda: manager[-8])
+        # positional access uses the live scopes rather than compacting
+        self.assertEqual(manager.tombstones, 1)
+        self.assertEqual(manager.live, [scopes[0]] + scopes[2:])
+        # and it is rebuilt after changes
+        manager.remove(scopes[6])
+        self.assertIsNone(manager.live)
+        self.assertEqual(manager[-1], scopes[7])
+        manager.add(scopes[6])
+        self.assertEqual(manager[-1], scopes[6])
+
+        manager.remove(scopes[7])
+        self.assertEqual(manager.last(), scopes[6])
+        manager.remove(scopes[3])
+        manager.remove(scopes[4])
+        self.assertEqual(manager, [scopes[0], scopes[2], scopes[5], scopes[6]])
+        self.assertEqual(manager.filter(scenario=1), manager)
+        self.assertEqual(manager.get(id=5), scopes[5])
+        self.assertRaises(manager.ScopeNotFound, manager.get, id=4)
+
+        for scope in list(manager):
+            manager.remove(scope)
+        self.assertEqual(manager.count(), 0)
+        self.assertEqual(manager.slots, [])
+        self.assertRaises(manager.ScopeNotFound, manager.last)
+
+    def test_replace_keeps_position(self):
+        scopes = [
+            mock.Mock(
+                resource_name='period',
+                json={'id': i, 'scenario': 1}
+            ) for i in range(3)
+        ]
+        manager = ScopeManager(*scopes)
+        replacement = mock.Mock(resource_name='period', json={'id': 1, 'scenario': 2})
+        manager.append(replacement)
+
+        self.assertEqual(manager, [scopes[0], replacement, scopes[2]])
+        self.assertEqual(manager.filter(scenario=1), [scopes[0], scopes[2]])
+        self.assertEqual(manager.filter(scenario=2), [replacement])
+
     def test_len(self):
         scopes = [
             mock.Mock(
@@ -206,6 +271,191 @@ class TestScopeManager(unittest.TestCase):
         self.assertEqual(manager.filter(role=3).count(), 0)
         self.assertFalse(runusers[0] in manager.filter(role=2))
         
+    def test_multi_indexed_filter(self):
+        runusers = [
+            mock.Mock(resource_name='runuser', json={'id': 1, 'run': 1, 'world': 1}),
+            mock.Mock(resource_name='runuser', json={'id': 2, 'run': 2, 'world': 2}),
+            mock.Mock(resource_name='runuser', json={'id': 3, 'run': 2, 'world': 3}),
+        ]
+        manager = ScopeManager(*runusers)
+
+        self.assertEqual(manager.filter(run=2, world=2).count(), 1)
+        self.assertTrue(runusers[1] in manager.filter(run=2, world=2))
+        self.assertEqual(manager.filter(run=1, world=2).count(), 0)
+        self.assertEqual(manager.filter(run=3, world=3).count(), 0)
+
+    def test_mixed_filter(self):
+        runusers = [
+            mock.Mock(resource_name='runuser', json={'id': 1, 'run': 1, 'world': 1, 'user': 1}),
+            mock.Mock(resource_name='runuser', json={'id': 2, 'run': 2, 'world': 2, 'user': 1}),
+            mock.Mock(resource_name='runuser', json={'id': 3, 'run': 2, 'world': 2, 'user': 2}),
+        ]
+        manager = ScopeManager(*runusers)
+
+        self.assertEqual(manager.filter(run=2, user=1).count(), 1)
+        self.assertEqual(manager.get(run=2, user=2), runusers[2])
+        self.assertEqual(manager.filter(run=1, user=2).count(), 0)
+        self.assertRaises(ValueError, manager.filter(run=2, nope=1).count)
+
+    def test_lazy_filter(self):
+        runusers = [
+            mock.Mock(resource_name='runuser', json={'id': 1, 'run': 1, 'world': 1, 'role': 1}),
+            mock.Mock(resource_name='runuser', json={'id': 2, 'run': 2, 'world': 2, 'role': 1}),
+            mock.Mock(resource_name='runuser', json={'id': 3, 'run': 2, 'world': 3, 'role': 2}),
+        ]
+        manager = ScopeManager(*runusers)
+
+        view = manager.filter(run=2)
+        self.assertTrue(isinstance(view, ScopeView))
+        self.assertTrue(view.manager is manager)
+        self.assertIsNone(view._result_cache)
+
+        chained = view.filter(role=2)
+        self.assertTrue(chained.manager is manager)
+        self.assertEqual(chained.lookups, {'run': 2, 'role': 2})
+        self.assertEqual(chained, [runusers[2]])
+        self.assertEqual(chained.get(), runusers[2])
+
+        self.assertEqual(view.filter(run=1).count(), 0)
+        self.assertEqual(view.count(), 2)
+        self.assertIsNone(view._result_cache)
+
+    def test_lazy_filter_contains(self):
+        runusers = [
+            mock.Mock(resource_name='runuser', json={'id': 1, 'run': 1, 'world': 1}),
+            mock.Mock(resource_name='runuser', json={'id': 2, 'run': 2, 'world': 2}),
+        ]
+        manager = ScopeManager(*runusers)
+        other = mock.Mock(resource_name='runuser', json={'id': 2, 'run': 2, 'world': 2})
+
+        self.assertTrue(runusers[1] in manager.filter(run=2))
+        self.assertFalse(runusers[0] in manager.filter(run=2))
+        self.assertFalse(other in manager.filter(run=2))
+
+    def test_declared_indexes(self):
+        decisions = [
+            IndexedDecision({'id': 1, 'period': 1, 'role': 1}),
+            IndexedDecision({'id': 2, 'period': 1, 'role': 2}),
+            IndexedDecision({'id': 3, 'period': 2, 'role': 2}),
+        ]
+        manager = ScopeManager(*decisions)
+
+        self.assertEqual(
+            manager.get_indexes(decisions[0]),
+            ('period', 'role', ('period', 'role')),
+        )
+        self.assertEqual(set(manager.indexes['role'][2]), set(decisions[1:]))
+        self.assertEqual(manager.indexes[('period', 'role')][(1, 2)], {decisions[1]})
+
+        self.assertEqual(manager.filter(role=2).count(), 2)
+        self.assertEqual(manager.get(period=1, role=2), decisions[1])
+        self.assertEqual(manager.filter(period=2, role=1).count(), 0)
+
+        manager.remove(decisions[1])
+        self.assertEqual(manager.filter(period=1, role=2).count(), 0)
+
+    def test_check_indexes(self):
+        class Valid(IndexedDecision):
+            indexes = ('role', ('period', 'role'))
+
+        class NotATuple(IndexedDecision):
+            indexes = 'role'
+
+        class SingleComposite(IndexedDecision):
+            indexes = (('role',),)
+
+        class Duplicated(IndexedDecision):
+            indexes = ('role', 'role')
+
+        class NotAName(IndexedDecision):
+            indexes = (('period', 1),)
+
+        ScopeManager.check_indexes(Valid)
+        for scope_class in (NotATuple, SingleComposite, Duplicated, NotAName):
+            self.assertRaises(ValueError, ScopeManager.check_indexes, scope_class)
+
+    def test_reindex(self):
+        runusers = [
+            mock.Mock(resource_name='runuser', json={'id': 1, 'run': 1, 'world': 1}),
+            mock.Mock(resource_name='runuser', json={'id': 2, 'run': 1, 'world': 1}),
+        ]
+        manager = ScopeManager(*runusers)
+
+        runusers[0].json = {'id': 1, 'run': 1, 'world': 2}
+        self.assertEqual(manager.reindex(runusers[0]), ('world',))
+        self.assertEqual(manager.filter(world=1), [runusers[1]])
+        self.assertEqual(manager.filter(world=2), [runusers[0]])
+        self.assertEqual(manager.filter(run=1).count(), 2)
+
+        # in place mutations are picked up as well
+        runusers[1].json['world'] = None
+        self.assertEqual(manager.reindex(runusers[1]), ('world',))
+        self.assertEqual(manager.filter(world=1).count(), 0)
+        self.assertFalse(1 in manager.indexes['world'])
+        self.assertEqual(manager.reindex(runusers[1]), ())
+
+        # removing uses the values the scope was indexed by
+        runusers[0].json['world'] = 3
+        manager.remove(runusers[0])
+        self.assertEqual(manager.filter(world=2).count(), 0)
+
+    def test_reindex_unknown_scope(self):
+        manager = ScopeManager(
+            mock.Mock(resource_name='runuser', json={'id': 1, 'run': 1, 'world': 1}),
+        )
+        other = mock.Mock(resource_name='runuser', json={'id': 2, 'run': 1, 'world': 1})
+        self.assertEqual(manager.reindex(other), ())
+        self.assertEqual(manager.filter(world=1).count(), 1)
+
+    def test_sorted_index(self):
+        phases = [
+            mock.Mock(resource_name='phase', json={'id': i, 'game': 1, 'order': order})
+            for i, order in enumerate([3, 1, 2, 5])
+        ]
+        manager = ScopeManager(*phases)
+        self.assertEqual(
+            manager.sorted_indexes['order'],
+            [(1, 1), (2, 2), (3, 0), (5, 3)],
+        )
+
+        self.assertEqual(manager.filter(order__gte=3), [phases[0], phases[3]])
+        self.assertEqual(manager.filter(order__gt=1, order__lt=5).count(), 2)
+        self.assertEqual(manager.filter(order__lte=2, game=1).count(), 2)
+        self.assertEqual(manager.filter(order__gt=5).count(), 0)
+        self.assertEqual(manager.get(order=2), phases[2])
+        self.assertEqual(
+            manager.order_by('order'),
+            [phases[1], phases[2], phases[0], phases[3]],
+        )
+        self.assertEqual(manager.order_by('-order').first(), phases[3])
+
+        self.assertEqual(manager.next_after('order', 2), phases[0])
+        self.assertEqual(manager.next_after('order', 3), phases[3])
+        self.assertRaises(manager.ScopeNotFound, manager.next_after, 'order', 5)
+        self.assertEqual(manager.previous_before('order', 3), phases[2])
+        self.assertRaises(manager.ScopeNotFound, manager.previous_before, 'order', 1)
+
+        phases[3].json['order'] = 0
+        self.assertEqual(manager.reindex(phases[3]), ('order',))
+        self.assertEqual(manager.order_by('order').first(), phases[3])
+        manager.remove(phases[3])
+        self.assertEqual(manager.sorted_indexes['order'], [(1, 1), (2, 2), (3, 0)])
+
+    def test_range_filter_without_sorted_index(self):
+        runusers = [
+            mock.Mock(resource_name='runuser', json={'id': i, 'run': 1, 'world': 1, 'score': score})
+            for i, score in enumerate([10, None, 30])
+        ]
+        manager = ScopeManager(*runusers)
+
+        self.assertEqual(manager.filter(score__gte=10), [runusers[0], runusers[2]])
+        self.assertEqual(manager.filter(score__lt=20), [runusers[0]])
+        self.assertEqual(manager.next_after('score', 10), runusers[2])
+        self.assertEqual(
+            manager.order_by('-score'),
+            [runusers[2], runusers[0], runusers[1]],
+        )
+
     def test_get(self):
         worlds = [
             mock.Mock(resource_name='runuser', json={'id': 1, 'run': 1, 'world': 1}),
@@ -224,15 +474,22 @@ class TestScopeManager(unittest.TestCase):
         user3 = mock.Mock(json={'id': 3, 'world': 2}, pk=3, runuser=mock.Mock(leader=False))
         user4 = mock.Mock(json={'id': 4, 'world': 2}, pk=4, runuser=mock.Mock(leader=False))
 
-        get_user_ids_12 = mock.Mock(return_value=[1, 2])
-        my_12 = mock.Mock(get_user_ids=get_user_ids_12)
+        access_keys = {
+            1: {('world', 1)},
+            2: {('world', 1), ('world', 2)},
+            3: {('world', 2)},
+            4: {('world', 3)},
+        }
+        game = mock.Mock(
+            get_access_keys=mock.Mock(side_effect=lambda user: access_keys[user.pk])
+        )
 
-        get_user_ids_23 = mock.Mock(return_value=[2, 3])
-        my_23 = mock.Mock(get_user_ids=get_user_ids_23)
+        my_1 = mock.Mock(audience=(('world', 1), ('leader', 1)))
+        my_2 = mock.Mock(audience=(('world', 2), ('leader', 1)))
 
         worlds = [
-            mock.Mock(my=my_12, json={'id': 1, 'run': 1}, pk=1, resource_name='world'),
-            mock.Mock(my=my_23, json={'id': 2, 'run': 1}, pk=2, resource_name='world'),
+            mock.Mock(my=my_1, game=game, json={'id': 1, 'run': 1}, pk=1, resource_name='world'),
+            mock.Mock(my=my_2, game=game, json={'id': 2, 'run': 1}, pk=2, resource_name='world'),
         ]
         manager = ScopeManager(*worlds)
 
@@ -244,3 +501,8 @@ class TestScopeManager(unittest.TestCase):
         self.assertEqual(manager.for_user(user3).count(), 1)
         self.assertEqual(manager.for_user(user4), [])
         self.assertEqual(manager.for_user(user4).count(), 0)
+
+        # access keys are computed once per view
+        game.get_access_keys.reset_mock()
+        list(manager.for_user(user2))
+        self.assertEqual(game.get_access_keys.call_count, 1)
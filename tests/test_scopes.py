@@ -1,10 +1,21 @@
-from asynctest import TestCase, patch
+import asyncio
+
+from collections import OrderedDict, defaultdict
+
+from asynctest import CoroutineMock, Mock, TestCase, patch
+from autobahn.wamp.exception import ApplicationError
+from genericclient_base.exceptions import BadRequestError
 
 from modelservice.games.scopes import concrete
+from modelservice.games.scopes.managers import ScopeManager
 
 from .test_utils import make_game
 
 
+class WriteBehindDecision(concrete.Decision):
+    write_behind = True
+
+
 class TestScopes(TestCase):
     use_default_loop = True
 
@@ -98,4 +109,581 @@ class TestScopes(TestCase):
         self.assertEqual(scenario.my.world, None)
         self.assertEqual(scenario.my.runusers, [runuser])
 
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_update_webhook_reindexes(self, SIMPLStorage):
+        game, session = await make_game()
+
+        run = await concrete.Run.create(session, game, {
+            'id': 1,
+            'game': game.pk
+        })
+        await game.add_scopes(run)
+
+        worlds = []
+        for pk in (1, 2):
+            world = await concrete.World.create(session, game, {
+                'id': pk,
+                'run': run.pk,
+            })
+            await game.add_scopes(world)
+            worlds.append(world)
+
+        runuser = await concrete.RunUser.create(session, game, {
+            'id': 1,
+            'run': run.pk,
+            'user': 1,
+            'world': worlds[0].pk,
+        })
+        await game.add_scopes(runuser)
+        self.assertEqual(worlds[0].runusers, [runuser])
+
+        runuser.update_webhook('runuser', {
+            'id': 1,
+            'run': run.pk,
+            'user': 1,
+            'world': worlds[1].pk,
+        })
+        self.assertEqual(worlds[0].runusers, [])
+        self.assertEqual(worlds[1].runusers, [runuser])
+
+    @patch('modelservice.games.storages.SIMPLStorage.save')
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_save_reindexes(self, load, save):
+        game, session = await make_game()
+
+        run = await concrete.Run.create(session, game, {
+            'id': 1,
+            'game': game.pk
+        })
+        await game.add_scopes(run)
+
+        runuser = await concrete.RunUser.create(session, game, {
+            'id': 1,
+            'run': run.pk,
+            'user': 1,
+            'world': None,
+        })
+        await game.add_scopes(runuser)
+
+        runuser.json['world'] = 2
+        save.return_value = runuser.json
+        await runuser.save()
+        self.assertFalse(runuser in game.scopes['runuser'].filter(world=None))
+        self.assertTrue(runuser in game.scopes['runuser'].filter(world=2))
+
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_run_phases(self, SIMPLStorage):
+        game, session = await make_game()
+
+        phases = []
+        for order in (1, 2, 3):
+            phase = await concrete.Phase.create(session, game, {
+                'id': order * 10,
+                'game': game.pk,
+                'name': 'phase {}'.format(order),
+                'order': order,
+            })
+            await game.add_scopes(phase)
+            phases.append(phase)
+
+        run = await concrete.Run.create(session, game, {
+            'id': 1,
+            'game': game.pk,
+            'phase': phases[1].pk,
+        })
+
+        self.assertEqual(run.current_phase, phases[1])
+        self.assertEqual(run.get_phase(3), phases[2])
+        self.assertEqual(run.get_next_phase(), phases[2])
+        self.assertEqual(await run.get_previous_phase(), phases[0])
+
+        run.json['phase'] = phases[2].pk
+        self.assertRaises(ValueError, run.get_next_phase)
+
+        run.json['phase'] = None
+        self.assertIsNone(run.current_phase)
+
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_for_user(self, SIMPLStorage):
+        game, session = await make_game()
+
+        run = await concrete.Run.create(session, game, {
+            'id': 100,
+            'game': game.pk
+        })
+        await game.add_scopes(run)
+
+        worlds = []
+        for pk in (100, 101):
+            world = await concrete.World.create(session, game, {
+                'id': pk,
+                'run': run.pk,
+            })
+            await game.add_scopes(world)
+            worlds.append(world)
+
+        runusers = []
+        for pk, world, leader in ((100, 100, False), (101, 101, False), (102, None, True)):
+            runuser = await concrete.RunUser.create(session, game, {
+                'id': pk,
+                'run': run.pk,
+                'user': pk,
+                'world': world,
+                'leader': leader,
+            })
+            await game.add_scopes(runuser)
+            runusers.append(runuser)
+
+        scenario = await concrete.Scenario.create(session, game, {
+            'id': 100,
+            'runuser': None,
+            'world': worlds[1].pk,
+        })
+        await game.add_scopes(scenario)
+
+        def as_user(runuser):
+            return Mock(pk=runuser.json['user'], runuser=runuser)
+
+        self.assertEqual(run.worlds.for_user(as_user(runusers[0])), [worlds[0]])
+        self.assertEqual(run.worlds.for_user(as_user(runusers[2])), worlds)
+        self.assertEqual(run.runusers.for_user(as_user(runusers[1])), [runusers[1]])
+        self.assertEqual(worlds[1].scenarios.for_user(as_user(runusers[1])), [scenario])
+        self.assertEqual(worlds[1].scenarios.for_user(as_user(runusers[0])), [])
+
+        # moving a runuser to another world changes what they can access
+        runusers[0].update_webhook('runuser', dict(runusers[0].json, world=101))
+        self.assertEqual(worlds[1].scenarios.for_user(as_user(runusers[0])), [scenario])
+        self.assertEqual(run.worlds.for_user(as_user(runusers[0])), [worlds[1]])
+
+        # moving a scenario to another world changes who can access it
+        scenario.update_webhook('scenario', dict(scenario.json, world=100))
+        self.assertEqual(scenario.my.parent, worlds[0])
+        self.assertEqual(worlds[0].scenarios.for_user(as_user(runusers[1])), [])
+
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_access_keys_per_run(self, SIMPLStorage):
+        game, session = await make_game()
+
+        # user 120 leads run 120 and plays in run 121
+        for pk, leader in ((120, True), (121, False)):
+            await game.add_scopes(
+                await concrete.Run.create(session, game, {'id': pk, 'game': game.pk}),
+                await concrete.RunUser.create(session, game, {
+                    'id': pk, 'run': pk, 'user': 120, 'world': None,
+                    'leader': leader,
+                }),
+            )
+
+        for runuser in (None, game.scopes['runuser'].get(id=121)):
+            keys = game.get_access_keys(Mock(pk=120, runuser=runuser))
+            self.assertIn(('leader', 120), keys)
+            self.assertNotIn(('leader', 121), keys)
+
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_compact_scopes(self, SIMPLStorage):
+        game, session = await make_game()
+
+        decision = await concrete.Decision.create(session, game, {
+            'id': 1,
+            'period': 1,
+            'role': None,
+        })
+
+        self.assertFalse(hasattr(decision, '__dict__'))
+        self.assertFalse(hasattr(decision.my, '__dict__'))
+        self.assertFalse(hasattr(decision.wamp, '__dict__'))
+        self.assertFalse(hasattr(game.storage, '__dict__'))
+        self.assertIs(decision.storage.storage, game.storage)
+
+        self.assertEqual(hash(decision), hash(('decision', 1)))
+        decision.pk = 2
+        self.assertEqual(hash(decision), hash(('decision', 2)))
+
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_child_scopes(self, SIMPLStorage):
+        game, session = await make_game()
+
+        run = await concrete.Run.create(session, game, {'id': 200, 'game': game.pk})
+        await game.add_scopes(run)
+        worlds = []
+        for pk in (200, 201):
+            world = await concrete.World.create(session, game, {'id': pk, 'run': run.pk})
+            await game.add_scopes(world)
+            worlds.append(world)
+
+        self.assertEqual(list(run.child_scopes['world']), worlds)
+        self.assertEqual(list(run.child_scopes['runuser']), [])
+        self.assertEqual(list(worlds[0].child_scopes['scenario']), [])
+
+        # the cached children follow scopes being added and removed
+        scenario = await concrete.Scenario.create(session, game, {
+            'id': 200, 'world': 200, 'runuser': None,
+        })
+        await game.add_scopes(scenario)
+        self.assertEqual(list(worlds[0].child_scopes['scenario']), [scenario])
+
+        # ...and moved to another parent
+        scenario.update_webhook('scenario', dict(scenario.json, world=201))
+        self.assertEqual(list(worlds[0].child_scopes['scenario']), [])
+        self.assertEqual(list(worlds[1].child_scopes['scenario']), [scenario])
+
+        await worlds[1]._unload_scope_tree()
+        self.assertEqual(list(run.child_scopes['world']), [worlds[0]])
+        self.assertNotIn(scenario, game.scopes['scenario'])
+
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_cached_ancestors(self, SIMPLStorage):
+        game, session = await make_game()
+
+        runs = []
+        for pk in (300, 301):
+            run = await concrete.Run.create(session, game, {'id': pk, 'game': game.pk})
+            await game.add_scopes(run)
+            runs.append(run)
+        world = await concrete.World.create(session, game, {'id': 300, 'run': 300})
+        await game.add_scopes(world)
+        runuser = await concrete.RunUser.create(session, game, {
+            'id': 300, 'run': 300, 'user': 300, 'world': None,
+        })
+        await game.add_scopes(runuser)
+        scenario = await concrete.Scenario.create(session, game, {
+            'id': 300, 'world': 300, 'runuser': None,
+        })
+        await game.add_scopes(scenario)
+        period = await concrete.Period.create(session, game, {
+            'id': 300, 'scenario': 300, 'order': 1,
+        })
+        await game.add_scopes(period)
+
+        self.assertEqual(period.my.run, runs[0])
+        self.assertEqual(period.my.world, world)
+        self.assertEqual(list(period.my.runusers), [])
+        self.assertIsNone(runuser.my.world)
+
+        # moving a runuser to a world is reflected in its cached world
+        runuser.update_webhook('runuser', dict(runuser.json, world=300))
+        self.assertEqual(runuser.my.world, world)
+        self.assertEqual(list(period.my.runusers), [runuser])
+
+        # moving an ancestor invalidates the cached run of its descendants
+        world.update_webhook('world', dict(world.json, run=301))
+        self.assertEqual(period.my.run, runs[1])
+        self.assertEqual(scenario.my.run, runs[1])
+
+    @patch('modelservice.games.storages.SIMPLStorage.save')
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_write_behind_save(self, load, save):
+        game, session = await make_game()
+        game.save_queue.window = 0.01
+        save.side_effect = lambda scope, json, fields=None: dict(json)
+
+        decisions = [
+            WriteBehindDecision(session, game, {'id': pk, 'period': 500, 'role': None})
+            for pk in (500, 501)
+        ]
+        for decision in decisions:
+            decision.pk = decision.json['id']
+            decision.mark_saved()
+            await game.add_scopes(decision)
+
+        for value in range(3):
+            decisions[0].json['data'] = {'value': value}
+            await decisions[0].save()
+        self.assertEqual(save.call_count, 0)
+
+        await decisions[0].flush()
+        save.assert_called_once_with(decisions[0],
+                                     {'id': 500, 'period': 500, 'role': None, 'data': {'value': 2}},
+                                     fields=['data'])
+
+        # pending saves are sent after the window
+        await decisions[1].save()
+        await asyncio.sleep(0.05)
+        self.assertEqual(save.call_count, 2)
+        self.assertEqual(game.save_queue.stats, {
+            'pending': 0, 'requested': 4, 'sent': 2, 'merged': 2, 'failed': 0,
+            'flushes': 2, 'rate': game.save_queue.rate,
+        })
+
+    @patch('modelservice.games.storages.SIMPLStorage.save')
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_write_behind_flush_and_retry(self, load, save):
+        game, session = await make_game()
+        game.save_queue.window = 0.01
+        released = asyncio.Event()
+
+        async def slow_save(scope, json, fields=None):
+            await released.wait()
+            return dict(json)
+        save.side_effect = slow_save
+
+        decision = WriteBehindDecision(session, game, {'id': 510, 'period': 500, 'role': None})
+        decision.pk = 510
+        await game.add_scopes(decision)
+
+        # flushes wait for the batch the window already started saving
+        await decision.save()
+        await asyncio.sleep(0.02)
+        self.assertEqual(save.call_count, 1)
+        flush = asyncio.ensure_future(game.save_queue.flush())
+        await asyncio.sleep(0)
+        self.assertFalse(flush.done())
+        released.set()
+        await flush
+        self.assertEqual(game.save_queue.stats['sent'], 1)
+
+        # failed saves are queued again
+        save.side_effect = ConnectionError()
+        await decision.save()
+        with self.assertRaises(ConnectionError):
+            await game.save_queue.flush()
+        self.assertIn(decision, game.save_queue)
+
+        save.side_effect = slow_save
+        await game.save_queue.flush()
+        self.assertNotIn(decision, game.save_queue)
+        self.assertEqual(game.save_queue.stats['sent'], 2)
+        self.assertEqual(game.save_queue.backoff, 0)
+
+        # client errors and repeated failures aren't retried
+        save.side_effect = BadRequestError(Mock(status_code=400))
+        await decision.save()
+        with self.assertRaises(BadRequestError):
+            await game.save_queue.flush()
+        self.assertNotIn(decision, game.save_queue)
+
+        game.save_queue.max_retries = 1
+        save.side_effect = ConnectionError()
+        await decision.save()
+        with self.assertRaises(ConnectionError):
+            await game.save_queue.flush()
+        self.assertIn(decision, game.save_queue)
+        with self.assertRaises(ConnectionError):
+            await game.save_queue.flush()
+        self.assertNotIn(decision, game.save_queue)
+        await game.save_queue.flush()
+
+    @patch('modelservice.games.storages.SIMPLStorage.save')
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_write_behind_unload(self, load, save):
+        game, session = await make_game()
+        save.side_effect = lambda scope, json, fields=None: dict(json)
+
+        decisions = [
+            WriteBehindDecision(session, game, {'id': pk, 'period': 500, 'role': None})
+            for pk in (520, 521)
+        ]
+        for decision in decisions:
+            decision.pk = decision.json['id']
+            await game.add_scopes(decision)
+            decision.json['data'] = {'value': 1}
+            await decision.save()
+
+        # unloaded scopes are saved first, deleted ones aren't
+        await decisions[0]._unload_scope_tree()
+        save.assert_called_once_with(decisions[0], decisions[0].json,
+                                     fields=None)
+        await game.remove_scopes(decisions[1])
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual(len(game.save_queue), 0)
+        for decision in decisions:
+            self.assertNotIn(decision, game.scopes['decision'])
+
+    @patch('modelservice.games.storages.SIMPLStorage.bulk_create')
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_add_new_child_scopes(self, load, bulk_create):
+        game, session = await make_game()
+
+        run = await concrete.Run.create(session, game, {'id': 700, 'game': game.pk})
+        await game.add_scopes(run)
+        world = await concrete.World.create(session, game, {'id': 700, 'run': 700})
+        await game.add_scopes(world)
+        scenario = await concrete.Scenario.create(session, game, {
+            'id': 700, 'world': 700, 'runuser': None,
+        })
+        await game.add_scopes(scenario)
+        period = await concrete.Period.create(session, game, {
+            'id': 700, 'scenario': 700, 'order': 1,
+        })
+        await game.add_scopes(period)
+
+        bulk_create.side_effect = lambda endpoint_name, json_list: [
+            dict(json, id=pk) for pk, json in enumerate(json_list, 700)
+        ]
+        session.publish.reset_mock()
+        results = await period.add_new_child_scopes('result', [
+            {'role': None, 'data': {'score': score}} for score in (1, 2)
+        ])
+
+        bulk_create.assert_called_once_with('results', [
+            {'period': 700, 'role': None, 'data': {'score': 1}},
+            {'period': 700, 'role': None, 'data': {'score': 2}},
+        ])
+        self.assertEqual([result.pk for result in results], [700, 701])
+        self.assertEqual(list(period.child_scopes['result']), results)
+        self.assertEqual(results[0].changed_fields, [])
+        # each child is published with `add_child` by default...
+        self.assertEqual(
+            [call[0][0].rsplit('.', 3)[1:] for call in session.publish.call_args_list],
+            [['world', '700', 'add_child']] * 2)
+
+        # ...or together with `add_children`
+        session.publish.reset_mock()
+        with patch.object(concrete.Period, 'publish_add_children', True):
+            results = await period.add_new_child_scopes('result', [
+                {'role': None, 'data': {'score': 3}},
+            ])
+        self.assertEqual(session.publish.call_count, 1)
+        args, kwargs = session.publish.call_args
+        self.assertTrue(args[0].endswith('.model.world.700.add_children'))
+        self.assertEqual(args[1], [result.pubsub_export() for result in results])
+
+        # children of different worlds are published to their own world
+        other_world = await concrete.World.create(session, game, {'id': 701, 'run': 700})
+        await game.add_scopes(other_world)
+        scenarios = [
+            concrete.Scenario.from_json(session, game, {
+                'id': pk, 'world': world_pk, 'runuser': None,
+            })
+            for pk, world_pk in ((701, 700), (702, 701), (703, 700))
+        ]
+        session.publish.reset_mock()
+        with patch.object(concrete.Game, 'publish_add_children', True):
+            await game.add_child_scopes(*scenarios)
+        published = {
+            call[0][0].rsplit('.', 2)[1]: [child['pk'] for child in call[0][1]]
+            for call in session.publish.call_args_list
+        }
+        self.assertEqual(published, {'700': [701, 703], '701': [702]})
+
+    @patch('modelservice.games.scopes.concrete.RESTORE_CONCURRENCY', 2)
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_concurrent_restore(self, load):
+        game, session = await make_game()
+        endpoint_to_classes = OrderedDict(
+            (scope_class.resource_name_plural, scope_class)
+            for scope_class in concrete.default_resource_classes
+        )
+        calls = []
+        fetching = set()
+        concurrency = []
+
+        async def iter_pages(storage, endpoint_name, **params):
+            calls.append((endpoint_name, params))
+            fetching.add(endpoint_name)
+            concurrency.append(len(fetching))
+            await asyncio.sleep(0.01)
+            if endpoint_name == 'runs':
+                yield [{'id': 800, 'game': game.pk, 'active': True}]
+            elif endpoint_name == 'worlds':
+                for pk in (800, 801):
+                    yield [{'id': pk, 'run': 800, 'run_active': True}]
+                    # the page was built before the next one is requested
+                    self.assertEqual(len(built), pk - 799)
+            fetching.discard(endpoint_name)
+
+        built = []
+        from_json = concrete.World.from_json.__func__
+
+        def build_world(cls, session, game, json):
+            built.append(json['id'])
+            return from_json(cls, session, game, json)
+
+        with patch.object(concrete.Game, 'scopes', defaultdict(ScopeManager)), \
+                patch.object(concrete.Game, 'endpoint_to_classes',
+                             endpoint_to_classes, create=True), \
+                patch('modelservice.games.storages.SIMPLStorage.iter_pages', iter_pages), \
+                patch.object(concrete.World, 'from_json', classmethod(build_world)), \
+                patch.object(concrete.World, 'get_pk') as get_pk:
+            await game.restore_scopes()
+
+            self.assertEqual(max(concurrency), 2)
+            self.assertEqual(len(calls), len(endpoint_to_classes))
+            self.assertIn(('worlds', {'game_slug': 'game', 'run_active': True}), calls)
+            self.assertEqual(built, [800, 801])
+            get_pk.assert_not_called()
+            world = game.scopes['world'].get(id=801)
+            self.assertIs(world.my.parent, game.runs.get(id=800))
+
+        self.assertEqual(list(game.restore_stats), list(endpoint_to_classes))
+        self.assertEqual(game.restore_stats['worlds']['count'], 2)
+        self.assertGreater(game.restore_stats['worlds']['fetch'], 0)
+
+    @patch('modelservice.conf.DISPATCH_BY_RESOURCE', True)
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_dispatch_by_resource(self, load):
+        game, session = await make_game()
+        session.register = CoroutineMock()
+        session.subscribe = CoroutineMock()
+
+        run = await concrete.Run.create(session, game, {'id': 900, 'game': game.pk})
+        worlds = [
+            await concrete.World.create(session, game, {'id': pk, 'run': 900})
+            for pk in (900, 901)
+        ]
+        await game.add_scopes(run, *worlds)
+
+        # one registration per resource and method, not per scope
+        uris = [args[1] for args, kwargs in session.register.call_args_list]
+        self.assertIn('com.example.model.world..get_scope', uris)
+        self.assertEqual(uris.count('com.example.model.world..get_scope'), 1)
+        self.assertNotIn('com.example.model.world.900.get_scope', uris)
+        self.assertEqual(
+            len(game.dispatcher),
+            session.register.call_count + session.subscribe.call_count)
+
+        callee = [args[0] for args, kwargs in session.register.call_args_list
+                  if args[1] == 'com.example.model.world..get_scope'][0]
+        details = Mock(procedure='com.example.model.world.901.get_scope',
+                       caller_authid=None, caller_authrole=None)
+        self.assertEqual(await callee(details=details),
+                         await worlds[1].get_scope())
+
+        await worlds[1].stop()
+        with self.assertRaises(ApplicationError):
+            await callee(details=details)
+
+    @patch('modelservice.conf.DISPATCH_BY_RESOURCE', True)
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_dispatch_route_fails(self, load):
+        game, session = await make_game()
+        session.register = CoroutineMock(side_effect=ConnectionError())
+        session.subscribe = CoroutineMock()
+        run = await concrete.Run.create(session, game, {'id': 900, 'game': game.pk})
+
+        # the scope isn't marked as started without any route
+        failed = await game.start_scopes([run])
+        self.assertEqual(failed, [run])
+        self.assertFalse(run.wamp.started)
+
+        # and the next start tries again
+        session.register.side_effect = None
+        await run.start()
+        self.assertTrue(run.wamp.started)
+
+    @patch('modelservice.games.scopes.concrete.START_CONCURRENCY', 3)
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_start_scopes(self, load):
+        game, session = await make_game()
+        starting = set()
+        concurrency = []
+
+        def make_scope(pk):
+            async def start():
+                starting.add(pk)
+                concurrency.append(len(starting))
+                await asyncio.sleep(0.01)
+                starting.discard(pk)
+                if pk == 3:
+                    raise ValueError(pk)
+            return Mock(pk=pk, start=start)
+
+        scopes = [make_scope(pk) for pk in range(10)]
+        failed = await game.start_scopes(scopes)
 
+        self.assertEqual(failed, [scopes[3]])
+        self.assertEqual(max(concurrency), 3)
+        self.assertEqual(len(concurrency), 10)
+        self.assertEqual(game.start_stats['started'], 9)
+        self.assertEqual(game.start_stats['failed'], 1)
+        self.assertGreater(game.start_stats['rate'], 0)
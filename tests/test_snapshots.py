@@ -0,0 +1,97 @@
+import os
+import tempfile
+
+from asynctest import TestCase, patch
+
+from modelservice.games import snapshots
+from modelservice.games.storages import InMemoryStorage
+from modelservice.simpl.memory import MemoryStore
+
+from .test_utils import make_game, use_memory_storage
+
+
+class TestSnapshots(TestCase):
+    use_default_loop = True
+
+    def setUp(self):
+        self.store = MemoryStore()
+        self.store.load({
+            'games': [{'id': 1, 'slug': 'game'}],
+            'phases': [{'id': 1, 'game': 1, 'updated': 1}],
+            'runs': [
+                {'id': 1, 'game': 1, 'phase': 1, 'active': True, 'updated': 1},
+                {'id': 2, 'game': 1, 'phase': 1, 'active': False, 'updated': 1},
+                {'id': 3, 'game': 1, 'phase': 1, 'active': True, 'updated': 1},
+            ],
+            'worlds': [
+                {'id': pk, 'run': pk, 'run_active': pk != 2, 'updated': 1}
+                for pk in (1, 2, 3)
+            ],
+        })
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, '{slug}.snapshot')
+        use_memory_storage(self, self.store)
+
+        self.patches = [
+            patch('modelservice.conf.SNAPSHOT_PATH', path),
+            patch('modelservice.conf.SNAPSHOT_MODIFIED_FIELD', 'updated'),
+            patch('modelservice.games.scopes.concrete.SNAPSHOT_MODIFIED_FIELD', 'updated'),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.directory.cleanup()
+
+    async def test_warm_restart(self):
+        game, session = await make_game()
+        self.assertFalse(await game.restore_snapshot())
+        await game.restore()
+        await game.write_snapshot()
+
+        # changes while the modelservice is stopped
+        self.store.update('worlds', 1, {'data': {'score': 10}, 'updated': 2},
+                          partial=True)
+        self.store.update('runs', 2, {'active': True, 'updated': 2}, partial=True)
+        self.store.update('runs', 3, {'active': False, 'updated': 2}, partial=True)
+
+        game, session = await make_game()
+        with patch.object(InMemoryStorage, 'filter_all',
+                          wraps=game.storage.filter_all) as filter_all:
+            self.assertTrue(await game.restore_snapshot())
+
+        self.assertEqual(sorted(run.pk for run in game.runs), [1, 2])
+        self.assertEqual(sorted(world.pk for world in game.scopes['world']), [1, 2])
+        self.assertEqual(game.scopes['world'].get(id=1).json['data'], {'score': 10})
+        self.assertIs(game.scopes['world'].get(id=2).my.parent,
+                      game.runs.get(id=2))
+        filter_all.assert_any_call('runs', game_slug='game', updated__gte=1)
+        filter_all.assert_any_call('worlds', game_slug='game', run=2)
+
+    async def test_deletions_restore_from_api(self):
+        game, session = await make_game()
+        await game.restore()
+        await game.write_snapshot()
+
+        # deleted while the modelservice is stopped
+        self.store.delete('worlds', 1)
+
+        game, session = await make_game()
+        self.assertFalse(await game.restore_snapshot())
+        await game.restore()
+        self.assertEqual(sorted(world.pk for world in game.scopes['world']), [3])
+
+    async def test_mismatch_restores_from_api(self):
+        game, session = await make_game()
+        await game.restore()
+        snapshot = snapshots.take_snapshot(game)
+        snapshot['game'] = 2
+        snapshots.write_snapshot_file(snapshots.get_snapshot_path(game),
+                                      snapshots.dump_snapshot(snapshot))
+
+        with self.assertRaises(snapshots.SnapshotMismatch):
+            snapshots.check_snapshot(snapshot, game)
+        self.assertFalse(await game.restore_snapshot())
+        self.assertEqual(game.scopes['run'].count(), 0)
@@ -0,0 +1,164 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from asynctest import TestCase, patch
+from genericclient_base import exceptions
+from simpl_client.asyn import GamesAPIClient
+
+from modelservice.games.scopes.webhooks import SubscriptionAlreadyExists, subscribe
+from modelservice.games.storages import SIMPLStorage
+from modelservice.simpl.standin import GamesAPIStandIn
+
+from .test_utils import make_game
+
+
+class TestGamesAPIStandIn(TestCase):
+    use_default_loop = True
+
+    async def setUp(self):
+        self.standin = GamesAPIStandIn(page_size=2, latency=0.01)
+        self.standin.store.load({
+            'games': [{'id': 1, 'slug': 'calc'}],
+            'runs': [{'id': 1, 'game': 1, 'active': True}],
+            'worlds': [
+                {'id': pk, 'run': 1, 'run_active': pk != 5}
+                for pk in range(1, 6)
+            ],
+        })
+        self.server = TestServer(self.standin.make_app())
+        await self.server.start_server()
+        self.client = GamesAPIClient(url=str(self.server.make_url('/apis')),
+                                     auth=None)
+
+    async def tearDown(self):
+        await self.server.close()
+
+    async def test_filter_follows_pages(self):
+        worlds = await self.client.worlds.filter(run=1, run_active=True)
+
+        self.assertEqual([world.id for world in worlds], [1, 2, 3, 4])
+        self.assertEqual(self.standin.requests, 2)
+
+    @patch('modelservice.conf.RESTORE_PAGE_SIZE', 2)
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_filter_all_prefetches_pages(self, load):
+        game, session = await make_game()
+
+        with patch.object(SIMPLStorage, 'games_client', self.client):
+            worlds = await game.storage.filter_all('worlds', run=1)
+
+        self.assertEqual([world['id'] for world in worlds], [1, 2, 3, 4, 5])
+        self.assertEqual(self.standin.requests, 3)
+        # pages 2 and 3 were requested together
+        self.assertEqual(self.standin.max_in_flight, 2)
+
+    @patch('modelservice.conf.RESTORE_PAGE_WINDOW', 2)
+    @patch('modelservice.conf.RESTORE_PAGE_SIZE', 1)
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_iter_pages_window(self, load):
+        game, session = await make_game()
+
+        with patch.object(SIMPLStorage, 'games_client', self.client):
+            pages = game.storage.iter_pages('worlds', run=1)
+            self.assertEqual([world['id'] for world in await pages.__anext__()], [1])
+            self.assertEqual([world['id'] for world in await pages.__anext__()], [2])
+            # only page 3 is requested ahead of the consumer
+            await asyncio.sleep(0.05)
+            self.assertEqual(self.standin.requests, 3)
+            await pages.aclose()
+
+        self.assertEqual(self.standin.requests, 3)
+
+        # pages requested ahead are done once the consumer stops
+        get_page = SIMPLStorage._get_page
+
+        async def slow_get_page(storage, endpoint, url, params=None):
+            if 'page=3' in url:
+                await asyncio.sleep(1)
+            return await get_page(storage, endpoint, url, params)
+
+        with patch.object(SIMPLStorage, 'games_client', self.client), \
+                patch.object(SIMPLStorage, '_get_page', slow_get_page):
+            pages = game.storage.iter_pages('worlds', run=1)
+            await pages.__anext__()
+            await pages.__anext__()
+            await pages.aclose()
+        self.assertEqual([task for task in asyncio.Task.all_tasks()
+                          if task._coro.__name__ == 'get_page'
+                          and not task.done()], [])
+
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_count(self, load):
+        game, session = await make_game()
+
+        with patch.object(SIMPLStorage, 'games_client', self.client):
+            self.assertEqual(await game.storage.count('worlds', run=1), 5)
+            self.assertEqual(await game.storage.count('worlds', run_active=True), 4)
+            self.assertEqual(await game.storage.count('worlds', run=2), 0)
+
+    async def test_get(self):
+        game = await self.client.games.get(slug='calc')
+        self.assertEqual(game.id, 1)
+
+        with self.assertRaises(exceptions.ResourceNotFound):
+            await self.client.runs.get(id=2)
+
+    async def test_create_or_update(self):
+        run = await self.client.runs.create_or_update({'game': 1})
+        self.assertEqual(run.id, 2)
+
+        run = await self.client.runs.create_or_update({'id': 2, 'game': 1, 'active': True})
+        self.assertEqual(self.standin.store.get('runs', id=2)['active'], True)
+
+    async def test_bulk(self):
+        ids = await self.client.bulk.worlds.create([
+            {'run': 1, 'run_active': True},
+            {'run': 1, 'run_active': True},
+        ], return_ids=True)
+        self.assertEqual(ids, [6, 7])
+
+        await self.client.bulk.worlds.delete(run_active=False)
+        self.assertEqual(len(self.standin.store.filter('worlds')), 6)
+
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_storage_bulk_create(self, load):
+        game, session = await make_game()
+
+        with patch.object(SIMPLStorage, 'games_client', self.client):
+            payloads = await game.storage.bulk_create('worlds', [
+                {'run': 1, 'run_active': True},
+            ])
+
+        self.assertEqual(payloads, [{'id': 6, 'run': 1, 'run_active': True}])
+
+    async def test_hooks(self):
+        received = []
+
+        async def callback(request):
+            received.append(await request.json())
+            return web.Response()
+
+        app = web.Application()
+        app.router.add_post('/callback', callback)
+        callback_server = TestServer(app)
+        await callback_server.start_server()
+        url = str(callback_server.make_url('/callback'))
+
+        try:
+            async with self.client as api_session:
+                await subscribe(api_session, 'calc', url)
+                with self.assertRaises(SubscriptionAlreadyExists):
+                    await subscribe(api_session, 'calc', url)
+
+            await self.client.worlds.create_or_update({'id': 1, 'run': 1, 'run_active': True})
+            await self.client.bulk.worlds.create([{'run': 1}])
+            await self.standin.flush()
+        finally:
+            await callback_server.close()
+
+        self.assertEqual(received, [{
+            'event': 'calc.world.changed',
+            'data': {'id': 1, 'run': 1, 'run_active': True},
+            'ref': None,
+        }])
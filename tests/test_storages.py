@@ -0,0 +1,295 @@
+import asyncio
+
+from asynctest import CoroutineMock, Mock, TestCase, patch
+from django.core.cache import cache
+
+from modelservice.games.caches import StorageCache, storage_cache
+from modelservice.games.scopes import concrete
+from modelservice.games.storages import SIMPLStorage
+from modelservice.simpl.memory import MemoryStore
+from modelservice.utils.asyncio import SingleFlight
+from modelservice.utils.caches import LocalCache
+from modelservice.webhooks import dispatcher
+
+from .test_utils import make_game, use_memory_storage
+
+
+class TestSIMPLStorage(TestCase):
+    use_default_loop = True
+
+    def setUp(self):
+        cache.clear()
+        storage_cache.clear()
+
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_concurrent_gets_are_coalesced(self, load):
+        game, session = await make_game()
+        game.flights = SingleFlight()
+        calls = []
+
+        async def get(**lookup):
+            calls.append(lookup)
+            await asyncio.sleep(0.01)
+            return Mock(payload={'id': lookup['id'], 'email': 'user@simpl.world'})
+
+        with patch.object(SIMPLStorage, 'games_client') as games_client:
+            games_client.users.get = get
+            payloads = await asyncio.gather(*[
+                game.storage.get('users', id=1) for _ in range(5)
+            ])
+
+        self.assertEqual(calls, [{'id': 1}])
+        self.assertEqual(payloads, [{'id': 1, 'email': 'user@simpl.world'}] * 5)
+        # callers may mutate their payload
+        self.assertIsNot(payloads[0], payloads[1])
+        self.assertEqual(game.flights.issued, 1)
+        self.assertEqual(game.flights.coalesced, 4)
+        self.assertEqual(len(game.flights), 0)
+
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_failures_are_shared(self, load):
+        game, session = await make_game()
+        game.flights = SingleFlight()
+
+        async def filter(**lookup):
+            await asyncio.sleep(0.01)
+            raise ValueError(lookup)
+
+        with patch.object(SIMPLStorage, 'games_client') as games_client:
+            games_client.runs.filter = filter
+            results = await asyncio.gather(*[
+                game.storage.filter('runs', game=1) for _ in range(3)
+            ], return_exceptions=True)
+
+        self.assertEqual([type(result) for result in results], [ValueError] * 3)
+        self.assertEqual(game.flights.issued, 1)
+        self.assertEqual(len(game.flights), 0)
+
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_two_tier_cache(self, load):
+        game, session = await make_game()
+        calls = []
+
+        async def get(**lookup):
+            calls.append(lookup)
+            return Mock(payload={'id': lookup['id'], 'run': 1})
+
+        with patch.object(SIMPLStorage, 'games_client') as games_client:
+            games_client.worlds.get = get
+
+            payload = await game.storage.get('worlds', id=1)
+            payload['run'] = 2  # callers get their own copy
+            self.assertEqual(await game.storage.get('worlds', id=1), {'id': 1, 'run': 1})
+
+            # the local tier answers without the Django cache
+            cache.clear()
+            self.assertEqual(await game.storage.get('worlds', id=1), {'id': 1, 'run': 1})
+            self.assertEqual(len(calls), 1)
+
+            # ...until a webhook about the resource invalidates both tiers
+            await dispatcher.forward(game, {
+                'event': 'simpl.world.changed',
+                'ref': None,
+                'data': {'id': 1, 'run': 1, 'run_active': True},
+            })
+            self.assertIsNone(storage_cache.get(
+                'worlds', game.storage._get_cache_key('get', 'worlds', {'id': 1}), 1))
+            await game.storage.get('worlds', id=1)
+            self.assertEqual(len(calls), 2)
+
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_save_changed_fields(self, load):
+        game, session = await make_game()
+        run = concrete.Run(session, game, {
+            'id': 600, 'game': game.pk, 'phase': 1, 'data': {'big': 'x' * 1000},
+        })
+        run.pk = 600
+        # scopes whose payload wasn't recorded are saved whole
+        self.assertIsNone(run.changed_fields)
+        # restored ones only send their changes since they were loaded
+        run = concrete.Run.from_json(session, game, run.json)
+        self.assertEqual(run.changed_fields, [])
+
+        run.json['phase'] = 2
+        run.json['data']['small'] = 1
+        self.assertEqual(run.changed_fields, ['phase', 'data'])
+
+        with patch.object(SIMPLStorage, 'games_client') as games_client:
+            endpoint = games_client.runs
+            endpoint.request = CoroutineMock(return_value=Mock(
+                status_code=200, data=dict(run.json),
+            ))
+            await run.save()
+
+            endpoint.request.assert_called_once_with(
+                'patch', endpoint._urljoin.return_value,
+                json={'phase': 2, 'data': {'big': 'x' * 1000, 'small': 1}},
+            )
+            self.assertEqual(run.changed_fields, [])
+
+            # saving without changes sends nothing
+            await run.save()
+            self.assertEqual(endpoint.request.call_count, 1)
+
+            # replacing json saves it whole
+            endpoint.create_or_update = CoroutineMock(return_value=Mock(
+                payload=dict(run.json, phase=3),
+            ))
+            run.json = dict(run.json, phase=3)
+            self.assertIsNone(run.changed_fields)
+            await run.save()
+            endpoint.create_or_update.assert_called_once_with(dict(run.json))
+            self.assertEqual(endpoint.request.call_count, 1)
+            self.assertEqual(run.changed_fields, [])
+
+            # so does deleting fields, a PATCH can't
+            del run.json['data']
+            self.assertIsNone(run.changed_fields)
+
+            # new resources are created with their whole payload
+            endpoint.create_or_update = CoroutineMock(return_value=Mock(
+                payload={'id': 601, 'game': game.pk, 'phase': 1},
+            ))
+            created = concrete.Run(session, game, {'game': game.pk, 'phase': 1})
+            await created.save()
+            endpoint.create_or_update.assert_called_once_with({'game': game.pk, 'phase': 1})
+
+
+    @patch('modelservice.games.storages.SIMPLStorage.load')
+    async def test_deprecated_scope_storage(self, load):
+        game, session = await make_game()
+        run = concrete.Run.from_json(session, game, {'id': 602, 'game': game.pk})
+
+        # the call shapes of storages bound to scopes still work
+        with patch.object(SIMPLStorage, 'save', CoroutineMock()) as save, \
+                self.assertWarns(DeprecationWarning):
+            await run.storage.save({'phase': 2})
+        save.assert_called_once_with(run, {'phase': 2}, fields=None)
+        self.assertEqual(run.storage.get_save_json(),
+                         game.storage.get_save_json(run))
+        self.assertIs(run.storage.cache, game.storage.cache)
+
+
+class TestInMemoryStorage(TestCase):
+    use_default_loop = True
+
+    async def test_restore_and_save(self):
+        store = MemoryStore()
+        store.load({
+            'games': [{'id': 1, 'slug': 'game'}],
+            'phases': [{'id': 1, 'game': 1, 'name': 'Play'}],
+            'runs': [
+                {'id': 1, 'game': 1, 'phase': 1, 'active': True},
+                {'id': 2, 'game': 1, 'phase': 1, 'active': False},
+            ],
+            'worlds': [
+                {'id': 1, 'run': 1, 'run_active': True},
+                {'id': 2, 'run': 2, 'run_active': False},
+            ],
+        })
+        use_memory_storage(self, store)
+
+        game, session = await make_game()
+        await game.restore()
+
+        self.assertEqual([run.pk for run in game.runs], [1])
+        world = game.scopes['world'].get(id=1)
+        self.assertIs(world.my.parent, game.runs.get(id=1))
+        self.assertEqual(game.scopes['world'].count(), 1)
+
+        world.json['data'] = {'score': 10}
+        await world.save()
+        scenario = concrete.Scenario(session, game, {'world': 1})
+        await scenario.save()
+
+        # changes made since are saved, whether json is replaced or not
+        store.update('worlds', 1, {'name': 'changed elsewhere'},
+                     partial=True)
+        world.json = dict(world.json, data={'score': 20})
+        await world.save()
+        world.json['run_active'] = False
+        with patch.object(store, 'update', wraps=store.update) as update:
+            await world.save()
+        update.assert_called_once_with('worlds', 1, {'run_active': False},
+                                       partial=True)
+
+        self.assertEqual(store.get('worlds', id=1),
+                         {'id': 1, 'run': 1, 'run_active': False,
+                          'data': {'score': 20}})
+        self.assertEqual(scenario.json['id'], 1)
+        self.assertEqual(store.get('scenarios', world=1), scenario.json)
+
+
+class TestStorageCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cache = StorageCache(local=LocalCache(), timeouts={})
+        self.cache.set('runusers', 'by-run-1', [{'id': 1, 'run': 1}, {'id': 2, 'run': 1}], 60, {'run': 1})
+        self.cache.set('runusers', 'by-run-2', [{'id': 3, 'run': 2}], 60, {'run': '2'})
+        self.cache.set('runusers', 'runuser-3', {'id': 3, 'run': 2}, 60, {'id': 3})
+        self.cache.set('worlds', 'world-1', {'id': 1, 'run': 1}, 60, {'id': 1})
+
+    def test_invalidate_changed(self):
+        # runuser 2 moved from run 1 to run 2
+        evicted = self.cache.invalidate('runusers', {'id': 2, 'run': 2})
+
+        self.assertEqual(evicted, 2)
+        self.assertIsNone(self.cache.get('runusers', 'by-run-1', 60))
+        self.assertIsNone(self.cache.get('runusers', 'by-run-2', 60))
+        self.assertEqual(self.cache.get('runusers', 'runuser-3', 60), {'id': 3, 'run': 2})
+        self.assertEqual(self.cache.get('worlds', 'world-1', 60), {'id': 1, 'run': 1})
+        self.assertEqual(len(self.cache), 2)
+
+    def test_invalidate_endpoint(self):
+        self.assertEqual(self.cache.invalidate('runusers'), 3)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_invalidate_other_process(self):
+        # another process, sharing the Django cache
+        other = StorageCache(local=LocalCache(), timeouts={'worlds': 0})
+        self.assertEqual(other.get('worlds', 'world-1', 60), {'id': 1, 'run': 1})
+
+        # its webhook evicts what this process cached in the shared tier...
+        other.invalidate('worlds', {'id': 1, 'run': 2})
+        self.cache.local.clear()
+        self.assertIsNone(self.cache.get('worlds', 'world-1', 60))
+
+        # ...and what it fetched before that is not read anymore
+        generation = other.get_generation('worlds')
+        self.cache.invalidate('worlds', {'id': 1, 'run': 3})
+        other.set('worlds', 'world-1', {'id': 1, 'run': 2}, 60, {'id': 1}, generation)
+        self.assertIsNone(self.cache.get('worlds', 'world-1', 60))
+
+    def test_stale_fetch_is_not_cached(self):
+        generation = self.cache.get_generation('worlds')
+        self.cache.invalidate('worlds', {'id': 1, 'run': 2})
+        self.cache.set('worlds', 'world-1', {'id': 1, 'run': 1}, 60, {'id': 1}, generation)
+        self.assertIsNone(self.cache.get('worlds', 'world-1', 60))
+
+
+class TestLocalCache(TestCase):
+    def test_lru(self):
+        local = LocalCache(max_entries=2)
+        local.set('a', 1, timeout=10)
+        local.set('b', 2, timeout=10)
+        self.assertEqual(local.get('a'), 1)
+        local.set('c', 3, timeout=10)
+
+        self.assertIsNone(local.get('b'))
+        self.assertEqual(local.get('a'), 1)
+        self.assertEqual(local.get('c'), 3)
+        self.assertEqual(local.stats, {
+            'entries': 2, 'hits': 3, 'misses': 1, 'evictions': 1, 'expirations': 0,
+        })
+
+    def test_timeout(self):
+        local = LocalCache()
+        with patch('modelservice.utils.caches.time.monotonic', return_value=100):
+            local.set('a', 1, timeout=5)
+            local.set('b', 1, timeout=0)
+        with patch('modelservice.utils.caches.time.monotonic', return_value=104):
+            self.assertEqual(local.get('a'), 1)
+        with patch('modelservice.utils.caches.time.monotonic', return_value=106):
+            self.assertIsNone(local.get('a'))
+        self.assertEqual(len(local), 0)
+        self.assertEqual(local.expirations, 1)
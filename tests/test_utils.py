@@ -1,6 +1,10 @@
+from collections import OrderedDict, defaultdict
 from unittest import mock
 
 from modelservice.games.scopes import concrete
+from modelservice.games.scopes.base import WampScope
+from modelservice.games.scopes.managers import ScopeManager
+from modelservice.games.storages import InMemoryStorage
 
 
 async def make_game(slug=None):
@@ -24,3 +28,24 @@ async def make_game(slug=None):
     game = await GameClass.create(session, 'game')
     game.pk = 1
     return game, session
+
+
+def use_memory_storage(test_case, store):
+    """
+    Makes games keep their resources in `store` with `InMemoryStorage`, and
+    their scopes in a fresh `Game.scopes`, until `test_case` is cleaned up.
+    """
+    endpoint_to_classes = OrderedDict(
+        (scope_class.resource_name_plural, scope_class)
+        for scope_class in concrete.default_resource_classes
+    )
+    patches = [
+        mock.patch.object(InMemoryStorage, 'store', store),
+        mock.patch.object(WampScope, 'storage_class', InMemoryStorage),
+        mock.patch.object(concrete.Game, 'scopes', defaultdict(ScopeManager)),
+        mock.patch.object(concrete.Game, 'endpoint_to_classes',
+                          endpoint_to_classes, create=True),
+    ]
+    for p in patches:
+        p.start()
+        test_case.addCleanup(p.stop)